@@ -0,0 +1,293 @@
+"""
+Admission control for the booking path: a per-flight concurrency limit with
+a FIFO queue, load shedding with Retry-After, and a token-based virtual
+waiting room that meters clients onto a flight during a flash sale.
+
+Lanes and waiting-room tokens live in this process. With several server
+workers, each enforces its own limits, and a token is only known to the
+worker that issued it: a status poll or booking that lands on another worker
+gets a 404 or is treated as unadmitted. Serve flash-sale traffic from a
+single worker, or route a flight's waiting-room and booking requests to the
+same worker.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import asyncio
+import math
+import os
+import secrets
+import time
+
+from fastapi import HTTPException
+
+from backend.booking_pipeline import BOOKING_PIPELINE_ENABLED, BOOKING_BATCH_SIZE
+
+BOOKING_CONCURRENCY_PER_FLIGHT = int(os.getenv("BOOKING_CONCURRENCY_PER_FLIGHT", "4"))
+# The group-commit pipeline needs a whole batch of a flight's requests in flight at once
+BOOKING_LANE_LIMIT = (
+    max(BOOKING_CONCURRENCY_PER_FLIGHT, BOOKING_BATCH_SIZE) if BOOKING_PIPELINE_ENABLED
+    else BOOKING_CONCURRENCY_PER_FLIGHT
+)
+BOOKING_MAX_QUEUE = int(os.getenv("BOOKING_MAX_QUEUE", "100"))
+# Shed new arrivals while the smoothed time-in-system is above this and requests are queued
+BOOKING_MAX_LATENCY_MS = float(os.getenv("BOOKING_MAX_LATENCY_MS", "2000"))
+# Clients admitted from a flight's waiting room at once, and how long an admission lasts
+WAITING_ROOM_CAPACITY = int(os.getenv("WAITING_ROOM_CAPACITY", "50"))
+WAITING_ROOM_ADMIT_SECONDS = int(os.getenv("WAITING_ROOM_ADMIT_SECONDS", "300"))
+# Waiting tokens that are not polled for this long give up their place
+WAITING_ROOM_IDLE_SECONDS = 60
+# Lanes with nothing active or queued for this long are dropped
+ADMISSION_LANE_IDLE_SECONDS = 300
+LATENCY_SMOOTHING = 0.2
+
+
+def _shed(retry_after, detail):
+    return HTTPException(
+        status_code=503,
+        detail=detail,
+        headers={"Retry-After": str(max(1, int(math.ceil(retry_after))))},
+    )
+
+
+class AdmissionLane:
+    """A concurrency limit with a FIFO wait queue and latency-based shedding"""
+
+    def __init__(self, limit, max_queue, max_latency):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_latency = max_latency
+        self.active = 0
+        self.waiters = deque()
+        self.latency = 0.0   # smoothed seconds in system (queue + service)
+        self.service = 0.0   # smoothed seconds holding a slot
+        self.admitted = 0
+        self.shed = 0
+        self.used_at = time.monotonic()
+
+    def idle(self, now):
+        return not self.active and not self.waiters and now - self.used_at > ADMISSION_LANE_IDLE_SECONDS
+
+    def retry_after(self):
+        return (len(self.waiters) + 1) * max(self.service, 0.05) / self.limit
+
+    async def acquire(self, priority=False):
+        """
+        Wait for a slot in arrival order. Arrivals are shed when the queue is
+        full or latency is over budget; priority callers (admitted from the
+        waiting room) are never shed.
+        """
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return
+        if not priority:
+            if len(self.waiters) >= self.max_queue:
+                self.shed += 1
+                raise _shed(self.retry_after(), "Booking queue is full. Please retry or join the waiting room.")
+            if self.latency > self.max_latency:
+                self.shed += 1
+                raise _shed(self.retry_after(), "Bookings are delayed. Please retry or join the waiting room.")
+
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was handed over just as we were cancelled; pass it on
+                self.release(0.0, 0.0)
+            else:
+                self.waiters.remove(future)
+            raise
+
+    def release(self, waited, held):
+        self.latency += LATENCY_SMOOTHING * ((waited + held) - self.latency)
+        self.service += LATENCY_SMOOTHING * (held - self.service)
+        self.active -= 1
+        self.used_at = time.monotonic()
+        while self.waiters:
+            future = self.waiters.popleft()
+            if not future.done():
+                self.active += 1
+                future.set_result(None)
+                break
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "queued": len(self.waiters),
+            "latency_ms": round(self.latency * 1000, 1),
+            "service_ms": round(self.service * 1000, 1),
+            "admitted": self.admitted,
+            "shed": self.shed,
+        }
+
+
+class AdmissionController:
+    """Booking lanes keyed by flight (or another resource such as payments)"""
+
+    def __init__(self, limit=BOOKING_LANE_LIMIT, max_queue=BOOKING_MAX_QUEUE,
+                 max_latency_ms=BOOKING_MAX_LATENCY_MS):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_latency = max_latency_ms / 1000
+        self.lanes = {}
+        self._pruned_at = time.monotonic()
+
+    def _prune(self):
+        """Drop idle lanes, at most once per ADMISSION_LANE_IDLE_SECONDS"""
+        now = time.monotonic()
+        if now - self._pruned_at < ADMISSION_LANE_IDLE_SECONDS:
+            return
+        self._pruned_at = now
+        for key in [key for key, lane in self.lanes.items() if lane.idle(now)]:
+            del self.lanes[key]
+
+    @asynccontextmanager
+    async def slot(self, key, priority=False):
+        lane = self.lanes.get(key)
+        if lane is None:
+            self._prune()
+            lane = self.lanes[key] = AdmissionLane(self.limit, self.max_queue, self.max_latency)
+        arrived = time.monotonic()
+        await lane.acquire(priority)
+        lane.admitted += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            lane.release(started - arrived, time.monotonic() - started)
+
+    def stats(self):
+        return {str(key): lane.stats() for key, lane in self.lanes.items()}
+
+
+class WaitingRoom:
+    """
+    Per-flight FIFO of opaque tokens. Up to WAITING_ROOM_CAPACITY tokens per
+    flight are admitted at once; an admission ends when the booking is made
+    or after WAITING_ROOM_ADMIT_SECONDS, which lets the next tokens in.
+
+    Every token gets the next sequence number of its flight, so a position is
+    its number minus that of the head of the queue. Admissions and finished
+    tokens sit in deques ordered by time, so expiring them only looks at the
+    front; no call scans a whole queue.
+    """
+
+    def __init__(self, capacity=WAITING_ROOM_CAPACITY, admit_seconds=WAITING_ROOM_ADMIT_SECONDS):
+        self.capacity = capacity
+        self.admit_seconds = admit_seconds
+        self.tokens = {}    # token -> entry dict
+        self.flights = {}   # flight_id -> queue state, see _flight
+        self.finished = deque()  # (forget_at, token) for expired and completed tokens
+
+    def _flight(self, flight_id):
+        flight = self.flights.get(flight_id)
+        if flight is None:
+            flight = self.flights[flight_id] = {
+                "next_seq": 0,
+                "queue": deque(),      # waiting tokens in arrival order
+                "admitted": set(),
+                "admissions": deque(), # (admitted_at, token) in admission order
+            }
+        return flight
+
+    def join(self, flight_id):
+        token = secrets.token_urlsafe(16)
+        now = time.time()
+        flight = self._flight(flight_id)
+        self.tokens[token] = {
+            "flight_id": flight_id, "status": "waiting", "seq": flight["next_seq"],
+            "joined_at": now, "seen_at": now, "admitted_at": None,
+        }
+        flight["next_seq"] += 1
+        flight["queue"].append(token)
+        self._advance(flight_id)
+        return token
+
+    def _finish(self, token, status, now):
+        self.tokens[token]["status"] = status
+        # Kept for a while so a client polling it learns what happened
+        self.finished.append((now + self.admit_seconds, token))
+
+    def _advance(self, flight_id):
+        now = time.time()
+        flight = self._flight(flight_id)
+        admitted, admissions = flight["admitted"], flight["admissions"]
+        while admissions and admissions[0][0] + self.admit_seconds < now:
+            _, token = admissions.popleft()
+            if token in admitted:
+                admitted.discard(token)
+                self._finish(token, "expired", now)
+        queue = flight["queue"]
+        while queue and len(admitted) < self.capacity:
+            token = queue.popleft()
+            entry = self.tokens[token]
+            if entry["seen_at"] + WAITING_ROOM_IDLE_SECONDS < now:
+                self._finish(token, "expired", now)
+                continue
+            entry["status"] = "admitted"
+            entry["admitted_at"] = now
+            admitted.add(token)
+            admissions.append((now, token))
+        while self.finished and self.finished[0][0] < now:
+            _, token = self.finished.popleft()
+            self.tokens.pop(token, None)
+        if not queue and not admitted:
+            del self.flights[flight_id]
+
+    def status(self, token):
+        entry = self.tokens.get(token)
+        if entry is None:
+            return None
+        entry["seen_at"] = time.time()
+        flight_id = entry["flight_id"]
+        self._advance(flight_id)
+        result = {"token": token, "flight_id": flight_id, "status": entry["status"]}
+        if entry["status"] == "waiting":
+            queue = self.flights[flight_id]["queue"]
+            # Counts tokens ahead that have gone idle but not yet reached the head, so it never understates
+            position = entry["seq"] - self.tokens[queue[0]]["seq"] + 1
+            result["position"] = position
+            result["queue_length"] = len(queue)
+            # Rough wait: each admission slot turns over within admit_seconds
+            result["estimated_wait_seconds"] = int(math.ceil(position / self.capacity)) * self.admit_seconds
+        elif entry["status"] == "admitted":
+            result["expires_in_seconds"] = max(0, int(entry["admitted_at"] + self.admit_seconds - time.time()))
+        return result
+
+    def is_admitted(self, token, flight_id):
+        entry = self.tokens.get(token)
+        if not entry or entry["flight_id"] != flight_id or entry["status"] != "admitted":
+            return False
+        return entry["admitted_at"] + self.admit_seconds >= time.time()
+
+    def complete(self, token):
+        """The admitted client has booked; free its slot for the next in line"""
+        entry = self.tokens.get(token)
+        if not entry or entry["status"] != "admitted":
+            return
+        flight_id = entry["flight_id"]
+        self._flight(flight_id)["admitted"].discard(token)
+        self._finish(token, "completed", time.time())
+        self._advance(flight_id)
+
+    def stats(self):
+        return {
+            str(flight_id): {"waiting": len(flight["queue"]), "admitted": len(flight["admitted"])}
+            for flight_id, flight in self.flights.items()
+        }
+
+
+PAYMENT_CONCURRENCY = int(os.getenv("PAYMENT_CONCURRENCY", "16"))
+# Searches run on their own threads so a search spike cannot starve booking work
+SEARCH_MAX_WORKERS = int(os.getenv("SEARCH_MAX_WORKERS", "8"))
+# Booking and payment transactions run off the event loop, so a lane's waiters really wait
+BOOKING_MAX_WORKERS = int(os.getenv("BOOKING_MAX_WORKERS", "32"))
+
+booking_admission = AdmissionController()
+payment_admission = AdmissionController(limit=PAYMENT_CONCURRENCY)
+waiting_room = WaitingRoom()
+search_executor = ThreadPoolExecutor(max_workers=SEARCH_MAX_WORKERS, thread_name_prefix="search")
+booking_executor = ThreadPoolExecutor(max_workers=BOOKING_MAX_WORKERS, thread_name_prefix="booking")
+payment_executor = ThreadPoolExecutor(max_workers=PAYMENT_CONCURRENCY, thread_name_prefix="payment")
@@ -0,0 +1,161 @@
+"""
+Airport and city typeahead for GET /api/airports/suggest.
+
+Every airport contributes keys for its code, city, name and country: the
+whole normalized field plus each word-suffix of it, so "gandhi int"
+finds "Indira Gandhi International Airport". Keys are kept in one sorted
+array per match tier, and a query bisects to its prefix range in each tier
+in rank order, stopping once it has enough airports. A lookup therefore
+costs a few bisections and touches about `limit` keys however many
+airports there are.
+
+The index is rebuilt once this process commits a change to an airport, and
+otherwise when the table's row count, highest id or latest updated_at
+moves, checked every AIRPORT_INDEX_CHECK_SECONDS.
+"""
+from bisect import bisect_left
+import os
+import re
+import threading
+import time
+import unicodedata
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session, object_session
+
+from backend.models import Airport
+
+AIRPORT_INDEX_CHECK_SECONDS = float(os.getenv("AIRPORT_INDEX_CHECK_SECONDS", "30"))
+SUGGEST_MAX_LIMIT = 50
+
+# Match tiers in rank order: a code match beats a city match, a match at the
+# start of a field beats one on a later word, and country matches come last
+TIERS = ["code", "city", "name", "city_word", "name_word", "country"]
+FIELD_TIERS = {"city": ("city", "city_word"), "name": ("name", "name_word")}
+
+
+def normalize(text):
+    """Lowercase ASCII words: accents dropped, punctuation turned into spaces"""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+
+def _word_suffixes(text):
+    words = text.split()
+    return [" ".join(words[i:]) for i in range(1, len(words))]
+
+
+def airport_summary(airport):
+    return {
+        "id": airport.id,
+        "code": airport.code,
+        "name": airport.name,
+        "city": airport.city,
+        "country": airport.country,
+    }
+
+
+class AirportIndex:
+    """Sorted (key, airport position) arrays, one per tier, over a list of airport summaries"""
+
+    def __init__(self, airports):
+        self.airports = airports
+        tiers = {tier: [] for tier in TIERS}
+        for i, airport in enumerate(airports):
+            code = normalize(airport["code"])
+            if code:
+                tiers["code"].append((code, i))
+            for field, (whole, word) in FIELD_TIERS.items():
+                value = normalize(airport[field])
+                if value:
+                    tiers[whole].append((value, i))
+                    tiers[word].extend((suffix, i) for suffix in _word_suffixes(value))
+            country = normalize(airport["country"])
+            if country:
+                tiers["country"].append((country, i))
+                tiers["country"].extend((suffix, i) for suffix in _word_suffixes(country))
+        self.tiers = []
+        for tier in TIERS:
+            entries = sorted(set(tiers[tier]))
+            # Parallel arrays so bisect compares plain strings
+            self.tiers.append((tier, [key for key, _ in entries], [i for _, i in entries]))
+
+    def __len__(self):
+        return len(self.airports)
+
+    def suggest(self, query, limit=10):
+        """Up to limit airports whose fields start with query, best matches first"""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        for tier, keys, positions in self.tiers:
+            j = bisect_left(keys, prefix)
+            while j < len(keys) and keys[j].startswith(prefix):
+                i = positions[j]
+                if i not in seen:
+                    seen.add(i)
+                    results.append({**self.airports[i], "match": tier.split("_")[0]})
+                    if len(results) >= limit:
+                        return results
+                j += 1
+        return results
+
+
+class AirportSuggestions:
+    """The index for this process, rebuilt from the airports table when it changes"""
+
+    def __init__(self, check_seconds=AIRPORT_INDEX_CHECK_SECONDS):
+        self.check_seconds = check_seconds
+        self._index = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._checked_at = 0.0
+        self._signature = None
+
+    def _current(self, db):
+        if self._index is not None and time.monotonic() - self._checked_at < self.check_seconds:
+            return self._index
+        with self._lock:
+            if self._index is not None and time.monotonic() - self._checked_at < self.check_seconds:
+                return self._index
+            signature = tuple(db.query(func.count(Airport.id), func.max(Airport.id), func.max(Airport.updated_at)).one())
+            if self._index is None or signature != self._signature:
+                started = time.perf_counter()
+                self._index = AirportIndex([airport_summary(a) for a in db.query(Airport).order_by(Airport.id).all()])
+                print(f"Airport index: {len(self._index)} airports in {(time.perf_counter() - started) * 1000:.1f}ms")
+            self._signature = signature
+            self._checked_at = time.monotonic()
+            return self._index
+
+    def suggest(self, db, query, limit=10):
+        return self._current(db).suggest(query, max(1, min(limit, SUGGEST_MAX_LIMIT)))
+
+
+airport_suggestions = AirportSuggestions()
+
+
+@event.listens_for(Airport, "after_insert")
+@event.listens_for(Airport, "after_update")
+@event.listens_for(Airport, "after_delete")
+def _airport_changed(mapper, connection, target):
+    # Flushed but not yet committed; a rebuild now could still read the old rows
+    session = object_session(target)
+    if session is not None:
+        session.info["airports_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _airports_committed(session):
+    if session.info.pop("airports_changed", False):
+        airport_suggestions.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _airports_rolled_back(session):
+    session.info.pop("airports_changed", None)
@@ -0,0 +1,299 @@
+"""
+Booking analytics rollups per route, airline and departure day.
+
+Booking and payment transactions add their deltas to the summary rows, and
+admin flight changes apply the before/after difference for the flights they
+touch, so reports never aggregate the bookings table. Each inventory shard
+keeps rollups for its own flights and reports add them up. Rebuild from
+scratch (hot and archived flights) with:
+
+    python -m backend.analytics --rebuild
+"""
+from collections import defaultdict
+import argparse
+import time
+
+from sqlalchemy import case, func, insert, update
+from sqlalchemy.orm import aliased
+
+from backend.database import ArchiveSessionLocal, ArchiveBase, archive_engine
+from backend.models import (
+    Airline, Airport, Flight, Booking, AnalyticsRollup, ArchivedFlight, ArchivedBooking,
+)
+from backend.sharding import shard_map
+
+DIMENSIONS = ("route", "airline", "day")
+MEASURES = (
+    "flights", "capacity", "seats_sold", "bookings", "confirmed_bookings",
+    "booked_value", "revenue", "base_value",
+)
+SORTABLE = ("key",) + MEASURES + ("load_factor", "average_fare", "fare_vs_base")
+# Flight ids per IN (...) when snapshotting many flights
+SNAPSHOT_CHUNK = 500
+
+
+def rollup_keys(airline_code, origin_code, destination_code, departure_time):
+    return [
+        ("route", f"{origin_code or '?'}-{destination_code or '?'}"),
+        ("airline", airline_code or "?"),
+        ("day", departure_time.date().isoformat()),
+    ]
+
+
+def _flight_keys(flight):
+    return rollup_keys(
+        flight.airline.code if flight.airline else None,
+        flight.origin.code if flight.origin else None,
+        flight.destination.code if flight.destination else None,
+        flight.departure_time,
+    )
+
+
+def _add(totals, keys, measures, sign=1):
+    for key in keys:
+        row = totals[key]
+        for measure, value in measures.items():
+            row[measure] = row.get(measure, 0) + sign * value
+
+
+def _new_totals():
+    return defaultdict(dict)
+
+
+def _upsert(db, dimension, key, measures):
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        row = dict.fromkeys(MEASURES, 0)
+        row.update(measures, dimension=dimension, key=key)
+        stmt = dialect_insert(AnalyticsRollup).values(**row)
+        columns = AnalyticsRollup.__table__.c
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["dimension", "key"],
+            set_={m: columns[m] + stmt.excluded[m] for m in measures},
+        ))
+        return
+
+    updated = db.execute(
+        update(AnalyticsRollup)
+        .where(AnalyticsRollup.dimension == dimension, AnalyticsRollup.key == key)
+        .values({m: getattr(AnalyticsRollup, m) + v for m, v in measures.items()})
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not updated:
+        row = dict.fromkeys(MEASURES, 0)
+        row.update(measures, dimension=dimension, key=key)
+        db.execute(insert(AnalyticsRollup), [row])
+
+
+def apply_deltas(db, totals):
+    """
+    Add {(dimension, key): {measure: delta}} to the rollups inside the
+    caller's transaction. Rows are touched in sorted order so concurrent
+    transactions lock them consistently.
+    """
+    for (dimension, key), measures in sorted(totals.items()):
+        measures = {m: v for m, v in measures.items() if v}
+        if measures:
+            _upsert(db, dimension, key, measures)
+
+
+def record_bookings(db, bookings):
+    """New bookings, as (flight, price) pairs, in the booking transaction"""
+    totals = _new_totals()
+    for flight, price in bookings:
+        _add(totals, _flight_keys(flight), {
+            "seats_sold": 1,
+            "bookings": 1,
+            "booked_value": price,
+            "base_value": flight.base_price,
+        })
+    apply_deltas(db, totals)
+
+
+def record_payments(db, bookings):
+    """Bookings that were just confirmed, in the payment transaction"""
+    totals = _new_totals()
+    for booking in bookings:
+        _add(totals, _flight_keys(booking.flight), {
+            "confirmed_bookings": 1,
+            "revenue": booking.total_price,
+        })
+    apply_deltas(db, totals)
+
+
+def _booking_measures(db, model, flight_ids):
+    query = db.query(
+        model.flight_id,
+        func.count(model.id),
+        func.coalesce(func.sum(model.total_price), 0.0),
+        func.coalesce(func.sum(case((model.status == "confirmed", 1), else_=0)), 0),
+        func.coalesce(func.sum(case((model.status == "confirmed", model.total_price), else_=0.0)), 0.0),
+    )
+    if flight_ids is not None:
+        query = query.filter(model.flight_id.in_(flight_ids))
+    return {
+        flight_id: (count, booked, confirmed, revenue)
+        for flight_id, count, booked, confirmed, revenue in query.group_by(model.flight_id)
+    }
+
+
+def _contribution(totals, keys, total_seats, available_seats, base_price, measures):
+    count, booked, confirmed, revenue = measures or (0, 0.0, 0, 0.0)
+    _add(totals, keys, {
+        "flights": 1,
+        "capacity": total_seats or 0,
+        "seats_sold": (total_seats or 0) - (available_seats or 0),
+        "bookings": count,
+        "confirmed_bookings": confirmed,
+        "booked_value": booked,
+        "revenue": revenue,
+        "base_value": count * (base_price or 0.0),
+    })
+
+
+def _chunks(flight_ids):
+    if flight_ids is None:
+        yield None
+        return
+    flight_ids = list(flight_ids)
+    for start in range(0, len(flight_ids), SNAPSHOT_CHUNK):
+        yield flight_ids[start:start + SNAPSHOT_CHUNK]
+
+
+def flight_rollups(db, flight_ids=None):
+    """Rollup totals contributed by the given hot flights (all flights when None)"""
+    Origin = aliased(Airport)
+    Destination = aliased(Airport)
+    totals = _new_totals()
+    for chunk in _chunks(flight_ids):
+        query = db.query(
+            Flight.id, Airline.code, Origin.code, Destination.code, Flight.departure_time,
+            Flight.total_seats, Flight.available_seats, Flight.base_price,
+        ).outerjoin(Airline, Airline.id == Flight.airline_id) \
+         .outerjoin(Origin, Origin.id == Flight.origin_id) \
+         .outerjoin(Destination, Destination.id == Flight.destination_id)
+        if chunk is not None:
+            query = query.filter(Flight.id.in_(chunk))
+        measures = _booking_measures(db, Booking, chunk)
+        for flight_id, airline, origin, destination, departure, total, available, base in query:
+            _contribution(totals, rollup_keys(airline, origin, destination, departure), total, available, base, measures.get(flight_id))
+    return totals
+
+
+def archived_rollups(archive_db, airline_codes):
+    """Rollup totals for every archived flight; airline codes come from the hot airlines table"""
+    totals = _new_totals()
+    measures = _booking_measures(archive_db, ArchivedBooking, None)
+    flights = archive_db.query(
+        ArchivedFlight.id, ArchivedFlight.airline_id, ArchivedFlight.origin_code, ArchivedFlight.destination_code,
+        ArchivedFlight.departure_time, ArchivedFlight.total_seats, ArchivedFlight.available_seats, ArchivedFlight.base_price,
+    )
+    for flight_id, airline_id, origin, destination, departure, total, available, base in flights:
+        keys = rollup_keys(airline_codes.get(airline_id), origin, destination, departure)
+        _contribution(totals, keys, total, available, base, measures.get(flight_id))
+    return totals
+
+
+def difference(before, after):
+    totals = _new_totals()
+    for key, measures in after.items():
+        _add(totals, [key], measures)
+    for key, measures in before.items():
+        _add(totals, [key], measures, sign=-1)
+    return totals
+
+
+def _replace_rollups(db, totals):
+    rows = []
+    for (dimension, key), measures in sorted(totals.items()):
+        row = dict.fromkeys(MEASURES, 0)
+        row.update(measures, dimension=dimension, key=key)
+        rows.append(row)
+    db.query(AnalyticsRollup).delete(synchronize_session=False)
+    if rows:
+        db.execute(insert(AnalyticsRollup), rows)
+    db.commit()
+    return len(rows)
+
+
+def rebuild_rollups(include_archive=True):
+    """Recompute every rollup from the flight and booking tables and replace the summary rows on each shard"""
+    if include_archive:
+        ArchiveBase.metadata.create_all(bind=archive_engine)
+    count = 0
+    for shard in range(shard_map.count):
+        db = shard_map.session(shard)
+        try:
+            totals = flight_rollups(db)
+            if include_archive and shard == 0:
+                # Archived flights count towards the primary's rollups
+                airline_codes = dict(db.query(Airline.id, Airline.code).all())
+                archive_db = ArchiveSessionLocal()
+                try:
+                    for key, measures in archived_rollups(archive_db, airline_codes).items():
+                        _add(totals, [key], measures)
+                finally:
+                    archive_db.close()
+            count += _replace_rollups(db, totals)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    return count
+
+
+def rollups_missing():
+    """True when some shard has flights but no summary rows yet"""
+    return any(shard_map.gather(
+        lambda db: db.query(AnalyticsRollup.id).first() is None and db.query(Flight.id).first() is not None
+    ))
+
+
+def rollup_report(db, dimension, sort="revenue", limit=50):
+    """Summary rows for one dimension with derived load factor and fares, largest first"""
+    columns = [AnalyticsRollup.key] + [getattr(AnalyticsRollup, m) for m in MEASURES]
+    totals = _new_totals()
+    for rows in shard_map.gather(lambda s: s.query(*columns).filter(AnalyticsRollup.dimension == dimension).all(), db):
+        for key, *values in rows:
+            _add(totals, [key], dict(zip(MEASURES, values)))
+    report = []
+    for key, measures in totals.items():
+        row = {m: measures.get(m) or 0 for m in MEASURES}
+        if not row["flights"] and not row["bookings"]:
+            continue
+        item = {"key": key}
+        item.update(row)
+        item["booked_value"] = round(item["booked_value"], 2)
+        item["revenue"] = round(item["revenue"], 2)
+        item["base_value"] = round(item["base_value"], 2)
+        item["load_factor"] = round(row["seats_sold"] / row["capacity"], 4) if row["capacity"] else 0.0
+        item["average_fare"] = round(row["booked_value"] / row["bookings"], 2) if row["bookings"] else 0.0
+        item["fare_vs_base"] = round(row["booked_value"] / row["base_value"], 4) if row["base_value"] else 0.0
+        report.append(item)
+    if sort == "key":
+        report.sort(key=lambda item: item["key"])
+    else:
+        report.sort(key=lambda item: item.get(sort, 0), reverse=True)
+    return report[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Booking analytics rollups")
+    parser.add_argument("--rebuild", action="store_true", help="recompute all rollups from the flight and booking tables")
+    parser.add_argument("--no-archive", action="store_true", help="skip archived flights when rebuilding")
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.error("nothing to do; pass --rebuild")
+
+    started = time.perf_counter()
+    count = rebuild_rollups(include_archive=not args.no_archive)
+    print(f"Rebuilt {count} rollup rows in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
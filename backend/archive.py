@@ -0,0 +1,253 @@
+"""
+Hot/cold tiering: move departed flights with their seats and bookings into
+the archive database, then vacuum/analyze the hot tables. Every inventory
+shard is archived in turn.
+
+    python -m backend.archive --older-than-hours 24 --batch-size 200
+"""
+from datetime import datetime, timedelta
+import argparse
+import time
+
+from sqlalchemy import select, delete, insert, text, tuple_
+from sqlalchemy.orm import joinedload
+
+from backend.database import SessionLocal, ArchiveSessionLocal, shard_engines, archive_engine, ArchiveBase
+from backend.models import Flight, Seat, Booking, ArchivedFlight, ArchivedSeat, ArchivedBooking
+from backend.sharding import shard_map
+
+HOT_TABLES = ["bookings", "seats", "flights"]
+
+
+def _archive_rows(flights, seats, bookings):
+    seat_numbers = {s.id: s.seat_number for s in seats}
+    flight_rows = [
+        {
+            "id": f.id,
+            "flight_number": f.flight_number,
+            "airline_id": f.airline_id,
+            "airline_name": f.airline.name if f.airline else None,
+            "origin_id": f.origin_id,
+            "origin_code": f.origin.code if f.origin else None,
+            "origin_city": f.origin.city if f.origin else None,
+            "destination_id": f.destination_id,
+            "destination_code": f.destination.code if f.destination else None,
+            "destination_city": f.destination.city if f.destination else None,
+            "departure_time": f.departure_time,
+            "arrival_time": f.arrival_time,
+            "base_price": f.base_price,
+            "total_seats": f.total_seats,
+            "available_seats": f.available_seats,
+            "aircraft_type": f.aircraft_type,
+            "archived_at": datetime.utcnow(),
+        }
+        for f in flights
+    ]
+    seat_rows = [
+        {
+            "id": s.id,
+            "flight_id": s.flight_id,
+            "seat_number": s.seat_number,
+            "seat_class": s.seat_class,
+            "is_available": s.is_available,
+        }
+        for s in seats
+    ]
+    booking_rows = [
+        {
+            "id": b.id,
+            "pnr": b.pnr,
+            "unique_pin": b.unique_pin,
+            "flight_id": b.flight_id,
+            "seat_id": b.seat_id,
+            "seat_number": seat_numbers.get(b.seat_id),
+            "user_id": b.user_id,
+            "passenger_name": b.passenger_name,
+            "passenger_email": b.passenger_email,
+            "passenger_phone": b.passenger_phone,
+            "booking_date": b.booking_date,
+            "total_price": b.total_price,
+            "status": b.status,
+        }
+        for b in bookings
+    ]
+    return flight_rows, seat_rows, booking_rows
+
+
+def archive_batch(db, archive_db, flight_ids):
+    """
+    Copy one batch of flights into the archive, commit there, then delete the
+    hot rows. Archive rows are replaced by id, so re-running a batch that was
+    copied but not yet deleted is harmless.
+    """
+    flights = db.query(Flight).options(
+        joinedload(Flight.airline), joinedload(Flight.origin), joinedload(Flight.destination)
+    ).filter(Flight.id.in_(flight_ids)).all()
+    seats = db.query(Seat).filter(Seat.flight_id.in_(flight_ids)).all()
+    bookings = db.query(Booking).filter(Booking.flight_id.in_(flight_ids)).all()
+
+    flight_rows, seat_rows, booking_rows = _archive_rows(flights, seats, bookings)
+
+    archive_db.execute(delete(ArchivedBooking).where(ArchivedBooking.flight_id.in_(flight_ids)))
+    archive_db.execute(delete(ArchivedSeat).where(ArchivedSeat.flight_id.in_(flight_ids)))
+    archive_db.execute(delete(ArchivedFlight).where(ArchivedFlight.id.in_(flight_ids)))
+    if flight_rows:
+        archive_db.execute(insert(ArchivedFlight), flight_rows)
+    if seat_rows:
+        archive_db.execute(insert(ArchivedSeat), seat_rows)
+    if booking_rows:
+        archive_db.execute(insert(ArchivedBooking), booking_rows)
+    archive_db.commit()
+
+    db.expunge_all()
+    db.execute(delete(Booking).where(Booking.flight_id.in_(flight_ids)))
+    db.execute(delete(Seat).where(Seat.flight_id.in_(flight_ids)))
+    db.execute(delete(Flight).where(Flight.id.in_(flight_ids)))
+    db.commit()
+
+    return len(flight_rows), len(seat_rows), len(booking_rows)
+
+
+def vacuum_hot_tables(engine):
+    """Reclaim space and refresh planner statistics after large deletes"""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if engine.dialect.name == "sqlite":
+            conn.execute(text("VACUUM"))
+            conn.execute(text("ANALYZE"))
+        elif engine.dialect.name == "postgresql":
+            for table in HOT_TABLES:
+                conn.execute(text(f"VACUUM ANALYZE {table}"))
+        else:
+            for table in HOT_TABLES:
+                conn.execute(text(f"ANALYZE {table}"))
+
+
+def archive_departed_flights(older_than_hours=24, batch_size=200, vacuum=True):
+    """Archive every flight that departed more than older_than_hours ago, batch by batch"""
+    ArchiveBase.metadata.create_all(bind=archive_engine)
+    cutoff = datetime.now() - timedelta(hours=older_than_hours)
+    totals = {"flights": 0, "seats": 0, "bookings": 0}
+
+    for shard in range(shard_map.count):
+        db = shard_map.session(shard)
+        archive_db = ArchiveSessionLocal()
+        archived = 0
+        try:
+            while True:
+                flight_ids = db.scalars(
+                    select(Flight.id).where(Flight.departure_time < cutoff).order_by(Flight.id).limit(batch_size)
+                ).all()
+                if not flight_ids:
+                    break
+                flights, seats, bookings = archive_batch(db, archive_db, flight_ids)
+                _drop_directory_entries(flight_ids)
+                archived += flights
+                totals["flights"] += flights
+                totals["seats"] += seats
+                totals["bookings"] += bookings
+                print(f"Archived {totals['flights']} flights, {totals['seats']} seats, {totals['bookings']} bookings")
+        except Exception:
+            db.rollback()
+            archive_db.rollback()
+            raise
+        finally:
+            db.close()
+            archive_db.close()
+
+        if vacuum and archived:
+            vacuum_hot_tables(shard_engines[shard])
+    if totals["flights"]:
+        from backend.schedule_snapshot import schedule_snapshots
+        schedule_snapshots.schedule_changed()
+        schedule_snapshots.flush()
+    return totals
+
+
+def _drop_directory_entries(flight_ids):
+    if not shard_map.enabled:
+        return
+    db = SessionLocal()
+    try:
+        shard_map.drop(db, flight_ids)
+        db.commit()
+    finally:
+        db.close()
+
+
+def find_archived_booking(pnr):
+    """Archived booking rendered like get_booking's response, or None"""
+    archive_db = ArchiveSessionLocal()
+    try:
+        row = archive_db.query(ArchivedBooking, ArchivedFlight).join(
+            ArchivedFlight, ArchivedFlight.id == ArchivedBooking.flight_id
+        ).filter(ArchivedBooking.pnr == pnr).order_by(ArchivedBooking.booking_date.desc()).first()
+    finally:
+        archive_db.close()
+    if not row:
+        return None
+    return _archived_document(*row)
+
+
+def archived_user_bookings(user_id, statuses=None, before=None, limit=20):
+    """
+    A user's archived bookings rendered like get_booking's response, newest
+    first, starting after the (booking_date, id) keyset `before`
+    """
+    archive_db = ArchiveSessionLocal()
+    try:
+        query = archive_db.query(ArchivedBooking, ArchivedFlight).join(
+            ArchivedFlight, ArchivedFlight.id == ArchivedBooking.flight_id
+        ).filter(ArchivedBooking.user_id == user_id)
+        if statuses:
+            query = query.filter(ArchivedBooking.status.in_(statuses))
+        if before:
+            query = query.filter(tuple_(ArchivedBooking.booking_date, ArchivedBooking.id) < before)
+        rows = query.order_by(ArchivedBooking.booking_date.desc(), ArchivedBooking.id.desc()).limit(limit).all()
+    finally:
+        archive_db.close()
+    return [(booking.booking_date, booking.id, _archived_document(booking, flight)) for booking, flight in rows]
+
+
+def _archived_document(booking, flight):
+    return {
+        "id": booking.id,
+        "pnr": booking.pnr,
+        "unique_pin": booking.unique_pin,
+        "flight_number": flight.flight_number,
+        "passenger_name": booking.passenger_name,
+        "passenger_email": booking.passenger_email,
+        "passenger_phone": booking.passenger_phone,
+        "seat_number": booking.seat_number,
+        "total_price": booking.total_price,
+        "booking_date": booking.booking_date.isoformat(),
+        "status": booking.status,
+        "flight_details": {
+            "airline": flight.airline_name,
+            "origin": {
+                "code": flight.origin_code,
+                "city": flight.origin_city
+            },
+            "destination": {
+                "code": flight.destination_code,
+                "city": flight.destination_city
+            },
+            "departure_time": flight.departure_time.isoformat(),
+            "arrival_time": flight.arrival_time.isoformat()
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move departed flights, seats and bookings to the archive database")
+    parser.add_argument("--older-than-hours", type=float, default=24)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--no-vacuum", action="store_true")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    totals = archive_departed_flights(args.older_than_hours, args.batch_size, vacuum=not args.no_vacuum)
+    print(f"Archive complete in {time.perf_counter() - started:.1f}s: {totals}")
+
+
+if __name__ == "__main__":
+    main()
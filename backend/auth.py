@@ -0,0 +1,287 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import Header, HTTPException
+from sqlalchemy import event, inspect
+from sqlalchemy.exc import SQLAlchemyError
+
+from backend.database import SessionLocal
+from backend.models import PrincipalChange, RevokedSession, User
+
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+if not SESSION_SECRET:
+    # Tokens from one process will not verify in another; set SESSION_SECRET when running several workers
+    SESSION_SECRET = secrets.token_hex(32)
+    print("SESSION_SECRET not set; using a per-process secret (sessions end on restart)")
+
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(12 * 3600)))
+PRINCIPAL_CACHE_TTL_SECONDS = 60
+PRINCIPAL_CACHE_MAX_ENTRIES = 10000
+# How often a worker reads revocations made by other workers; a logout elsewhere
+# takes effect here within this many seconds (0 reads them on every check)
+SESSION_REVOCATION_SYNC_SECONDS = float(os.getenv("SESSION_REVOCATION_SYNC_SECONDS", "2"))
+# Recent revocations are re-read with this overlap, so a row committed late or
+# stamped by a skewed clock is still picked up
+REVOCATION_SYNC_OVERLAP = timedelta(seconds=60)
+# principal_changes rows older than this can no longer match a cached principal
+PRINCIPAL_CHANGE_RETENTION = timedelta(hours=1)
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(SESSION_SECRET.encode(), payload.encode(), hashlib.sha256).digest())
+
+
+def issue_session_token(user) -> str:
+    """Signed token carrying the user's id, name, email and admin flag"""
+    claims = {
+        "uid": user.id,
+        "email": user.email,
+        "name": user.name,
+        "adm": bool(user.is_admin),
+        "exp": int(time.time()) + SESSION_TTL_SECONDS,
+        "jti": secrets.token_hex(8),
+    }
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+class SessionDenylist:
+    """
+    Revoked token ids, kept only until the token would have expired anyway.
+    Revocations are written to the revoked_sessions table, and each process
+    re-reads the recent ones at most every SESSION_REVOCATION_SYNC_SECONDS,
+    so a logout on one worker ends the session on all of them. The same read
+    picks up principal_changes; on_change(jtis, user_ids) is told about both
+    so cached principals for them can be dropped.
+    """
+
+    def __init__(self, sync_seconds=SESSION_REVOCATION_SYNC_SECONDS, on_change=None):
+        self.sync_seconds = sync_seconds
+        self.on_change = on_change
+        self._revoked = {}
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._synced_at = None   # monotonic time of the last read
+        self._synced_from = None # database time the last read started
+
+    def revoke(self, jti, expires_at):
+        db = SessionLocal()
+        try:
+            db.merge(RevokedSession(jti=jti, expires_at=datetime.utcfromtimestamp(expires_at)))
+            db.query(RevokedSession).filter(RevokedSession.expires_at < datetime.utcnow()).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        with self._lock:
+            self._revoked[jti] = expires_at
+
+    def _sync(self):
+        if self._synced_at is not None and time.monotonic() - self._synced_at < self.sync_seconds:
+            return
+        if not self._sync_lock.acquire(blocking=False):
+            return  # another thread is reading; its result is as fresh as ours would be
+        try:
+            started = datetime.utcnow()
+            db = SessionLocal()
+            try:
+                query = db.query(RevokedSession.jti, RevokedSession.expires_at)
+                if self._synced_from is None:
+                    query = query.filter(RevokedSession.expires_at >= started)
+                    changed_users = []
+                else:
+                    since = self._synced_from - REVOCATION_SYNC_OVERLAP
+                    query = query.filter(RevokedSession.revoked_at >= since)
+                    changed_users = [user_id for user_id, in db.query(PrincipalChange.user_id)
+                                     .filter(PrincipalChange.changed_at >= since).distinct()]
+                rows = query.all()
+            except SQLAlchemyError as e:
+                print(f"Session revocation sync failed: {e}")
+                return
+            finally:
+                db.close()
+            now = time.time()
+            with self._lock:
+                for jti, expires_at in rows:
+                    self._revoked[jti] = (expires_at - datetime(1970, 1, 1)).total_seconds()
+                for stale in [k for k, exp in self._revoked.items() if exp < now]:
+                    del self._revoked[stale]
+            if self.on_change is not None and (rows or changed_users):
+                self.on_change({jti for jti, _ in rows}, set(changed_users))
+            self._synced_from = started
+            self._synced_at = time.monotonic()
+        finally:
+            self._sync_lock.release()
+
+    def is_revoked(self, jti):
+        self._sync()
+        return jti in self._revoked
+
+
+class PrincipalCache:
+    """
+    Bounded TTL cache of token -> verified principal, its admin flag already
+    confirmed against the users table, so repeat calls skip HMAC, decoding and
+    the database.
+    """
+
+    def __init__(self, max_entries=PRINCIPAL_CACHE_MAX_ENTRIES, ttl=PRINCIPAL_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            principal, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return principal
+
+    def put(self, token, principal):
+        with self._lock:
+            self._entries[token] = (principal, min(time.time() + self.ttl, principal["exp"]))
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, token):
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def evict(self, jtis=(), user_ids=()):
+        """Drop the principals of these token ids and of every token held by these users"""
+        with self._lock:
+            for token in [t for t, (p, _) in self._entries.items() if p["jti"] in jtis or p["id"] in user_ids]:
+                del self._entries[token]
+
+
+principal_cache = PrincipalCache()
+session_denylist = SessionDenylist(on_change=principal_cache.evict)
+
+
+@event.listens_for(User, "after_update")
+def _admin_rights_changed(mapper, connection, target):
+    """Record a change of users.is_admin so every worker drops its cached principals for the user"""
+    if not inspect(target).attrs.is_admin.history.has_changes():
+        return
+    now = datetime.utcnow()
+    table = PrincipalChange.__table__
+    connection.execute(table.insert().values(user_id=target.id, changed_at=now))
+    connection.execute(table.delete().where(table.c.changed_at < now - PRINCIPAL_CHANGE_RETENTION))
+    principal_cache.evict(user_ids={target.id})
+
+
+def _confirmed_admin(user_id) -> bool:
+    db = SessionLocal()
+    try:
+        return bool(db.query(User.is_admin).filter(User.id == user_id).scalar())
+    finally:
+        db.close()
+
+
+def verify_session_token(token: str) -> Optional[dict]:
+    """
+    Principal for a valid, unexpired, unrevoked token; None otherwise. An
+    admin claim is confirmed against the users table when the principal is
+    cached, so a cache hit reads the database only to sync revocations.
+    """
+    principal = principal_cache.get(token)
+    if principal is None:
+        try:
+            payload, signature = token.split(".", 1)
+            if not hmac.compare_digest(signature, _sign(payload)):
+                return None
+            claims = json.loads(_b64decode(payload))
+        except (ValueError, TypeError):
+            return None
+        if claims.get("exp", 0) < time.time():
+            return None
+        principal = {
+            "id": claims["uid"],
+            "email": claims.get("email"),
+            "name": claims.get("name"),
+            "is_admin": bool(claims.get("adm")) and _confirmed_admin(claims["uid"]),
+            "exp": claims["exp"],
+            "jti": claims.get("jti"),
+        }
+        principal_cache.put(token, principal)
+    if session_denylist.is_revoked(principal["jti"]):
+        return None
+    return principal
+
+
+def revoke_session_token(token: str) -> bool:
+    principal = verify_session_token(token)
+    if principal is None:
+        return False
+    session_denylist.revoke(principal["jti"], principal["exp"])
+    principal_cache.discard(token)
+    return True
+
+
+def bearer_token(authorization: Optional[str]) -> Optional[str]:
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    return token.strip()
+
+
+def get_optional_principal(authorization: Optional[str] = Header(None)) -> Optional[dict]:
+    """Dependency: the caller's principal if a valid bearer token was sent, else None"""
+    token = bearer_token(authorization)
+    if token is None:
+        return None
+    principal = verify_session_token(token)
+    if principal is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired session")
+    return principal
+
+
+def require_user(authorization: Optional[str] = Header(None)) -> dict:
+    principal = get_optional_principal(authorization)
+    if principal is None:
+        raise HTTPException(status_code=401, detail="Login required")
+    return principal
+
+
+def require_admin(authorization: Optional[str] = Header(None)) -> dict:
+    principal = get_optional_principal(authorization)
+    if principal is None:
+        raise HTTPException(status_code=401, detail="Admin user not provided")
+    if not principal["is_admin"]:
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    return principal
+
+
+def ensure_user_access(principal: Optional[dict], user_id: Optional[int]):
+    """A request acting for user_id must carry that user's session (or an admin's)"""
+    if user_id is None:
+        return
+    if principal is None:
+        raise HTTPException(status_code=401, detail="Login required")
+    if principal["id"] != user_id and not principal["is_admin"]:
+        raise HTTPException(status_code=403, detail="Cannot act on behalf of another user")
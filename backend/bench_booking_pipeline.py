@@ -0,0 +1,109 @@
+"""
+Benchmark: bookings per second through the per-request commit path versus
+the group-commit booking pipeline, on a freshly seeded scratch SQLite database.
+
+    python -m backend.bench_booking_pipeline --bookings 2000 --concurrency 200
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+# Point every engine at scratch files before any backend module creates one, on a
+# single unsharded primary. BOOKING_PIPELINE stays off so the per-request run really
+# commits per request; the pipeline run submits to the pipeline directly.
+_scratch = tempfile.mkdtemp(prefix="booking-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_scratch}/bench.db"
+os.environ["ARCHIVE_DATABASE_URL"] = f"sqlite:///{_scratch}/bench_archive.db"
+for _name in ("REPLICA_DATABASE_URL", "SHARD_DATABASE_URLS", "BOOKING_PIPELINE"):
+    os.environ.pop(_name, None)
+
+from fastapi import HTTPException, Response
+
+from backend.database import SessionLocal
+from backend.models import Seat
+from backend.seed_data import seed_database
+
+
+def _requests(count, flights):
+    """Booking payloads for the first `count` free seats on the first `flights` flights"""
+    db = SessionLocal()
+    try:
+        flight_ids = [row[0] for row in db.query(Seat.flight_id).distinct().order_by(Seat.flight_id).limit(flights)]
+        seats = db.query(Seat.id, Seat.flight_id).filter(
+            Seat.flight_id.in_(flight_ids), Seat.is_available == True
+        ).order_by(Seat.id).limit(count).all()
+    finally:
+        db.close()
+    return [
+        {
+            "flight_id": flight_id,
+            "seat_id": seat_id,
+            "passenger_name": f"Bench Passenger {i}",
+            "passenger_email": f"bench{i}@example.com",
+            "passenger_phone": "0000000000",
+            "user_id": None,
+        }
+        for i, (seat_id, flight_id) in enumerate(seats)
+    ]
+
+
+async def _run(requests, concurrency, call):
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = 0
+
+    async def one(request):
+        nonlocal failures
+        async with semaphore:
+            try:
+                await call(request)
+            except HTTPException:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(r) for r in requests))
+    return time.perf_counter() - started, failures
+
+
+async def bench_per_request(requests, concurrency):
+    from backend.main import _create_booking, BookingCreate
+
+    async def call(request):
+        db = SessionLocal()
+        try:
+            await _create_booking(BookingCreate(**request), Response(), db)
+        finally:
+            db.close()
+
+    return await _run(requests, concurrency, call)
+
+
+async def bench_pipeline(requests, concurrency):
+    from backend.booking_pipeline import booking_pipeline
+    return await _run(requests, concurrency, booking_pipeline.submit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-request commits with the group-commit booking pipeline")
+    parser.add_argument("--bookings", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--flights", type=int, default=10, help="spread bookings over this many flights")
+    args = parser.parse_args()
+
+    print(f"Scratch database: {_scratch}")
+    results = {}
+    for name, bench in (("per-request commit", bench_per_request), ("group-commit pipeline", bench_pipeline)):
+        seed_database()
+        requests = _requests(args.bookings, args.flights)
+        elapsed, failures = asyncio.run(bench(requests, args.concurrency))
+        results[name] = (len(requests) - failures) / elapsed
+        print(f"{name}: {len(requests)} requests, {failures} failed, {elapsed:.2f}s, {results[name]:.0f} bookings/s")
+
+    baseline = results["per-request commit"]
+    if baseline:
+        print(f"Speedup: {results['group-commit pipeline'] / baseline:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
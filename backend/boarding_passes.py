@@ -0,0 +1,209 @@
+"""
+Boarding passes and passenger manifests for ground staff.
+
+Pass images are rendered in a process pool and written into a ZIP as each
+render finishes. The ZIP is produced on a non-seekable stream and handed to
+the response chunk by chunk, so a full flight's archive is never held in
+memory.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import csv
+import io
+import multiprocessing
+import os
+import threading
+import zipfile
+
+import qrcode
+from PIL import Image, ImageDraw
+
+from backend.models import Booking, Flight, Seat
+
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", str(os.cpu_count() or 2)))
+# Renders submitted ahead of the one being written, bounding buffered images
+EXPORT_WINDOW = EXPORT_WORKERS * 2
+
+MANIFEST_FIELDS = [
+    "seat_number", "seat_class", "passenger_name", "passenger_email",
+    "passenger_phone", "pnr", "status", "booking_date",
+]
+
+
+def qr_payload(pnr, pin, flight_number, seat_number):
+    """Data encoded in a booking's QR code; gate scanners verify PNR and PIN"""
+    return f"PNR:{pnr}|PIN:{pin}|Flight:{flight_number}|Seat:{seat_number}"
+
+
+def qr_image(data):
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.make_image(fill_color="black", back_color="white").get_image()
+
+
+def render_qr_png(data):
+    img_io = io.BytesIO()
+    qr_image(data).save(img_io, "PNG")
+    return img_io.getvalue()
+
+
+def render_boarding_pass(boarding_pass):
+    """PNG boarding pass: passenger and flight details beside the booking's QR code"""
+    qr = qr_image(qr_payload(
+        boarding_pass["pnr"], boarding_pass["unique_pin"],
+        boarding_pass["flight_number"], boarding_pass["seat_number"],
+    )).convert("RGB")
+    lines = [
+        "BOARDING PASS",
+        "",
+        boarding_pass["passenger_name"],
+        f"Flight {boarding_pass['flight_number']}   Seat {boarding_pass['seat_number']} ({boarding_pass['seat_class']})",
+        f"{boarding_pass['origin']} -> {boarding_pass['destination']}",
+        f"Departs {boarding_pass['departure_time']}",
+        f"PNR {boarding_pass['pnr']}",
+    ]
+    image = Image.new("RGB", (qr.width + 420, max(qr.height, 24 * len(lines) + 40)), "white")
+    image.paste(qr, (0, 0))
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((qr.width + 10, 20 + 24 * i), line, fill="black")
+    out = io.BytesIO()
+    image.save(out, "PNG")
+    return out.getvalue()
+
+
+def flight_passengers(db, flight_id, statuses=("confirmed",)):
+    """(flight, [plain dict per booking]) in seat order, or (None, []) for an unknown flight"""
+    flight = db.query(Flight).filter(Flight.id == flight_id).first()
+    if flight is None:
+        return None, []
+    rows = db.query(Booking, Seat).join(Seat, Seat.id == Booking.seat_id).filter(
+        Booking.flight_id == flight_id, Booking.status.in_(statuses)
+    ).order_by(Seat.id).all()
+    passengers = [
+        {
+            "seat_number": seat.seat_number,
+            "seat_class": seat.seat_class,
+            "passenger_name": booking.passenger_name,
+            "passenger_email": booking.passenger_email,
+            "passenger_phone": booking.passenger_phone,
+            "pnr": booking.pnr,
+            "unique_pin": booking.unique_pin,
+            "status": booking.status,
+            "booking_date": booking.booking_date.isoformat() if booking.booking_date else "",
+            "flight_number": flight.flight_number,
+            "origin": flight.origin.code,
+            "destination": flight.destination.code,
+            "departure_time": flight.departure_time.strftime("%Y-%m-%d %H:%M"),
+        }
+        for booking, seat in rows
+    ]
+    return flight, passengers
+
+
+def manifest_csv(passengers):
+    """Yield the manifest as CSV text, one row at a time"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=MANIFEST_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    for passenger in passengers:
+        writer.writerow(passenger)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+class _ChunkStream:
+    """Write-only, non-seekable sink for ZipFile; written bytes are drained between entries"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _render_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a server process that runs threads is unsafe
+            _pool = ProcessPoolExecutor(max_workers=EXPORT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _discard_pool(pool):
+    """Forget a pool whose worker died so the next export starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _pass_filename(passenger):
+    return f"{passenger['seat_number']}-{passenger['pnr']}.png"
+
+
+async def boarding_pass_zip(passengers):
+    """
+    Async generator of ZIP bytes: manifest.csv, then one PNG per passenger
+    in render-completion order. At most EXPORT_WINDOW renders are pending.
+    """
+    loop = asyncio.get_running_loop()
+    pool = _render_pool()
+    stream = _ChunkStream()
+    archive = zipfile.ZipFile(stream, mode="w", compression=zipfile.ZIP_STORED)
+    pending = {}   # render future -> passenger
+    try:
+        archive.writestr("manifest.csv", "".join(manifest_csv(passengers)), compress_type=zipfile.ZIP_DEFLATED)
+        yield stream.drain()
+
+        queue = iter(passengers)
+        while True:
+            for passenger in queue:
+                pending[loop.run_in_executor(pool, render_boarding_pass, passenger)] = passenger
+                if len(pending) >= EXPORT_WINDOW:
+                    break
+            if not pending:
+                break
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                # PNGs are already compressed, so entries are stored as-is
+                archive.writestr(_pass_filename(pending.pop(future)), future.result())
+                yield stream.drain()
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
+        archive.close()
+    yield stream.drain()
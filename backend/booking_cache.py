@@ -0,0 +1,75 @@
+from collections import OrderedDict
+import hashlib
+import threading
+import time
+
+# Cached documents also expire after this long, bounding staleness when another
+# worker process changes a booking this one has cached.
+BOOKING_CACHE_TTL_SECONDS = 300
+BOOKING_CACHE_MAX_ENTRIES = 10000
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+def etag_matches(if_none_match, etag) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [t.strip() for t in if_none_match.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
+
+
+class BookingDocumentCache:
+    """
+    LRU of fully rendered booking responses keyed by PNR. Each entry keeps
+    the serialized JSON body, its ETag and the flight it belongs to so
+    flight edits can drop the affected documents.
+    """
+
+    def __init__(self, max_entries=BOOKING_CACHE_MAX_ENTRIES, ttl=BOOKING_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, pnr):
+        with self._lock:
+            entry = self._entries.get(pnr)
+            if entry is None:
+                return None
+            body, etag, flight_id, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[pnr]
+                return None
+            self._entries.move_to_end(pnr)
+            return body, etag
+
+    def put(self, pnr, body, flight_id):
+        etag = make_etag(body)
+        with self._lock:
+            self._entries[pnr] = (body, etag, flight_id, time.monotonic() + self.ttl)
+            self._entries.move_to_end(pnr)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag
+
+    def invalidate(self, *pnrs):
+        with self._lock:
+            for pnr in pnrs:
+                self._entries.pop(pnr, None)
+
+    def invalidate_flight(self, flight_id):
+        with self._lock:
+            stale = [pnr for pnr, entry in self._entries.items() if entry[2] == flight_id]
+            for pnr in stale:
+                del self._entries[pnr]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+booking_cache = BookingDocumentCache()
@@ -0,0 +1,251 @@
+"""
+Opt-in group-commit path for POST /api/bookings (BOOKING_PIPELINE=1).
+
+Requests are queued and a single writer task drains them in micro-batches,
+claiming every seat in a batch inside one transaction, so a flash sale pays
+for one commit per batch instead of one per booking. Each caller still gets
+its own success or error. With inventory shards, a batch is split into one
+transaction per shard.
+"""
+from datetime import datetime
+import asyncio
+import os
+
+from fastapi import HTTPException
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+
+from backend.models import Flight, Seat, Booking
+from backend.pricing_engine import DynamicPricingEngine, pricing_strategies
+from backend.analytics import record_bookings
+from backend.explore import explore_index
+from backend.sharding import shard_map
+
+BOOKING_PIPELINE_ENABLED = os.getenv("BOOKING_PIPELINE", "").lower() in ("1", "true", "yes")
+BOOKING_BATCH_SIZE = int(os.getenv("BOOKING_BATCH_SIZE", "64"))
+# How long the writer waits for more requests before committing a partial batch
+BOOKING_BATCH_WAIT_MS = float(os.getenv("BOOKING_BATCH_WAIT_MS", "5"))
+
+
+def booking_response(new_booking, flight, seat_number):
+    """Response body for a newly created booking"""
+    return {
+        "id": new_booking.id,
+        "pnr": new_booking.pnr,
+        "unique_pin": new_booking.unique_pin,
+        "flight_number": flight.flight_number,
+        "passenger_name": new_booking.passenger_name,
+        "seat_number": seat_number,
+        "total_price": new_booking.total_price,
+        "booking_date": new_booking.booking_date.isoformat(),
+        "status": new_booking.status,
+        "flight_details": {
+            "origin": flight.origin.city,
+            "destination": flight.destination.city,
+            "departure_time": flight.departure_time.isoformat(),
+            "arrival_time": flight.arrival_time.isoformat()
+        }
+    }
+
+
+def apply_booking_batch(db, requests):
+    """
+    Create bookings for a list of BookingCreate-shaped dicts in one transaction.
+    Seats are claimed with conditional UPDATEs, so a seat that is already
+    taken (including by an earlier request in the same batch) fails only
+    that request. Returns one of ("ok", response) / ("error", HTTPException)
+    per request, in order. Codes reserved for requests that fail are released.
+    """
+    codes = shard_map.booking_codes(db, [r["flight_id"] for r in requests])
+    try:
+        outcomes = _apply_booking_batch(db, requests, codes)
+    except Exception:
+        # On shard 0 this transaction holds the primary, where the codes are released
+        db.rollback()
+        shard_map.release_codes([pnr for pnr, _ in codes])
+        raise
+    shard_map.release_codes([pnr for (pnr, _), outcome in zip(codes, outcomes) if outcome[0] == "error"])
+    return outcomes
+
+
+def _apply_booking_batch(db, requests, codes):
+    flight_ids = {r["flight_id"] for r in requests}
+    flights = {
+        f.id: f for f in db.query(Flight).options(
+            joinedload(Flight.airline), joinedload(Flight.origin), joinedload(Flight.destination)
+        ).filter(Flight.id.in_(flight_ids)).all()
+    }
+    seat_numbers = dict(
+        db.query(Seat.id, Seat.seat_number).filter(Seat.id.in_({r["seat_id"] for r in requests})).all()
+    )
+    outcomes = []
+    created = []
+    sales = []
+    sold = {}
+    for request, (pnr, pin) in zip(requests, codes):
+        flight = flights.get(request["flight_id"])
+        if flight is None:
+            outcomes.append(("error", HTTPException(status_code=404, detail="Flight not found")))
+            continue
+
+        claimed = db.execute(
+            update(Seat)
+            .where(Seat.id == request["seat_id"], Seat.flight_id == flight.id, Seat.is_available == True)
+            .values(is_available=False)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not claimed:
+            outcomes.append(("error", HTTPException(status_code=400, detail="Seat not available")))
+            continue
+
+        current_price = DynamicPricingEngine.calculate_price(
+            flight.base_price,
+            flight.total_seats,
+            flight.available_seats - sold.get(flight.id, 0),
+            flight.departure_time,
+            strategy=pricing_strategies.for_flight(flight)
+        )
+        sold[flight.id] = sold.get(flight.id, 0) + 1
+
+        new_booking = Booking(
+            pnr=pnr,
+            unique_pin=pin,
+            flight_id=flight.id,
+            seat_id=request["seat_id"],
+            user_id=request.get("user_id"),
+            passenger_name=request["passenger_name"],
+            passenger_email=request["passenger_email"],
+            passenger_phone=request["passenger_phone"],
+            booking_date=datetime.utcnow(),
+            total_price=current_price,
+            status="pending"
+        )
+        db.add(new_booking)
+        created.append((len(outcomes), new_booking, flight))
+        sales.append((flight, current_price))
+        outcomes.append(None)
+
+    for flight_id, count in sold.items():
+        db.execute(
+            update(Flight)
+            .where(Flight.id == flight_id)
+            .values(available_seats=Flight.available_seats - count)
+            .execution_options(synchronize_session=False)
+        )
+    record_bookings(db, sales)
+
+    # Render while ids are assigned but before commit expires the loaded rows
+    db.flush()
+    for index, new_booking, flight in created:
+        outcomes[index] = ("ok", booking_response(new_booking, flight, seat_numbers.get(new_booking.seat_id)))
+    db.commit()
+    explore_index.flight_changed(*sold)
+    return outcomes
+
+
+def process_batch(requests):
+    """Run a batch with one transaction per inventory shard its flights live on"""
+    by_shard = {}
+    for index, request in enumerate(requests):
+        by_shard.setdefault(shard_map.shard_for_flight(request["flight_id"]), []).append(index)
+    if len(by_shard) == 1:
+        return process_shard_batch(next(iter(by_shard)), requests)
+    outcomes = [None] * len(requests)
+    for shard, indices in by_shard.items():
+        for index, outcome in zip(indices, process_shard_batch(shard, [requests[i] for i in indices])):
+            outcomes[index] = outcome
+    return outcomes
+
+
+def process_shard_batch(shard, requests):
+    """Run a batch in its own session; if the shared commit fails, retry each request alone"""
+    db = shard_map.session(shard)
+    try:
+        return apply_booking_batch(db, requests)
+    except Exception as e:
+        db.rollback()
+        error = e
+    finally:
+        db.close()
+
+    if len(requests) > 1:
+        return [outcome for request in requests for outcome in process_shard_batch(shard, [request])]
+    if isinstance(error, IntegrityError):
+        return [("error", HTTPException(status_code=409, detail="Seat already booked. Please select another seat."))]
+    print(f"Booking failed: {error}")
+    return [("error", HTTPException(status_code=500, detail="Booking failed. Please try again."))]
+
+
+class BookingPipeline:
+    """Queue of pending booking requests drained by one writer task in micro-batches"""
+
+    def __init__(self, batch_size=BOOKING_BATCH_SIZE, wait_ms=BOOKING_BATCH_WAIT_MS):
+        self.batch_size = batch_size
+        self.wait = wait_ms / 1000
+        self._queue = None
+        self._writer = None
+        self._loop = None
+        self.batches = 0
+        self.bookings = 0
+
+    def _ensure_writer(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Queue and writer belong to one event loop (e.g. a restarted test client gets a new one)
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._writer = None
+        if self._writer is None or self._writer.done():
+            self._writer = loop.create_task(self._run())
+
+    async def submit(self, request: dict) -> dict:
+        """Queue a booking and wait for its batch to commit; raises HTTPException on failure"""
+        self._ensure_writer()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((request, future))
+        status, result = await future
+        if status == "error":
+            raise result
+        return result
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.wait
+        while len(batch) < self.batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            requests = [request for request, _ in batch]
+            try:
+                outcomes = await loop.run_in_executor(None, process_batch, requests)
+            except Exception as e:
+                print(f"Booking writer error: {e}")
+                outcomes = [("error", HTTPException(status_code=500, detail="Booking failed. Please try again."))] * len(batch)
+            self.batches += 1
+            self.bookings += len(batch)
+            for (_, future), outcome in zip(batch, outcomes):
+                if not future.done():
+                    future.set_result(outcome)
+
+    def stats(self):
+        return {
+            "enabled": BOOKING_PIPELINE_ENABLED,
+            "batches": self.batches,
+            "requests": self.bookings,
+            "average_batch_size": round(self.bookings / self.batches, 2) if self.batches else 0,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+        }
+
+
+booking_pipeline = BookingPipeline()
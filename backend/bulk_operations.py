@@ -0,0 +1,261 @@
+from datetime import datetime, timedelta
+import threading
+import uuid
+
+from sqlalchemy import select, update, delete, insert, func, and_, true, cast, Numeric
+
+from backend.booking_cache import booking_cache
+from backend.analytics import flight_rollups, apply_deltas, difference
+from backend.explore import explore_index
+from backend.models import Airport, Airline, Flight, Seat, Booking
+from backend.schedule_snapshot import schedule_snapshots
+from backend.seed_data import generate_seat_layout
+from backend.sharding import shard_map
+
+# Flights are re-seated in chunks so progress can be reported and a single
+# statement never carries an unbounded IN list.
+SEAT_REGEN_CHUNK = 200
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def build_flight_filter(db, origin=None, destination=None, airline=None, date_from=None, date_to=None):
+    """
+    Translate bulk filter fields (airport/airline codes, YYYY-MM-DD dates) into
+    a list of SQL conditions on Flight. Unknown codes match nothing.
+    """
+    conditions = []
+
+    if origin:
+        conditions.append(Flight.origin_id == select(Airport.id).where(Airport.code == origin).scalar_subquery())
+    if destination:
+        conditions.append(Flight.destination_id == select(Airport.id).where(Airport.code == destination).scalar_subquery())
+    if airline:
+        conditions.append(Flight.airline_id == select(Airline.id).where(Airline.code == airline).scalar_subquery())
+    if date_from:
+        start = datetime.strptime(date_from, "%Y-%m-%d")
+        conditions.append(Flight.departure_time >= start)
+    if date_to:
+        end = datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1)
+        conditions.append(Flight.departure_time < end)
+
+    return conditions
+
+
+def _where(conditions):
+    return and_(true(), *conditions)
+
+
+def _booked_flights(conditions):
+    """Flight ids matched by the filter that have bookings (their seats cannot be regenerated)"""
+    return (
+        select(Booking.flight_id)
+        .join(Flight, Flight.id == Booking.flight_id)
+        .where(_where(conditions))
+        .distinct()
+    )
+
+
+def _shift_expr(db, column, minutes):
+    if db.bind.dialect.name == "sqlite":
+        return func.datetime(column, f"{int(minutes):+d} minutes")
+    return column + timedelta(minutes=minutes)
+
+
+def preview_bulk_update(db, conditions, price_multiplier=None, aircraft_type=None, shift_minutes=None):
+    """Dry run: report the row counts a bulk update would touch without writing"""
+    matched = db.scalar(select(func.count(Flight.id)).where(_where(conditions)))
+    report = {"flights_matched": matched}
+
+    if price_multiplier is not None:
+        report["flights_repriced"] = matched
+    if shift_minutes:
+        report["flights_rescheduled"] = matched
+    if aircraft_type:
+        blocked = db.scalar(select(func.count()).select_from(_booked_flights(conditions).subquery()))
+        swappable = matched - blocked
+        seats_removed = db.scalar(
+            select(func.count(Seat.id))
+            .join(Flight, Flight.id == Seat.flight_id)
+            .where(_where(conditions), Flight.id.not_in(_booked_flights(conditions)))
+        )
+        report["flights_reequipped"] = swappable
+        report["flights_skipped_with_bookings"] = blocked
+        report["seats_removed"] = seats_removed
+        report["seats_created"] = swappable * len(generate_seat_layout(aircraft_type))
+
+    return report
+
+
+def _sum_reports(reports):
+    totals = {}
+    for report in reports:
+        for name, value in report.items():
+            totals[name] = totals.get(name, 0) + value
+    return totals
+
+
+def preview_sharded_bulk_update(db, conditions, **changes):
+    """preview_bulk_update added up over every inventory shard; `db` serves the primary"""
+    return _sum_reports(shard_map.gather(lambda s: preview_bulk_update(s, conditions, **changes), db))
+
+
+def apply_bulk_update(db, conditions, price_multiplier=None, aircraft_type=None, shift_minutes=None, progress=None, shard=0):
+    """
+    Apply a change set to every flight matching the filter with set-based
+    statements, in a single transaction. Aircraft swaps regenerate Seat rows
+    and are skipped for flights that already have bookings.
+    """
+    progress = progress or (lambda done, total, step: None)
+    report = {}
+    # Reschedule runs last so a date-range filter matches the same flights in every step
+    steps = [s for s, enabled in (
+        ("reequip", bool(aircraft_type)),
+        ("reprice", price_multiplier is not None),
+        ("reschedule", bool(shift_minutes)),
+    ) if enabled]
+    total = len(steps)
+
+    if aircraft_type:
+        layout = generate_seat_layout(aircraft_type)
+        flight_ids = db.scalars(
+            select(Flight.id).where(_where(conditions), Flight.id.not_in(_booked_flights(conditions)))
+        ).all()
+        blocked = db.scalar(select(func.count()).select_from(_booked_flights(conditions).subquery()))
+        seats_removed = 0
+        base_step = steps.index("reequip")
+
+        for start in range(0, len(flight_ids), SEAT_REGEN_CHUNK):
+            chunk = flight_ids[start:start + SEAT_REGEN_CHUNK]
+            seats_removed += db.execute(
+                delete(Seat).where(Seat.flight_id.in_(chunk)).execution_options(synchronize_session=False)
+            ).rowcount
+            db.execute(
+                update(Flight)
+                .where(Flight.id.in_(chunk))
+                .values(aircraft_type=aircraft_type, total_seats=len(layout), available_seats=len(layout))
+                .execution_options(synchronize_session=False)
+            )
+            db.execute(insert(Seat), shard_map.assign_ids(db, shard, Seat, [
+                {"flight_id": flight_id, "seat_number": seat_number, "seat_class": seat_class, "is_available": True}
+                for flight_id in chunk
+                for seat_number, seat_class in layout
+            ]))
+            done = min(start + SEAT_REGEN_CHUNK, len(flight_ids))
+            progress(base_step + done / len(flight_ids), total, "reequip")
+
+        report["flights_reequipped"] = len(flight_ids)
+        report["flights_skipped_with_bookings"] = blocked
+        report["seats_removed"] = seats_removed
+        report["seats_created"] = len(flight_ids) * len(layout)
+        progress(base_step + 1, total, "reequip")
+
+    if price_multiplier is not None:
+        result = db.execute(
+            update(Flight)
+            .where(_where(conditions))
+            .values(base_price=func.round(cast(Flight.base_price * price_multiplier, Numeric), 2))
+            .execution_options(synchronize_session=False)
+        )
+        report["flights_repriced"] = result.rowcount
+        progress(steps.index("reprice") + 1, total, "reprice")
+
+    if shift_minutes:
+        result = db.execute(
+            update(Flight)
+            .where(_where(conditions))
+            .values(
+                departure_time=_shift_expr(db, Flight.departure_time, shift_minutes),
+                arrival_time=_shift_expr(db, Flight.arrival_time, shift_minutes),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        report["flights_rescheduled"] = result.rowcount
+        progress(steps.index("reschedule") + 1, total, "reschedule")
+
+    db.commit()
+    return report
+
+
+def start_bulk_job(filters, changes):
+    """Register a bulk update job and return its id; run it with run_bulk_job"""
+    job_id = uuid.uuid4().hex
+    with _jobs_lock:
+        _jobs[job_id] = {
+            "id": job_id,
+            "status": "queued",
+            "progress": 0.0,
+            "step": None,
+            "filters": filters,
+            "changes": changes,
+            "result": None,
+            "error": None,
+            "created_at": datetime.utcnow().isoformat(),
+            "finished_at": None,
+        }
+    return job_id
+
+
+def run_bulk_job(job_id):
+    """Execute a queued bulk job in its own session, recording progress as it goes"""
+    job = get_bulk_job(job_id)
+    if job is None:
+        return
+
+    def progress(done, total, step):
+        with _jobs_lock:
+            _jobs[job_id]["progress"] = round(done / total, 3) if total else 1.0
+            _jobs[job_id]["step"] = step
+
+    with _jobs_lock:
+        _jobs[job_id]["status"] = "running"
+
+    # Each inventory shard is updated in its own transaction
+    reports = []
+    try:
+        for shard in range(shard_map.count):
+            def shard_progress(done, total, step, shard=shard):
+                progress(shard * total + done, shard_map.count * total, step)
+            reports.append(_run_bulk_update_on_shard(shard, job, shard_progress))
+        # Flight times in cached booking documents may have moved
+        booking_cache.clear()
+        explore_index.invalidate()
+        schedule_snapshots.schedule_changed()
+        with _jobs_lock:
+            _jobs[job_id].update(status="completed", progress=1.0, result=_sum_reports(reports))
+    except Exception as e:
+        print(f"Bulk job {job_id} failed: {e}")
+        if reports:
+            booking_cache.clear()
+            explore_index.invalidate()
+            schedule_snapshots.schedule_changed()
+        with _jobs_lock:
+            _jobs[job_id].update(status="failed", error=str(e))
+    finally:
+        with _jobs_lock:
+            _jobs[job_id]["finished_at"] = datetime.utcnow().isoformat()
+
+
+def _run_bulk_update_on_shard(shard, job, progress):
+    db = shard_map.session(shard)
+    try:
+        conditions = build_flight_filter(db, **job["filters"])
+        flight_ids = db.scalars(select(Flight.id).where(_where(conditions))).all()
+        rollups_before = flight_rollups(db, flight_ids)
+        result = apply_bulk_update(db, conditions, progress=progress, shard=shard, **job["changes"])
+        # Move the touched flights' contribution to their new day/capacity/base fare
+        apply_deltas(db, difference(rollups_before, flight_rollups(db, flight_ids)))
+        db.commit()
+        return result
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def get_bulk_job(job_id):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import time
+
+# Seat counts and prices in a shared search result are at most this old
+SEARCH_RESULT_TTL_SECONDS = float(os.getenv("SEARCH_RESULT_TTL_SECONDS", "1.5"))
+SEARCH_RESULT_MAX_ENTRIES = 5000
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key onto one in-flight
+    computation and keeps its result for a short TTL. Callers that arrive
+    while the computation runs await the same future instead of repeating it.
+    If the caller computing it is cancelled, a waiting caller computes it
+    instead of inheriting the cancellation.
+    """
+
+    def __init__(self, ttl=SEARCH_RESULT_TTL_SECONDS, max_entries=SEARCH_RESULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._inflight = {}
+        self._results = {}
+        self.requests = 0
+        self.computations = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+
+    async def do(self, key, compute):
+        """Result for key, computing it with `await compute()` only if nobody else is"""
+        self.requests += 1
+        now = time.monotonic()
+
+        cached = self._results.get(key)
+        if cached and cached[1] > now:
+            self.cache_hits += 1
+            return cached[0]
+
+        while key in self._inflight:
+            future = self._inflight[key]
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The leader's caller went away, not ours: the first waiter takes over
+                if future.cancelled() and not asyncio.current_task().cancelling():
+                    self.coalesced -= 1
+                    continue
+                raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.computations += 1
+        try:
+            result = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Followers see the error; nobody else needs to retrieve it
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        future.set_result(result)
+        if self.ttl > 0:
+            if len(self._results) >= self.max_entries:
+                self._evict(now)
+            self._results[key] = (result, time.monotonic() + self.ttl)
+        return result
+
+    def _evict(self, now):
+        expired = [k for k, (_, expires_at) in self._results.items() if expires_at <= now]
+        for k in expired:
+            del self._results[k]
+        if len(self._results) >= self.max_entries:
+            self._results.clear()
+
+    def clear(self):
+        self._results.clear()
+
+    def stats(self):
+        saved = self.coalesced + self.cache_hits
+        return {
+            "requests": self.requests,
+            "computations": self.computations,
+            "coalesced": self.coalesced,
+            "cache_hits": self.cache_hits,
+            "coalesce_ratio": round(saved / self.requests, 4) if self.requests else 0.0,
+            "in_flight": len(self._inflight),
+            "ttl_seconds": self.ttl,
+        }
+
+
+search_coalescer = SingleFlight()
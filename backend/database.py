@@ -1,14 +1,50 @@
 import os
+import time
+from fastapi import Request
 from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./flightbooker.db")
+# Optional read-only replica for search and lookup traffic; unset means reads go to the primary
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL")
+# After a write, the client's reads stay on the primary this long so it sees its own changes
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+# How long to stop trying the replica after it fails a connection check
+REPLICA_RETRY_SECONDS = 30
+STICKY_COOKIE = "read_primary_until"
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {})
+def _connect_args(url):
+    return {"check_same_thread": False} if "sqlite" in url else {}
+
+engine = create_engine(DATABASE_URL, connect_args=_connect_args(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+replica_engine = None
+ReplicaSessionLocal = None
+if REPLICA_DATABASE_URL:
+    replica_engine = create_engine(REPLICA_DATABASE_URL, connect_args=_connect_args(REPLICA_DATABASE_URL), pool_pre_ping=True)
+    ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+
+_replica_down_until = 0.0
+
+# Optional extra inventory shards. Flights with their seats and bookings are
+# spread over the primary (shard 0) and these databases by backend.sharding;
+# unset means the primary holds all inventory.
+SHARD_DATABASE_URLS = [url.strip() for url in os.getenv("SHARD_DATABASE_URLS", "").split(",") if url.strip()]
+shard_engines = [engine] + [create_engine(url, connect_args=_connect_args(url)) for url in SHARD_DATABASE_URLS]
+ShardSessionLocals = [SessionLocal] + [
+    sessionmaker(autocommit=False, autoflush=False, bind=shard_engine) for shard_engine in shard_engines[1:]
+]
+
+# Departed flights, their seats and bookings are moved here by backend.archive
+ARCHIVE_DATABASE_URL = os.getenv("ARCHIVE_DATABASE_URL", "sqlite:///./flightbooker_archive.db")
+archive_engine = create_engine(ARCHIVE_DATABASE_URL, connect_args=_connect_args(ARCHIVE_DATABASE_URL))
+ArchiveSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=archive_engine)
+
 Base = declarative_base()
+ArchiveBase = declarative_base()
 
 def get_db():
     db = SessionLocal()
@@ -16,3 +52,62 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def _open_replica_session():
+    """A replica session with a live connection, or None if the replica is unavailable"""
+    global _replica_down_until
+    if ReplicaSessionLocal is None or time.time() < _replica_down_until:
+        return None
+    db = ReplicaSessionLocal()
+    try:
+        db.connection()
+        return db
+    except OperationalError as e:
+        db.close()
+        _replica_down_until = time.time() + REPLICA_RETRY_SECONDS
+        print(f"Read replica unavailable, using primary for {REPLICA_RETRY_SECONDS}s: {e}")
+        return None
+
+def get_read_db(request: Request):
+    """Session for read-only endpoints: the replica, unless the client wrote recently or it is down"""
+    db = None
+    try:
+        sticky_until = float(request.cookies.get(STICKY_COOKIE, 0))
+    except ValueError:
+        sticky_until = 0
+    if sticky_until < time.time():
+        db = _open_replica_session()
+    db = db or SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def mark_recent_write(response):
+    """Pin the client's subsequent reads to the primary for READ_YOUR_WRITES_SECONDS"""
+    if replica_engine is None:
+        return
+    response.set_cookie(
+        STICKY_COOKIE,
+        str(time.time() + READ_YOUR_WRITES_SECONDS),
+        max_age=int(READ_YOUR_WRITES_SECONDS) + 1,
+        httponly=True,
+        samesite="lax",
+    )
+
+def sync_sqlite_replica():
+    """Copy the SQLite primary onto the SQLite replica file, for local replica testing"""
+    import sqlite3
+    if not (DATABASE_URL.startswith("sqlite:///") and REPLICA_DATABASE_URL and REPLICA_DATABASE_URL.startswith("sqlite:///")):
+        raise SystemExit("Both DATABASE_URL and REPLICA_DATABASE_URL must be sqlite:/// URLs")
+    source = sqlite3.connect(DATABASE_URL[len("sqlite:///"):])
+    target = sqlite3.connect(REPLICA_DATABASE_URL[len("sqlite:///"):])
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+    print(f"Replica {REPLICA_DATABASE_URL} synced from {DATABASE_URL}")
+
+if __name__ == "__main__":
+    sync_sqlite_replica()
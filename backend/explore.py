@@ -0,0 +1,264 @@
+"""
+"Explore from origin": the cheapest current fare per destination.
+
+Each origin keeps, per destination, a price-sorted array of its upcoming
+flights with seats left, and the same entries split into price-sorted
+arrays per departure day. Bookings and admin edits mark flights dirty and
+only those are re-read and repriced on the next query, so an answer costs
+O(destinations) without a date range and O(destinations x days in range)
+with one, instead of pricing every flight from the origin. Whole origins
+are repriced every EXPLORE_REFRESH_SECONDS because the time-to-departure
+multiplier drifts as departures approach.
+
+Rebuilds take the schedule (route, airline, departure, base price, flight
+number) from the shared schedule snapshot, publishing it if there is none,
+so workers do not each hydrate Flight rows for it. Seat counts move with
+every booking, so they are read fresh from every inventory shard in
+parallel as plain (id, available_seats) pairs; flights added or moved since
+the last publish are loaded from the shards whole.
+
+Dirty flights are tracked per process: a booking served by another worker
+reaches this one's index only at its next rebuild of that origin, so fares
+and seat counts can lag by up to EXPLORE_REFRESH_SECONDS.
+"""
+from bisect import insort
+from collections import namedtuple
+from datetime import datetime, timedelta
+import os
+import threading
+import time
+
+from sqlalchemy.orm import joinedload
+
+from backend.models import Airline, Airport, Flight
+from backend.pricing_engine import DynamicPricingEngine, pricing_strategies
+from backend.schedule_snapshot import schedule_snapshots
+from backend.sharding import shard_map
+
+EXPLORE_REFRESH_SECONDS = float(os.getenv("EXPLORE_REFRESH_SECONDS", "300"))
+
+
+class _MidpointNoise:
+    """Stands in for the random source so indexed fares carry no per-call jitter"""
+
+    def uniform(self, low, high):
+        return (low + high) / 2
+
+
+_MIDPOINT = _MidpointNoise()
+
+# The Flight attributes put() and pricing read, filled from a snapshot row
+ScheduleFlight = namedtuple("ScheduleFlight", [
+    "id", "flight_number", "airline", "origin", "destination", "destination_id",
+    "departure_time", "base_price", "total_seats", "available_seats",
+])
+
+
+def indexed_fare(flight, now=None):
+    return DynamicPricingEngine.calculate_price(
+        flight.base_price,
+        flight.total_seats,
+        flight.available_seats,
+        flight.departure_time,
+        now=now,
+        rng=_MIDPOINT,
+        strategy=pricing_strategies.for_flight(flight),
+    )
+
+
+def _destination_info(airport):
+    return {"code": airport.code, "name": airport.name, "city": airport.city}
+
+
+class OriginIndex:
+    """Price-sorted upcoming flights per destination for one origin airport"""
+
+    def __init__(self, origin_id):
+        self.origin_id = origin_id
+        self.built_at = time.monotonic()
+        self.by_destination = {}   # destination_id -> [(price, departure_time, flight_id)]
+        self.by_day = {}           # destination_id -> {departure date: [(price, departure_time, flight_id)]}
+        self.entries = {}          # flight_id -> (destination_id, entry)
+        self.flights = {}          # flight_id -> summary dict
+        self.destinations = {}     # destination_id -> airport info
+
+    def put(self, flight, now):
+        self.remove(flight.id)
+        if flight.available_seats <= 0 or flight.departure_time <= now:
+            return
+        entry = (indexed_fare(flight, now), flight.departure_time, flight.id)
+        insort(self.by_destination.setdefault(flight.destination_id, []), entry)
+        days = self.by_day.setdefault(flight.destination_id, {})
+        insort(days.setdefault(flight.departure_time.date(), []), entry)
+        self.entries[flight.id] = (flight.destination_id, entry)
+        self.flights[flight.id] = {
+            "flight_id": flight.id,
+            "flight_number": flight.flight_number,
+            "airline": flight.airline.code if flight.airline else None,
+            "available_seats": flight.available_seats,
+        }
+        if flight.destination_id not in self.destinations and flight.destination:
+            self.destinations[flight.destination_id] = _destination_info(flight.destination)
+
+    def remove(self, flight_id):
+        found = self.entries.pop(flight_id, None)
+        if found is None:
+            return
+        destination_id, entry = found
+        self.by_destination[destination_id].remove(entry)
+        days = self.by_day[destination_id]
+        day = entry[1].date()
+        days[day].remove(entry)
+        if not days[day]:
+            del days[day]
+        self.flights.pop(flight_id, None)
+
+    def _day_arrays(self, destination_id, first, last):
+        """Per-day arrays for departure dates first..last (last None = open-ended), walking whichever is fewer"""
+        days = self.by_day.get(destination_id, {})
+        if last is not None and (last - first).days < len(days):
+            dates = (first + timedelta(days=n) for n in range((last - first).days + 1))
+            return [days[date] for date in dates if date in days]
+        return [entries for date, entries in days.items() if date >= first and (last is None or date <= last)]
+
+    def cheapest(self, date_from, date_to, now):
+        """Cheapest bookable flight per destination departing in [date_from, date_to)"""
+        first = max(date_from, now).date() if date_from else now.date()
+        last = (date_to - timedelta(microseconds=1)).date() if date_to else None
+        results = []
+        for destination_id, entries in self.by_destination.items():
+            if date_from or date_to:
+                arrays = self._day_arrays(destination_id, first, last)
+            else:
+                arrays = [entries]
+            best = None
+            for array in arrays:
+                # Price-sorted, so the first entry in range is this array's cheapest; only flights
+                # departed since the last rebuild or outside a partial first/last day are skipped
+                for entry in array:
+                    departure = entry[1]
+                    if departure <= now:
+                        continue
+                    if date_from and departure < date_from:
+                        continue
+                    if date_to and departure >= date_to:
+                        continue
+                    if best is None or entry < best:
+                        best = entry
+                    break
+            if best is None:
+                continue
+            price, departure, flight_id = best
+            results.append({
+                "destination": self.destinations.get(destination_id),
+                "price": price,
+                "departure_time": departure.isoformat(),
+                **self.flights[flight_id],
+            })
+        results.sort(key=lambda r: r["price"])
+        return results
+
+
+class ExploreIndex:
+    def __init__(self, refresh_seconds=EXPLORE_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.origins = {}
+        self.dirty = set()
+        self._lock = threading.Lock()
+
+    def flight_changed(self, *flight_ids):
+        """Seats, fare inputs or schedule of these flights changed; reprice them on the next query"""
+        with self._lock:
+            self.dirty.update(flight_ids)
+
+    def invalidate(self):
+        """Drop everything, e.g. after a bulk change or a pricing reload"""
+        with self._lock:
+            self.origins.clear()
+            self.dirty.clear()
+
+    def _flights(self, db, *criteria):
+        """Matching flights from every shard, loaded with everything put() and pricing read"""
+        results = shard_map.gather(lambda s: s.query(Flight).options(
+            joinedload(Flight.airline), joinedload(Flight.origin), joinedload(Flight.destination)
+        ).filter(*criteria).all(), db)
+        return [flight for flights in results for flight in flights]
+
+    def _schedule_flights(self, db, origin_id, now):
+        """Upcoming flights from origin_id with seats left: snapshot schedule, current seat counts"""
+        criteria = (Flight.origin_id == origin_id, Flight.departure_time > now, Flight.available_seats > 0)
+        try:
+            snapshot = schedule_snapshots.ensure(db)
+        except (OSError, ValueError) as e:
+            print(f"Explore: schedule snapshot unavailable ({e}); reading flights from the database")
+            return self._flights(db, *criteria)
+        seats = {}
+        for rows in shard_map.gather(lambda s: s.query(Flight.id, Flight.available_seats).filter(*criteria).all(), db):
+            seats.update(rows)
+        airlines = {airline.id: airline for airline in db.query(Airline)}
+        airports = {airport.id: airport for airport in db.query(Airport)}
+        flights, missing = [], []
+        for flight_id, available in seats.items():
+            i = snapshot.position(flight_id)
+            if i is None or snapshot.origin_ids[i] != origin_id:
+                missing.append(flight_id)  # added or re-routed since the publish
+                continue
+            destination_id = snapshot.destination_ids[i]
+            flights.append(ScheduleFlight(
+                id=flight_id,
+                flight_number=snapshot.flight_number(i),
+                airline=airlines.get(snapshot.airline_ids[i]),
+                origin=airports.get(origin_id),
+                destination=airports.get(destination_id),
+                destination_id=destination_id,
+                departure_time=snapshot.departure(i),
+                base_price=snapshot.base_prices[i],
+                total_seats=snapshot.total_seats[i],
+                available_seats=available,
+            ))
+        if missing:
+            flights.extend(self._flights(db, Flight.id.in_(missing)))
+        return flights
+
+    def _build(self, db, origin_id, now):
+        index = OriginIndex(origin_id)
+        for flight in self._schedule_flights(db, origin_id, now):
+            index.put(flight, now)
+        return index
+
+    def _apply_dirty(self, db, now):
+        with self._lock:
+            dirty, self.dirty = self.dirty, set()
+        if not dirty:
+            return
+        flights = {f.id: f for f in self._flights(db, Flight.id.in_(dirty))}
+        with self._lock:
+            for flight_id in dirty:
+                for index in self.origins.values():
+                    index.remove(flight_id)
+                flight = flights.get(flight_id)
+                if flight is not None and flight.origin_id in self.origins:
+                    self.origins[flight.origin_id].put(flight, now)
+
+    def explore(self, db, origin_code, date_from=None, date_to=None):
+        """Cheapest fare per destination from origin_code, or None for an unknown airport"""
+        origin = db.query(Airport).filter(Airport.code == origin_code).first()
+        if origin is None:
+            return None
+        now = datetime.now()
+        with self._lock:
+            index = self.origins.get(origin.id)
+        if index is None or time.monotonic() - index.built_at > self.refresh_seconds:
+            index = self._build(db, origin.id, now)
+            with self._lock:
+                self.origins[origin.id] = index
+        self._apply_dirty(db, now)
+        with self._lock:
+            destinations = index.cheapest(date_from, date_to, now)
+        return {
+            "origin": _destination_info(origin),
+            "destinations": destinations,
+        }
+
+
+explore_index = ExploreIndex()
@@ -0,0 +1,239 @@
+"""
+Idempotency-Key support for POST /api/bookings and POST /api/payments.
+
+The first request with a key runs; its response is kept for
+IDEMPOTENCY_TTL_SECONDS and replayed to any retry with the same key and
+body. A retry that arrives while the original is still running in this
+process waits for it instead of running again. With IDEMPOTENCY_PERSIST=1,
+outcomes are also stored in the idempotency_keys table, so retries that land
+on another worker (or after a restart) get the stored response. While the
+original is still running on another worker they get a 409 with Retry-After.
+Server errors (5xx) are not kept, so those requests can be retried for real.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.exc import IntegrityError
+
+from backend.database import SessionLocal
+from backend.models import IdempotencyRecord
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+IDEMPOTENCY_PERSIST = os.getenv("IDEMPOTENCY_PERSIST", "").lower() in ("1", "true", "yes")
+# A persisted in-flight claim older than this is assumed abandoned (its worker died)
+IDEMPOTENCY_LOCK_SECONDS = 60
+IDEMPOTENCY_PURGE_INTERVAL = 300
+MAX_KEY_LENGTH = 255
+
+
+def scoped_key(endpoint, idempotency_key, principal=None):
+    """Keys are scoped per endpoint and per signed-in user so clients cannot collide"""
+    idempotency_key = idempotency_key.strip()
+    if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+    user = principal["id"] if principal else "-"
+    return f"{endpoint}:{user}:{idempotency_key}"
+
+
+def request_fingerprint(payload) -> str:
+    return hashlib.sha256(json.dumps(jsonable_encoder(payload), sort_keys=True).encode()).hexdigest()
+
+
+class _Outcome:
+    __slots__ = ("status_code", "body", "headers")
+
+    def __init__(self, status_code, body, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def response(self, replayed=False):
+        headers = dict(self.headers)
+        if replayed:
+            headers["Idempotent-Replayed"] = "true"
+        return Response(content=self.body, status_code=self.status_code, media_type="application/json", headers=headers)
+
+
+def _mismatch():
+    return HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request body")
+
+
+def _conflict():
+    return HTTPException(
+        status_code=409,
+        detail="A request with this Idempotency-Key is still being processed",
+        headers={"Retry-After": "1"},
+    )
+
+
+class IdempotencyStore:
+    def __init__(self, ttl=IDEMPOTENCY_TTL_SECONDS, max_entries=IDEMPOTENCY_MAX_ENTRIES, persist=IDEMPOTENCY_PERSIST):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.persist = persist
+        self._entries = OrderedDict()   # scope key -> (fingerprint, outcome, expires_at)
+        self._inflight = {}             # scope key -> (fingerprint, future)
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self.executed = 0
+        self.replayed = 0
+        self.joined = 0
+
+    # In-memory completed outcomes
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key, fingerprint, outcome, ttl=None):
+        with self._lock:
+            self._entries[key] = (fingerprint, outcome, time.monotonic() + (ttl or self.ttl))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    # Persistent table
+
+    def _claim(self, key, fingerprint):
+        """Stored outcome for key, or None after claiming it for this request; raises 409/422"""
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            self._maybe_purge(db, now)
+            record = db.query(IdempotencyRecord).filter(IdempotencyRecord.key == key).first()
+            if record is not None:
+                if record.fingerprint != fingerprint:
+                    raise _mismatch()
+                if record.state == "completed" and record.expires_at > now:
+                    ttl = (record.expires_at - now).total_seconds()
+                    outcome = _Outcome(record.response_status, record.response_body.encode())
+                    self._put(key, fingerprint, outcome, ttl)
+                    return outcome
+                if record.state == "in_flight" and record.created_at > now - timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS):
+                    raise _conflict()
+                db.delete(record)
+                db.flush()
+            db.add(IdempotencyRecord(
+                key=key, fingerprint=fingerprint, state="in_flight",
+                created_at=now, expires_at=now + timedelta(seconds=self.ttl),
+            ))
+            db.commit()
+            return None
+        except IntegrityError:
+            # Another worker claimed it between our read and insert
+            db.rollback()
+            raise _conflict()
+        finally:
+            db.close()
+
+    def _finish(self, key, outcome):
+        db = SessionLocal()
+        try:
+            query = db.query(IdempotencyRecord).filter(IdempotencyRecord.key == key)
+            if outcome is None:
+                query.delete(synchronize_session=False)
+            else:
+                query.update({
+                    "state": "completed",
+                    "response_status": outcome.status_code,
+                    "response_body": outcome.body.decode(),
+                }, synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Could not store idempotent response for {key}: {e}")
+        finally:
+            db.close()
+
+    def _maybe_purge(self, db, now):
+        if time.monotonic() - self._last_purge < IDEMPOTENCY_PURGE_INTERVAL:
+            return
+        self._last_purge = time.monotonic()
+        db.query(IdempotencyRecord).filter(IdempotencyRecord.expires_at < now).delete(synchronize_session=False)
+        db.commit()
+
+    async def execute(self, key, fingerprint, handler):
+        """
+        Response for the request identified by key: replayed, shared with an
+        identical in-flight request, or produced by `await handler()`.
+        """
+        entry = self._get(key)
+        if entry is not None:
+            if entry[0] != fingerprint:
+                raise _mismatch()
+            self.replayed += 1
+            return entry[1].response(replayed=True)
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            if inflight[0] != fingerprint:
+                raise _mismatch()
+            self.joined += 1
+            outcome = await asyncio.shield(inflight[1])
+            return outcome.response(replayed=True)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = (fingerprint, future)
+        outcome = None
+        claimed = False
+        try:
+            if self.persist:
+                outcome = self._claim(key, fingerprint)
+                if outcome is not None:
+                    self.replayed += 1
+                    return outcome.response(replayed=True)
+                claimed = True
+
+            self.executed += 1
+            try:
+                body = await handler()
+                outcome = _Outcome(200, json.dumps(jsonable_encoder(body)).encode())
+            except HTTPException as e:
+                outcome = _Outcome(e.status_code, json.dumps({"detail": e.detail}).encode(), e.headers)
+
+            if outcome.status_code < 500:
+                self._put(key, fingerprint, outcome)
+            return outcome.response()
+        finally:
+            self._inflight.pop(key, None)
+            keep = outcome is not None and outcome.status_code < 500
+            if claimed:
+                # Server errors release the claim so a retry runs again
+                self._finish(key, outcome if keep else None)
+            if outcome is not None:
+                future.set_result(outcome)
+            else:
+                # Waiters retry on their own rather than inherit an unexpected error
+                future.set_exception(_conflict())
+                future.exception()
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._entries)
+        return {
+            "entries": entries,
+            "in_flight": len(self._inflight),
+            "executed": self.executed,
+            "replayed": self.replayed,
+            "joined": self.joined,
+            "persistent": self.persist,
+        }
+
+
+idempotency_store = IdempotencyStore()
@@ -1,20 +1,43 @@
-from fastapi import FastAPI, Depends, HTTPException
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks, Header, Query, Response
 from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.orm import Session, joinedload, object_session
+from sqlalchemy import and_, tuple_
 from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta
 from typing import List, Optional
+import asyncio
+import base64
 import random
 import string
-import io
-import qrcode
 
-from backend.database import engine, get_db, Base
-from backend.models import Airport, Airline, Flight, Seat, Booking, User
-from backend.pricing_engine import DynamicPricingEngine
+from backend.database import engine, archive_engine, shard_engines, get_db, get_read_db, mark_recent_write, Base, ArchiveBase
+from backend.models import Airport, Airline, Flight, Seat, Booking, User, ArchivedBooking
+from backend.pricing_engine import DynamicPricingEngine, pricing_strategies
+from backend.seat_assignment import assign_seats
+from backend.archive import find_archived_booking, archived_user_bookings
+from backend.booking_pipeline import booking_pipeline, booking_response, BOOKING_PIPELINE_ENABLED
+from backend.coalescing import search_coalescer
+from backend.explore import explore_index
+from backend.airport_index import airport_suggestions
+from backend.idempotency import idempotency_store, scoped_key, request_fingerprint
+from backend.boarding_passes import flight_passengers, manifest_csv, boarding_pass_zip, qr_payload, render_qr_png
+from backend.analytics import (
+    record_bookings, record_payments, flight_rollups, apply_deltas, difference,
+    rebuild_rollups, rollups_missing, rollup_report, DIMENSIONS, SORTABLE,
+)
+from backend.static_assets import static_assets
+from backend.admission import (
+    booking_admission, payment_admission, waiting_room, search_executor, booking_executor, payment_executor,
+)
+from backend import bulk_operations
+from backend.sharding import shard_map, get_flight_db, get_flight_read_db, drop_stale_copies
+from backend.schedule_snapshot import schedule_snapshots
+from backend.booking_cache import booking_cache, make_etag, etag_matches
+from backend.auth import (
+    issue_session_token, revoke_session_token, get_optional_principal,
+    require_user, require_admin, ensure_user_access, bearer_token,
+)
 from pydantic import BaseModel
 import hashlib
 
@@ -22,6 +45,7 @@ import hashlib
 from backend import models
 
 Base.metadata.create_all(bind=engine)
+ArchiveBase.metadata.create_all(bind=archive_engine)
 
 # Ensure a default admin user exists
 def ensure_default_admin():
@@ -43,6 +67,11 @@ def ensure_default_admin():
 
 ## ensure_default_admin() will be called after migrations
 
+def ensure_analytics_rollups():
+    """Build the analytics rollups once for databases that have flights but no summary rows yet"""
+    if rollups_missing():
+        print(f"Built {rebuild_rollups()} analytics rollup rows")
+
 def generate_pin():
     """Generate a 6-digit numeric PIN"""
     return ''.join(random.choices(string.digits, k=6))
@@ -111,8 +140,51 @@ def migrate_users_table():
                 print(f"Migration warning (users.is_admin): {e}")
                 conn.rollback()
 
+# Airport change marker read by the typeahead index, on the primary and every shard copy
+def migrate_airports_table():
+    from sqlalchemy import inspect, text
+    for target_engine in shard_engines:
+        inspector = inspect(target_engine)
+        if 'airports' not in inspector.get_table_names():
+            continue
+        columns = [col['name'] for col in inspector.get_columns('airports')]
+        if 'updated_at' not in columns:
+            print("Migrating database: Adding airports.updated_at column...")
+            with target_engine.connect() as conn:
+                try:
+                    conn.execute(text("ALTER TABLE airports ADD COLUMN updated_at TIMESTAMP"))
+                    conn.commit()
+                    print("✓ Added airports.updated_at column")
+                except Exception as e:
+                    print(f"Migration warning (airports.updated_at): {e}")
+                    conn.rollback()
+
+# Booking history and manifest indexes for databases created before they existed
+def migrate_booking_indexes():
+    from sqlalchemy import inspect
+    targets = [(shard_engine, Booking.__table__) for shard_engine in shard_engines]
+    targets.append((archive_engine, ArchivedBooking.__table__))
+    for target_engine, table in targets:
+        if table.name not in inspect(target_engine).get_table_names():
+            continue
+        existing = {index["name"] for index in inspect(target_engine).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            print(f"Migrating database: Adding index {index.name}...")
+            try:
+                index.create(bind=target_engine)
+                print(f"✓ Added index {index.name}")
+            except Exception as e:
+                print(f"Migration warning ({index.name}): {e}")
+
 migrate_users_table()
+migrate_airports_table()
+migrate_booking_indexes()
 ensure_default_admin()
+# Extra inventory shards get the schema and a copy of the reference data
+shard_map.prepare()
+ensure_analytics_rollups()
 
 app = FastAPI(title="Flight Booking Simulator")
 
@@ -124,7 +196,7 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.mount("/static", StaticFiles(directory="frontend"), name="static")
+static_assets.load()
 
 class FlightSearchParams(BaseModel):
     origin: Optional[str] = None
@@ -150,6 +222,12 @@ class BookingCreate(BaseModel):
     passenger_phone: str
     user_id: Optional[int] = None
 
+class SeatAutoAssign(BaseModel):
+    count: int = 1
+    seat_class: Optional[str] = None   # "economy" or "business"; any class when omitted
+    preference: Optional[str] = None   # "window" or "aisle"
+    together: bool = True
+
 class AdminFlightCreate(BaseModel):
     flight_number: str
     airline_id: int
@@ -174,31 +252,45 @@ class AdminFlightUpdate(BaseModel):
     available_seats: Optional[int] = None
     aircraft_type: Optional[str] = None
 
+class AdminBulkFilter(BaseModel):
+    origin: Optional[str] = None       # airport code
+    destination: Optional[str] = None  # airport code
+    airline: Optional[str] = None      # airline code
+    date_from: Optional[str] = None    # YYYY-MM-DD, inclusive
+    date_to: Optional[str] = None      # YYYY-MM-DD, inclusive
+
+class AdminBulkChanges(BaseModel):
+    price_multiplier: Optional[float] = None
+    aircraft_type: Optional[str] = None
+    shift_minutes: Optional[int] = None
+
+class AdminBulkUpdate(BaseModel):
+    filters: AdminBulkFilter = AdminBulkFilter()
+    changes: AdminBulkChanges
+    dry_run: bool = False
+
 class PaymentRequest(BaseModel):
     booking_ids: List[int]
     payment_method: str  # "card", "upi", "netbanking", etc.
     payment_details: Optional[dict] = None
 
 @app.get("/")
-async def read_root():
-    return FileResponse("frontend/index.html")
+async def read_root(accept_encoding: Optional[str] = Header(None), if_none_match: Optional[str] = Header(None)):
+    return static_assets.page("index.html", accept_encoding, if_none_match)
 
 @app.get("/admin")
-async def admin_page():
-    return FileResponse("frontend/admin.html")
+async def admin_page(accept_encoding: Optional[str] = Header(None), if_none_match: Optional[str] = Header(None)):
+    return static_assets.page("admin.html", accept_encoding, if_none_match)
+
+@app.get("/static/{path:path}")
+async def static_file(path: str, accept_encoding: Optional[str] = Header(None), if_none_match: Optional[str] = Header(None)):
+    """Fingerprinted frontend assets, served precompressed with immutable caching"""
+    return static_assets.asset(path, accept_encoding, if_none_match)
 
 def hash_password(password: str) -> str:
     """Hash password using SHA256"""
     return hashlib.sha256(password.encode()).hexdigest()
 
-def require_admin(db: Session, admin_user_id: Optional[int]):
-    if not admin_user_id:
-        raise HTTPException(status_code=401, detail="Admin user not provided")
-    user = db.query(User).filter(User.id == admin_user_id).first()
-    if not user or not user.is_admin:
-        raise HTTPException(status_code=403, detail="Admin privileges required")
-    return user
-
 @app.post("/api/auth/register")
 async def register_user(user_data: UserRegister, db: Session = Depends(get_db)):
     """Register a new user"""
@@ -213,6 +305,13 @@ async def register_user(user_data: UserRegister, db: Session = Depends(get_db)):
         password_hash=hashed_password
     )
     db.add(new_user)
+    db.flush()
+    try:
+        # Shards get their copy before the primary commits, so no committed user is missing from a shard
+        shard_map.replicate(User, [new_user])
+    except Exception:
+        db.rollback()
+        raise HTTPException(status_code=500, detail="Registration failed. Please try again.")
     db.commit()
     db.refresh(new_user)
     
@@ -221,6 +320,7 @@ async def register_user(user_data: UserRegister, db: Session = Depends(get_db)):
         "email": new_user.email,
         "name": new_user.name,
         "is_admin": new_user.is_admin,
+        "token": issue_session_token(new_user),
         "message": "Registration successful"
     }
 
@@ -240,11 +340,18 @@ async def login_user(login_data: UserLogin, db: Session = Depends(get_db)):
         "email": user.email,
         "name": user.name,
         "is_admin": user.is_admin,
+        "token": issue_session_token(user),
         "message": "Login successful"
     }
 
+@app.post("/api/auth/logout")
+async def logout_user(principal: dict = Depends(require_user), authorization: Optional[str] = Header(None)):
+    """Revoke the caller's session token"""
+    revoke_session_token(bearer_token(authorization))
+    return {"message": "Logged out"}
+
 @app.get("/api/airports")
-async def get_airports(db: Session = Depends(get_db)):
+async def get_airports(db: Session = Depends(get_read_db)):
     """Get all airports"""
     airports = db.query(Airport).all()
     return [
@@ -258,6 +365,11 @@ async def get_airports(db: Session = Depends(get_db)):
         for a in airports
     ]
 
+@app.get("/api/airports/suggest")
+async def suggest_airports(q: str = "", limit: int = 10, db: Session = Depends(get_read_db)):
+    """Airports whose code, city, name or country starts with q, best matches first"""
+    return airport_suggestions.suggest(db, q, limit)
+
 @app.get("/api/airlines")
 async def get_airlines(db: Session = Depends(get_db)):
     """Get all airlines"""
@@ -271,9 +383,43 @@ async def get_airlines(db: Session = Depends(get_db)):
         for a in airlines
     ]
 
+def _search_code(value: Optional[str]) -> Optional[str]:
+    return value.strip().upper() or None if value else None
+
+def _normalize_search(params: FlightSearchParams) -> FlightSearchParams:
+    """Canonical form of search params so equivalent searches share one computation"""
+    code = _search_code
+    return FlightSearchParams(
+        origin=code(params.origin),
+        destination=code(params.destination),
+        date=params.date.strip() if params.date else None,
+        airline=code(params.airline),
+        sort_by=params.sort_by,
+    )
+
 @app.post("/api/flights/search")
-async def search_flights(params: FlightSearchParams, db: Session = Depends(get_db)):
+async def search_flights(params: FlightSearchParams, db: Session = Depends(get_read_db)):
     """Search flights with filters and dynamic pricing"""
+    params = _normalize_search(params)
+    key = (params.origin, params.destination, params.date, params.airline, params.sort_by)
+    loop = asyncio.get_running_loop()
+    # Identical concurrent searches share one query; the work runs off the event loop
+    return await search_coalescer.do(key, lambda: loop.run_in_executor(search_executor, _search_flights, params, db))
+
+def _search_flights(params: FlightSearchParams, db: Session):
+    # Every inventory shard is searched in parallel and the results merged
+    results = [r for shard_results in shard_map.gather(lambda s: _search_shard(params, s), db) for r in shard_results]
+    
+    if params.sort_by == "price":
+        results.sort(key=lambda x: x["current_price"])
+    elif params.sort_by == "duration":
+        results.sort(key=lambda x: x["duration_hours"])
+    elif params.sort_by == "departure":
+        results.sort(key=lambda x: x["departure_time"])
+    
+    return results
+
+def _search_shard(params: FlightSearchParams, db: Session):
     query = db.query(Flight)
     
     if params.origin:
@@ -304,17 +450,20 @@ async def search_flights(params: FlightSearchParams, db: Session = Depends(get_d
     
     results = []
     for flight in flights:
+        strategy = pricing_strategies.for_flight(flight)
         current_price = DynamicPricingEngine.calculate_price(
             flight.base_price,
             flight.total_seats,
             flight.available_seats,
-            flight.departure_time
+            flight.departure_time,
+            strategy=strategy
         )
         
         price_trend = DynamicPricingEngine.get_price_trend(
             flight.base_price,
             flight.total_seats,
-            flight.available_seats
+            flight.available_seats,
+            strategy=strategy
         )
         
         duration = (flight.arrival_time - flight.departure_time).total_seconds() / 3600
@@ -347,17 +496,36 @@ async def search_flights(params: FlightSearchParams, db: Session = Depends(get_d
             "aircraft_type": flight.aircraft_type
         })
     
-    if params.sort_by == "price":
-        results.sort(key=lambda x: x["current_price"])
-    elif params.sort_by == "duration":
-        results.sort(key=lambda x: x["duration_hours"])
-    elif params.sort_by == "departure":
-        results.sort(key=lambda x: x["departure_time"])
-    
     return results
 
+@app.get("/api/explore")
+async def explore(
+    origin: str,
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Cheapest current fare per destination from an origin, optionally within a
+    departure date range. Served from this worker's explore index: bookings
+    made through other workers show up within EXPLORE_REFRESH_SECONDS.
+    """
+    try:
+        start = datetime.strptime(date_from, "%Y-%m-%d") if date_from else None
+        # `to` is inclusive
+        end = datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1) if date_to else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(search_executor, explore_index.explore, db, _search_code(origin), start, end)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Origin airport not found")
+    result["from"] = date_from
+    result["to"] = date_to
+    return result
+
 @app.get("/api/flights/{flight_id}/seats")
-async def get_flight_seats(flight_id: int, db: Session = Depends(get_db)):
+async def get_flight_seats(flight_id: int, db: Session = Depends(get_flight_read_db)):
     """Get all seats for a flight with availability status"""
     flight = db.query(Flight).filter(Flight.id == flight_id).first()
     if not flight:
@@ -376,13 +544,46 @@ async def get_flight_seats(flight_id: int, db: Session = Depends(get_db)):
         for s in all_seats
     ]
 
+@app.post("/api/flights/{flight_id}/seats/auto-assign")
+async def auto_assign_seats(flight_id: int, request: SeatAutoAssign, db: Session = Depends(get_flight_db)):
+    """Pick the best available seats for a party, keeping them together in a row when possible"""
+    if request.count < 1:
+        raise HTTPException(status_code=400, detail="count must be at least 1")
+    if request.preference not in (None, "window", "aisle"):
+        raise HTTPException(status_code=400, detail="preference must be 'window' or 'aisle'")
+    
+    flight = db.query(Flight).filter(Flight.id == flight_id).first()
+    if not flight:
+        raise HTTPException(status_code=404, detail="Flight not found")
+    
+    # Availability scan reads only the two columns the assignment needs
+    query = db.query(Seat.id, Seat.seat_number).filter(Seat.flight_id == flight_id, Seat.is_available == True)
+    if request.seat_class:
+        query = query.filter(Seat.seat_class == request.seat_class)
+    
+    seats, together = assign_seats(
+        flight.aircraft_type, query.all(), request.count, request.preference, request.together
+    )
+    if not seats:
+        raise HTTPException(status_code=400, detail="Not enough seats available")
+    
+    return {
+        "flight_id": flight_id,
+        "together": together,
+        "seats": [
+            {"id": seat_id, "seat_number": seat_number, "row": row, "position": position}
+            for seat_id, seat_number, row, col, position in seats
+        ]
+    }
+
 # Admin flight management endpoints
 @app.get("/api/admin/flights")
-async def admin_list_flights(admin_user_id: Optional[int] = None, db: Session = Depends(get_db)):
-    require_admin(db, admin_user_id)
-    flights = db.query(Flight).all()
-    return [
-        {
+async def admin_list_flights(admin: dict = Depends(require_admin), db: Session = Depends(get_db)):
+    shards = shard_map.gather(lambda s: [_admin_flight(f) for f in s.query(Flight).all()], db)
+    return [flight for flights in shards for flight in flights]
+
+def _admin_flight(f):
+    return {
             "id": f.id,
             "flight_number": f.flight_number,
             "airline_id": f.airline_id,
@@ -395,12 +596,17 @@ async def admin_list_flights(admin_user_id: Optional[int] = None, db: Session =
             "available_seats": f.available_seats,
             "aircraft_type": f.aircraft_type,
         }
-        for f in flights
-    ]
 
 @app.post("/api/admin/flights")
-async def admin_create_flight(payload: AdminFlightCreate, admin_user_id: Optional[int] = None, db: Session = Depends(get_db)):
-    require_admin(db, admin_user_id)
+async def admin_create_flight(payload: AdminFlightCreate, admin: dict = Depends(require_admin), db: Session = Depends(get_db)):
+    # New flights go to their route's inventory shard
+    shard = shard_map.route_shard(payload.origin_id, payload.destination_id)
+    if shard == 0:
+        return _create_flight(payload, db, shard, db)
+    with shard_map.session(shard) as shard_db:
+        return _create_flight(payload, shard_db, shard, db)
+
+def _create_flight(payload: AdminFlightCreate, db: Session, shard: int, primary_db: Session):
     try:
         new_flight = Flight(
             flight_number=payload.flight_number,
@@ -415,20 +621,35 @@ async def admin_create_flight(payload: AdminFlightCreate, admin_user_id: Optiona
             aircraft_type=payload.aircraft_type,
         )
         db.add(new_flight)
+        db.flush()
+        apply_deltas(db, flight_rollups(db, [new_flight.id]))
+        if db is primary_db:
+            shard_map.record(db, [new_flight.id], shard)
         db.commit()
-        db.refresh(new_flight)
-        return {"id": new_flight.id}
     except Exception:
         db.rollback()
         raise
+    if db is not primary_db:
+        # Shard first, directory last: the directory never points at a flight that was not written
+        try:
+            shard_map.record(primary_db, [new_flight.id], shard)
+            primary_db.commit()
+        except Exception:
+            primary_db.rollback()
+            # Without a directory entry the flight is unreachable, so take it off the shard again
+            drop_stale_copies(shard, [new_flight.id])
+            raise
+    explore_index.flight_changed(new_flight.id)
+    schedule_snapshots.schedule_changed()
+    return {"id": new_flight.id}
 
 @app.put("/api/admin/flights/{flight_id}")
-async def admin_update_flight(flight_id: int, payload: AdminFlightUpdate, admin_user_id: Optional[int] = None, db: Session = Depends(get_db)):
-    require_admin(db, admin_user_id)
+async def admin_update_flight(flight_id: int, payload: AdminFlightUpdate, admin: dict = Depends(require_admin), db: Session = Depends(get_flight_db)):
     flight = db.query(Flight).filter(Flight.id == flight_id).first()
     if not flight:
         raise HTTPException(status_code=404, detail="Flight not found")
     try:
+        rollups_before = flight_rollups(db, [flight_id])
         if payload.flight_number is not None:
             flight.flight_number = payload.flight_number
         if payload.airline_id is not None:
@@ -451,16 +672,20 @@ async def admin_update_flight(flight_id: int, payload: AdminFlightUpdate, admin_
             flight.available_seats = payload.available_seats
         if payload.aircraft_type is not None:
             flight.aircraft_type = payload.aircraft_type
+        db.flush()
+        apply_deltas(db, difference(rollups_before, flight_rollups(db, [flight_id])))
         db.commit()
         db.refresh(flight)
+        booking_cache.invalidate_flight(flight_id)
+        explore_index.flight_changed(flight_id)
+        schedule_snapshots.schedule_changed()
         return {"success": True}
     except Exception:
         db.rollback()
         raise
 
 @app.delete("/api/admin/flights/{flight_id}")
-async def admin_delete_flight(flight_id: int, admin_user_id: Optional[int] = None, db: Session = Depends(get_db)):
-    require_admin(db, admin_user_id)
+async def admin_delete_flight(flight_id: int, admin: dict = Depends(require_admin), db: Session = Depends(get_flight_db)):
     flight = db.query(Flight).filter(Flight.id == flight_id).first()
     if not flight:
         raise HTTPException(status_code=404, detail="Flight not found")
@@ -469,26 +694,200 @@ async def admin_delete_flight(flight_id: int, admin_user_id: Optional[int] = Non
         bookings_exist = db.query(Booking).filter(Booking.flight_id == flight_id).first()
         if bookings_exist:
             raise HTTPException(status_code=400, detail="Cannot delete flight with existing bookings")
+        apply_deltas(db, difference(flight_rollups(db, [flight_id]), {}))
         db.query(Seat).filter(Seat.flight_id == flight_id).delete()
         db.delete(flight)
         db.commit()
+        explore_index.flight_changed(flight_id)
+        schedule_snapshots.schedule_changed()
         return {"success": True}
     except HTTPException:
         db.rollback(); raise
     except Exception:
         db.rollback(); raise
 
-def generate_pnr():
-    """Generate a 6-character alphanumeric PNR"""
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+@app.get("/api/admin/flights/{flight_id}/manifest.csv")
+async def admin_flight_manifest(flight_id: int, admin: dict = Depends(require_admin), db: Session = Depends(get_flight_db)):
+    """Confirmed passengers for a flight in seat order, as CSV"""
+    flight, passengers = flight_passengers(db, flight_id)
+    if flight is None:
+        raise HTTPException(status_code=404, detail="Flight not found")
+    return StreamingResponse(
+        manifest_csv(passengers),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{flight.flight_number}-manifest.csv"'},
+    )
+
+@app.get("/api/admin/flights/{flight_id}/boarding-passes.zip")
+async def admin_flight_boarding_passes(flight_id: int, admin: dict = Depends(require_admin), db: Session = Depends(get_flight_db)):
+    """ZIP of every confirmed boarding pass plus the manifest, streamed as passes are rendered"""
+    flight, passengers = flight_passengers(db, flight_id)
+    if flight is None:
+        raise HTTPException(status_code=404, detail="Flight not found")
+    return StreamingResponse(
+        boarding_pass_zip(passengers),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{flight.flight_number}-boarding-passes.zip"'},
+    )
+
+@app.get("/api/admin/pricing")
+async def admin_get_pricing(admin: dict = Depends(require_admin)):
+    """Active pricing strategies and their route/airline assignments"""
+    return pricing_strategies.describe()
+
+@app.post("/api/admin/pricing/reload")
+async def admin_reload_pricing(admin: dict = Depends(require_admin)):
+    """Re-read the pricing config now instead of waiting for the mtime check"""
+    try:
+        pricing_strategies.reload()
+    except (OSError, ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid pricing config: {e}")
+    explore_index.invalidate()
+    return pricing_strategies.describe()
+
+@app.get("/api/admin/analytics")
+async def admin_analytics(dimension: str = "route", sort: str = "revenue", limit: int = 50, admin: dict = Depends(require_admin), db: Session = Depends(get_read_db)):
+    """Bookings, revenue, load factor and average fare per route, airline or departure day"""
+    if dimension not in DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"dimension must be one of {list(DIMENSIONS)}")
+    if sort not in SORTABLE:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {list(SORTABLE)}")
+    return rollup_report(db, dimension, sort=sort, limit=max(1, min(limit, 1000)))
+
+@app.get("/api/admin/booking-pipeline")
+async def admin_booking_pipeline_stats(admin: dict = Depends(require_admin)):
+    return booking_pipeline.stats()
+
+@app.get("/api/admin/admission")
+async def admin_admission_stats(admin: dict = Depends(require_admin)):
+    """Booking and payment lane load plus waiting room queues"""
+    return {
+        "bookings": booking_admission.stats(),
+        "payments": payment_admission.stats(),
+        "waiting_room": waiting_room.stats(),
+    }
+
+@app.get("/api/admin/idempotency")
+async def admin_idempotency_stats(admin: dict = Depends(require_admin)):
+    return idempotency_store.stats()
+
+@app.get("/api/admin/shards")
+async def admin_shard_stats(admin: dict = Depends(require_admin)):
+    """Flights and bookings per inventory shard"""
+    return shard_map.stats()
+
+@app.get("/api/admin/schedule-snapshot")
+async def admin_schedule_snapshot_stats(admin: dict = Depends(require_admin)):
+    return schedule_snapshots.stats()
+
+@app.post("/api/admin/schedule-snapshot/publish")
+async def admin_publish_schedule_snapshot(admin: dict = Depends(require_admin)):
+    """Rebuild the shared schedule snapshot from the database now"""
+    await asyncio.get_running_loop().run_in_executor(None, schedule_snapshots.publish)
+    return schedule_snapshots.stats()
+
+@app.get("/api/admin/search-coalescing")
+async def admin_search_coalescing_stats(admin: dict = Depends(require_admin)):
+    return search_coalescer.stats()
+
+@app.post("/api/admin/flights/bulk")
+async def admin_bulk_update_flights(payload: AdminBulkUpdate, background_tasks: BackgroundTasks, admin: dict = Depends(require_admin), db: Session = Depends(get_db)):
+    """Apply a change set to all flights matching a filter; dry_run only reports affected row counts"""
+    changes = payload.changes.model_dump()
+    if changes["price_multiplier"] is None and not changes["aircraft_type"] and not changes["shift_minutes"]:
+        raise HTTPException(status_code=400, detail="No changes provided")
+    if changes["price_multiplier"] is not None and changes["price_multiplier"] <= 0:
+        raise HTTPException(status_code=400, detail="price_multiplier must be positive")
+
+    filters = payload.filters.model_dump()
+    try:
+        conditions = bulk_operations.build_flight_filter(db, **filters)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+
+    if payload.dry_run:
+        return {"dry_run": True, **bulk_operations.preview_sharded_bulk_update(db, conditions, **changes)}
+
+    job_id = bulk_operations.start_bulk_job(filters, changes)
+    background_tasks.add_task(bulk_operations.run_bulk_job, job_id)
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued"})
+
+@app.get("/api/admin/jobs/{job_id}")
+async def admin_get_job(job_id: str, admin: dict = Depends(require_admin)):
+    job = bulk_operations.get_bulk_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 def generate_pin():
     """Generate a 6-digit numeric PIN"""
     return ''.join(random.choices(string.digits, k=6))
 
+@app.post("/api/waiting-room/{flight_id}")
+async def join_waiting_room(flight_id: int, db: Session = Depends(get_flight_read_db)):
+    """Take a place in a flight's waiting room; poll the token until admitted"""
+    if not db.query(Flight.id).filter(Flight.id == flight_id).first():
+        raise HTTPException(status_code=404, detail="Flight not found")
+    token = waiting_room.join(flight_id)
+    return waiting_room.status(token)
+
+@app.get("/api/waiting-room/status/{token}")
+async def waiting_room_status(token: str):
+    """Position in the queue, or admission expiry once admitted"""
+    status = waiting_room.status(token)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Waiting room token not found or expired")
+    return status
+
 @app.post("/api/bookings")
-async def create_booking(booking: BookingCreate, db: Session = Depends(get_db)):
+async def create_booking(
+    booking: BookingCreate,
+    response: Response,
+    principal: Optional[dict] = Depends(get_optional_principal),
+    db: Session = Depends(get_db),
+    x_waiting_room_token: Optional[str] = Header(None),
+    idempotency_key: Optional[str] = Header(None),
+):
+    """Create a new booking; retries sent with the same Idempotency-Key get the original response"""
+    ensure_user_access(principal, booking.user_id)
+    if not idempotency_key:
+        return await _admitted_booking(booking, response, db, x_waiting_room_token)
+    result = await idempotency_store.execute(
+        scoped_key("bookings", idempotency_key, principal),
+        request_fingerprint(booking),
+        lambda: _admitted_booking(booking, response, db, x_waiting_room_token),
+    )
+    if result.status_code < 300:
+        mark_recent_write(result)
+    return result
+
+async def _admitted_booking(booking: BookingCreate, response: Response, db: Session, x_waiting_room_token: Optional[str]):
+    """Create a booking through the flight's booking lane"""
+    admitted = waiting_room.is_admitted(x_waiting_room_token, booking.flight_id)
+    async with booking_admission.slot(booking.flight_id, priority=admitted):
+        result = await _create_booking(booking, response, db)
+    if admitted:
+        waiting_room.complete(x_waiting_room_token)
+    return result
+
+async def _create_booking(booking: BookingCreate, response: Response, db: Session):
     """Create a new booking with concurrent seat management"""
+    if BOOKING_PIPELINE_ENABLED:
+        result = await booking_pipeline.submit(booking.model_dump())
+        mark_recent_write(response)
+        return result
+    # Off the event loop, so the request holds its lane slot while the transaction runs
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(booking_executor, _book_seat_on_shard, booking, response, db)
+
+def _book_seat_on_shard(booking: BookingCreate, response: Response, db: Session):
+    with shard_map.flight_session(booking.flight_id, db) as flight_db:
+        return _book_seat(booking, response, flight_db)
+
+def _book_seat(booking: BookingCreate, response: Response, db: Session):
+    """The booking transaction, on the inventory shard holding the flight"""
+    # Codes reserved but not yet committed with the booking are given back on failure
+    unwritten_pnr = None
     try:
         flight = db.query(Flight).filter(Flight.id == booking.flight_id).with_for_update().first()
         if not flight:
@@ -506,19 +905,16 @@ async def create_booking(booking: BookingCreate, db: Session = Depends(get_db)):
             flight.base_price,
             flight.total_seats,
             flight.available_seats,
-            flight.departure_time
+            flight.departure_time,
+            strategy=pricing_strategies.for_flight(flight)
         )
         
         seat.is_available = False
         flight.available_seats -= 1
         
-        pnr = generate_pnr()
-        while db.query(Booking).filter(Booking.pnr == pnr).first():
-            pnr = generate_pnr()
-        
-        unique_pin = generate_pin()
-        while db.query(Booking).filter(Booking.unique_pin == unique_pin).first():
-            unique_pin = generate_pin()
+        # Unique across every inventory shard, not just this one
+        (pnr, unique_pin), = shard_map.booking_codes(db, [booking.flight_id])
+        unwritten_pnr = pnr
         
         new_booking = Booking(
             pnr=pnr,
@@ -534,26 +930,14 @@ async def create_booking(booking: BookingCreate, db: Session = Depends(get_db)):
         )
         
         db.add(new_booking)
+        record_bookings(db, [(flight, current_price)])
         db.commit()
+        unwritten_pnr = None
         db.refresh(new_booking)
+        explore_index.flight_changed(flight.id)
+        mark_recent_write(response)
         
-        return {
-            "id": new_booking.id,
-            "pnr": new_booking.pnr,
-            "unique_pin": new_booking.unique_pin,
-            "flight_number": flight.flight_number,
-            "passenger_name": new_booking.passenger_name,
-            "seat_number": seat.seat_number,
-            "total_price": new_booking.total_price,
-            "booking_date": new_booking.booking_date.isoformat(),
-            "status": new_booking.status,
-            "flight_details": {
-                "origin": flight.origin.city,
-                "destination": flight.destination.city,
-                "departure_time": flight.departure_time.isoformat(),
-                "arrival_time": flight.arrival_time.isoformat()
-            }
-        }
+        return booking_response(new_booking, flight, seat.seat_number)
     except HTTPException:
         db.rollback()
         raise
@@ -563,18 +947,43 @@ async def create_booking(booking: BookingCreate, db: Session = Depends(get_db)):
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail="Booking failed. Please try again.")
+    finally:
+        if unwritten_pnr:
+            shard_map.release_codes([unwritten_pnr])
 
 @app.post("/api/payments")
-async def process_payment(payment: PaymentRequest, db: Session = Depends(get_db)):
+async def process_payment(payment: PaymentRequest, response: Response, db: Session = Depends(get_db), idempotency_key: Optional[str] = Header(None)):
+    """Process payment and confirm bookings; retries with the same Idempotency-Key get the original response"""
+    if not idempotency_key:
+        return await _admitted_payment(payment, response, db)
+    result = await idempotency_store.execute(
+        scoped_key("payments", idempotency_key),
+        request_fingerprint(payment),
+        lambda: _admitted_payment(payment, response, db),
+    )
+    if result.status_code < 300:
+        mark_recent_write(result)
+    return result
+
+async def _admitted_payment(payment: PaymentRequest, response: Response, db: Session):
+    async with payment_admission.slot("payments"):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(payment_executor, _process_payment, payment, response, db)
+
+def _process_payment(payment: PaymentRequest, response: Response, db: Session):
     """Process payment and confirm bookings"""
+    # The bookings may live on several inventory shards; `db` serves the primary
+    sessions = shard_map.sessions(db)
     try:
         if not payment.booking_ids or len(payment.booking_ids) == 0:
             raise HTTPException(status_code=400, detail="No booking IDs provided")
         
         # Verify all bookings exist
-        all_bookings = db.query(Booking).filter(
-            Booking.id.in_(payment.booking_ids)
-        ).all()
+        all_bookings = [
+            b
+            for shard_db in sessions
+            for b in shard_db.query(Booking).filter(Booking.id.in_(payment.booking_ids)).all()
+        ]
         
         if len(all_bookings) != len(payment.booking_ids):
             found_ids = [b.id for b in all_bookings]
@@ -627,13 +1036,20 @@ async def process_payment(payment: PaymentRequest, db: Session = Depends(get_db)
         # Update all bookings to confirmed
         for booking in bookings:
             booking.status = "confirmed"
-        
-        db.commit()
+        # One commit per shard involved; a checkout normally covers one flight and so one shard
+        for shard_db in sessions:
+            shard_bookings = [b for b in bookings if object_session(b) is shard_db]
+            if shard_bookings:
+                record_payments(shard_db, shard_bookings)
+                shard_db.commit()
+        booking_cache.invalidate(*[b.pnr for b in bookings])
+        mark_recent_write(response)
         
         # Return updated booking information with all necessary details
         updated_bookings = []
         for booking in bookings:
-            db.refresh(booking)
+            booking_db = object_session(booking)
+            booking_db.refresh(booking)
             # Ensure relationships are loaded
             flight = booking.flight
             seat = booking.seat
@@ -642,7 +1058,7 @@ async def process_payment(payment: PaymentRequest, db: Session = Depends(get_db)
             # If it didn't exist, save it
             if not hasattr(booking, 'unique_pin') or not booking.unique_pin:
                 booking.unique_pin = unique_pin
-                db.commit()
+                booking_db.commit()
             updated_bookings.append({
                 "id": booking.id,
                 "pnr": booking.pnr,
@@ -671,54 +1087,37 @@ async def process_payment(payment: PaymentRequest, db: Session = Depends(get_db)
             "payment_method": payment.payment_method
         }
     except HTTPException:
-        db.rollback()
+        for shard_db in sessions:
+            shard_db.rollback()
         raise
     except Exception as e:
-        db.rollback()
+        for shard_db in sessions:
+            shard_db.rollback()
         import traceback
         error_detail = f"Payment processing failed: {str(e)}\n{traceback.format_exc()}"
         print(error_detail)  # Log for debugging
         raise HTTPException(status_code=500, detail=f"Payment processing failed: {str(e)}")
+    finally:
+        shard_map.close_sessions(sessions, db)
 
 @app.get("/api/bookings/{booking_id}/qrcode")
 async def get_booking_qrcode(booking_id: int, db: Session = Depends(get_db)):
     """Generate QR code for a booking"""
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
+    def lookup(shard_db):
+        booking = shard_db.query(Booking).filter(Booking.id == booking_id).first()
+        if booking:
+            # Create QR code data - include PNR and PIN for verification
+            return qr_payload(booking.pnr, booking.unique_pin, booking.flight.flight_number, booking.seat.seat_number)
     
-    if not booking:
+    qr_data = shard_map.find(lookup, db)
+    if not qr_data:
         raise HTTPException(status_code=404, detail="Booking not found")
     
-    # Create QR code data - include PNR and PIN for verification
-    qr_data = f"PNR:{booking.pnr}|PIN:{booking.unique_pin}|Flight:{booking.flight.flight_number}|Seat:{booking.seat.seat_number}"
-    
-    # Generate QR code
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(qr_data)
-    qr.make(fit=True)
-    
-    # Create image
-    img = qr.make_image(fill_color="black", back_color="white")
-    
-    # Convert to bytes
-    img_io = io.BytesIO()
-    img.save(img_io, 'PNG')
-    img_io.seek(0)
-    
-    return StreamingResponse(img_io, media_type="image/png")
+    # Render off the event loop
+    png = await asyncio.get_running_loop().run_in_executor(None, render_qr_png, qr_data)
+    return Response(content=png, media_type="image/png")
 
-@app.get("/api/bookings/{pnr}")
-async def get_booking(pnr: str, db: Session = Depends(get_db)):
-    """Retrieve booking by PNR"""
-    booking = db.query(Booking).filter(Booking.pnr == pnr).first()
-    
-    if not booking:
-        raise HTTPException(status_code=404, detail="Booking not found")
-    
+def _booking_document(booking):
     return {
         "id": booking.id,
         "pnr": booking.pnr,
@@ -746,6 +1145,110 @@ async def get_booking(pnr: str, db: Session = Depends(get_db)):
         }
     }
 
+def _booking_response(body: bytes, etag: str, if_none_match: Optional[str]):
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/api/bookings/{pnr}")
+async def get_booking(pnr: str, if_none_match: Optional[str] = Header(None), db: Session = Depends(get_read_db)):
+    """Retrieve booking by PNR"""
+    cached = booking_cache.get(pnr)
+    if cached:
+        return _booking_response(*cached, if_none_match)
+
+    def lookup(shard_db):
+        booking = shard_db.query(Booking).options(
+            joinedload(Booking.seat),
+            joinedload(Booking.flight).joinedload(Flight.airline),
+            joinedload(Booking.flight).joinedload(Flight.origin),
+            joinedload(Booking.flight).joinedload(Flight.destination),
+        ).filter(Booking.pnr == pnr).first()
+        if booking:
+            return _booking_document(booking), booking.status, booking.flight_id
+    
+    # PNRs are reserved per flight on the primary, so only one shard can hold this one
+    shard = shard_map.shard_for_pnr(pnr)
+    found = None
+    if shard is not None:
+        with shard_map.shard_session(shard, db) as shard_db:
+            found = lookup(shard_db)
+    if not found:
+        # Archived bookings never change, but their PNR can be issued again to a new
+        # booking, so they are not cached under it
+        archived = find_archived_booking(pnr)
+        if not archived:
+            raise HTTPException(status_code=404, detail="Booking not found")
+        body = JSONResponse(content=archived).body
+        return _booking_response(body, make_etag(body), if_none_match)
+    
+    document, status, flight_id = found
+    body = JSONResponse(content=document).body
+    # Pending bookings are confirmed by the payment path, possibly in another worker
+    if status == "pending":
+        etag = make_etag(body)
+    else:
+        etag = booking_cache.put(pnr, body, flight_id)
+    return _booking_response(body, etag, if_none_match)
+
+def _bookings_cursor(booking_date: datetime, booking_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{booking_date.isoformat()}|{booking_id}".encode()).decode()
+
+def _parse_bookings_cursor(cursor: str):
+    """(booking_date, id) keyset encoded by _bookings_cursor; 400 when malformed"""
+    try:
+        booking_date, _, booking_id = base64.urlsafe_b64decode(cursor.encode()).decode().partition("|")
+        return datetime.fromisoformat(booking_date), int(booking_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@app.get("/api/users/{user_id}/bookings")
+async def get_user_bookings(
+    user_id: int,
+    status: Optional[List[str]] = Query(None),
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    principal: dict = Depends(require_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    A user's bookings, newest first, including archived ones. Pass the
+    returned next_cursor to get the following page; every page is an index
+    range scan on (user_id, booking_date, id) however deep it is.
+    """
+    ensure_user_access(principal, user_id)
+    limit = max(1, min(limit, 100))
+    before = _parse_bookings_cursor(cursor) if cursor else None
+
+    def page(shard_db):
+        query = shard_db.query(Booking).options(
+            joinedload(Booking.seat),
+            joinedload(Booking.flight).joinedload(Flight.airline),
+            joinedload(Booking.flight).joinedload(Flight.origin),
+            joinedload(Booking.flight).joinedload(Flight.destination),
+        ).filter(Booking.user_id == user_id)
+        if status:
+            query = query.filter(Booking.status.in_(status))
+        if before:
+            query = query.filter(tuple_(Booking.booking_date, Booking.id) < before)
+        bookings = query.order_by(Booking.booking_date.desc(), Booking.id.desc()).limit(limit + 1).all()
+        return [(b.booking_date, b.id, _booking_document(b)) for b in bookings]
+
+    # Each shard and the archive return their own next page; merging them gives the overall one
+    pages = shard_map.gather(page, db)
+    pages.append(archived_user_bookings(user_id, status, before, limit + 1))
+    rows = {}
+    for booking_date, booking_id, document in (row for rows in pages for row in rows):
+        # A booking being archived can briefly be in both places
+        rows.setdefault(booking_id, (booking_date, booking_id, document))
+    rows = sorted(rows.values(), key=lambda row: (row[0], row[1]), reverse=True)
+    next_cursor = _bookings_cursor(*rows[limit - 1][:2]) if len(rows) > limit else None
+    return {
+        "bookings": [document for _, _, document in rows[:limit]],
+        "next_cursor": next_cursor,
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=5000)
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Date
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Date, Text, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
-from backend.database import Base
+from backend.database import Base, ArchiveBase
 from datetime import datetime
 import hashlib
 
@@ -24,6 +24,7 @@ class Airport(Base):
     name = Column(String(200))
     city = Column(String(100))
     country = Column(String(100))
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class Airline(Base):
     __tablename__ = "airlines"
@@ -64,6 +65,12 @@ class Seat(Base):
 
 class Booking(Base):
     __tablename__ = "bookings"
+    # A user's booking history, newest first, paged on (booking_date, id);
+    # and a flight's bookings by status for manifests and exports
+    __table_args__ = (
+        Index("ix_bookings_user_booking_date", "user_id", "booking_date", "id"),
+        Index("ix_bookings_flight_status", "flight_id", "status"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     pnr = Column(String(6), unique=True, index=True)
@@ -80,3 +87,135 @@ class Booking(Base):
     
     flight = relationship("Flight")
     seat = relationship("Seat")
+
+# Summary rows per route ("DEL-BOM"), airline code or departure day,
+# maintained incrementally by backend.analytics
+class AnalyticsRollup(Base):
+    __tablename__ = "analytics_rollups"
+    __table_args__ = (UniqueConstraint("dimension", "key", name="uq_analytics_rollups_dimension_key"),)
+    
+    id = Column(Integer, primary_key=True)
+    dimension = Column(String(10))
+    key = Column(String(20))
+    flights = Column(Integer, default=0)
+    capacity = Column(Integer, default=0)
+    seats_sold = Column(Integer, default=0)
+    bookings = Column(Integer, default=0)
+    confirmed_bookings = Column(Integer, default=0)
+    booked_value = Column(Float, default=0.0)
+    revenue = Column(Float, default=0.0)
+    base_value = Column(Float, default=0.0)
+
+# Stored outcomes of POST requests sent with an Idempotency-Key
+# (only used when IDEMPOTENCY_PERSIST is enabled)
+class IdempotencyRecord(Base):
+    __tablename__ = "idempotency_keys"
+    
+    id = Column(Integer, primary_key=True)
+    key = Column(String(300), unique=True, index=True)
+    fingerprint = Column(String(64))
+    state = Column(String(12), default="in_flight")  # in_flight -> completed
+    response_status = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, index=True)
+
+# Logged-out session tokens, by token id, until the token would have expired
+# anyway; every worker reads this table so a logout ends the session everywhere.
+class RevokedSession(Base):
+    __tablename__ = "revoked_sessions"
+
+    jti = Column(String(32), primary_key=True)
+    expires_at = Column(DateTime, index=True)
+    revoked_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+# Users whose admin rights changed; every worker reads these along with
+# revoked_sessions and drops its cached principals for them.
+class PrincipalChange(Base):
+    __tablename__ = "principal_changes"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, index=True)
+    changed_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+# Which inventory shard holds each flight (see backend.sharding). Kept on the
+# primary; flights without a row live on the primary (shard 0).
+class FlightShard(Base):
+    __tablename__ = "flight_shards"
+
+    flight_id = Column(Integer, primary_key=True)
+    shard = Column(Integer, default=0)
+    moved_at = Column(DateTime, default=datetime.utcnow)
+
+# Per-shard id counter for flights, seats and bookings on SQLite shards.
+# Ids are next_value * SHARD_ID_STRIDE + shard, so they never collide across
+# shards; PostgreSQL shards get the same ids from strided sequences instead.
+class ShardIdCounter(Base):
+    __tablename__ = "shard_id_counters"
+
+    name = Column(String(50), primary_key=True)
+    next_value = Column(Integer)
+
+# PNRs and PINs of hot bookings when inventory is sharded, kept on the primary
+# so a code issued on one shard can never be issued on another, and so a PNR
+# lookup can go straight to the shard holding its flight.
+class BookingCode(Base):
+    __tablename__ = "booking_codes"
+
+    pnr = Column(String(6), primary_key=True)
+    unique_pin = Column(String(6), unique=True)
+    flight_id = Column(Integer, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+# Archive tables live in the archive database and keep the hot-table ids.
+# Airline and airport details are copied onto the flight so archived
+# bookings can be rendered without the hot reference tables.
+class ArchivedFlight(ArchiveBase):
+    __tablename__ = "archived_flights"
+    
+    id = Column(Integer, primary_key=True)
+    flight_number = Column(String(10), index=True)
+    airline_id = Column(Integer)
+    airline_name = Column(String(200))
+    origin_id = Column(Integer)
+    origin_code = Column(String(3))
+    origin_city = Column(String(100))
+    destination_id = Column(Integer)
+    destination_code = Column(String(3))
+    destination_city = Column(String(100))
+    departure_time = Column(DateTime, index=True)
+    arrival_time = Column(DateTime)
+    base_price = Column(Float)
+    total_seats = Column(Integer)
+    available_seats = Column(Integer)
+    aircraft_type = Column(String(50))
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+class ArchivedSeat(ArchiveBase):
+    __tablename__ = "archived_seats"
+    
+    id = Column(Integer, primary_key=True)
+    flight_id = Column(Integer, index=True)
+    seat_number = Column(String(5))
+    seat_class = Column(String(20))
+    is_available = Column(Boolean)
+
+class ArchivedBooking(ArchiveBase):
+    __tablename__ = "archived_bookings"
+    __table_args__ = (Index("ix_archived_bookings_user_booking_date", "user_id", "booking_date", "id"),)
+    
+    id = Column(Integer, primary_key=True)
+    # Not unique: a PNR can be reissued once its booking has left the hot table
+    pnr = Column(String(6), index=True)
+    unique_pin = Column(String(6))
+    flight_id = Column(Integer, index=True)
+    seat_id = Column(Integer)
+    seat_number = Column(String(5))
+    user_id = Column(Integer, index=True)
+    passenger_name = Column(String(200))
+    passenger_email = Column(String(200))
+    passenger_phone = Column(String(20))
+    booking_date = Column(DateTime)
+    total_price = Column(Float)
+    status = Column(String(20))
@@ -1,59 +1,251 @@
 from datetime import datetime, timedelta
+from bisect import bisect_right
+import json
+import os
 import random
+import threading
+import time
+
+# Built-in tiers, used when no PRICING_CONFIG file is present. Each tier applies
+# while the measured value is below "below"; the last tier is open-ended.
+DEFAULT_STRATEGY = {
+    # occupancy rate -> demand multiplier, and the price trend label shown in
+    # search results; a tier without a trend keeps the one below it
+    "occupancy": [
+        {"below": 0.3, "value": 0.85, "trend": "low"},
+        {"below": 0.5, "value": 1.0},
+        {"below": 0.7, "value": 1.15, "trend": "moderate"},
+        {"below": 0.9, "value": 1.35, "trend": "high"},
+        {"value": 1.65},
+    ],
+    # hours to departure -> time multiplier
+    "time_to_departure": [
+        {"below": 24, "value": 1.5},
+        {"below": 48, "value": 1.3},
+        {"below": 168, "value": 1.1},
+        {"below": 720, "value": 1.0},
+        {"value": 0.9},
+    ],
+    "noise": [0.95, 1.05],
+}
+
+PRICING_CONFIG = os.getenv("PRICING_CONFIG")
+# Minimum seconds between checks of the config file's mtime
+RELOAD_CHECK_SECONDS = 1.0
+
+
+class TierTable:
+    """A tier ladder compiled into a sorted breakpoint list looked up with bisect"""
+
+    def __init__(self, tiers):
+        if not tiers or "below" in tiers[-1]:
+            raise ValueError("The last tier must be open-ended (no 'below')")
+        self.breakpoints = [float(t["below"]) for t in tiers[:-1]]
+        if self.breakpoints != sorted(self.breakpoints):
+            raise ValueError("Tier breakpoints must be ascending")
+        self.values = [t["value"] for t in tiers]
+
+    def lookup(self, x):
+        return self.values[bisect_right(self.breakpoints, x)]
+
+    def to_config(self):
+        tiers = [{"below": b, "value": v} for b, v in zip(self.breakpoints, self.values)]
+        return tiers + [{"value": self.values[-1]}]
+
+
+def _trend_tiers(occupancy_tiers):
+    """The occupancy ladder with each tier's trend label as its value"""
+    tiers, trend = [], "low"
+    for tier in occupancy_tiers:
+        trend = tier.get("trend", trend)
+        tiers.append({"below": tier["below"], "value": trend} if "below" in tier else {"value": trend})
+    return tiers
+
+
+class PricingStrategy:
+    """
+    A named set of occupancy and time-to-departure tiers. The price trend is
+    read from the occupancy tiers, so a label always changes where the demand
+    multiplier does.
+    """
+
+    def __init__(self, name, config):
+        if "trend" in config:
+            raise ValueError(f"Pricing strategy {name}: set trend labels on the occupancy tiers instead of a trend table")
+        self.name = name
+        occupancy = config.get("occupancy", DEFAULT_STRATEGY["occupancy"])
+        self.occupancy = TierTable(occupancy)
+        self.trend = TierTable(_trend_tiers(occupancy))
+        self.time_to_departure = TierTable(config.get("time_to_departure", DEFAULT_STRATEGY["time_to_departure"]))
+        self.noise_low, self.noise_high = config.get("noise", DEFAULT_STRATEGY["noise"])
+
+    def to_config(self):
+        occupancy = self.occupancy.to_config()
+        for tier, trend in zip(occupancy, self.trend.values):
+            tier["trend"] = trend
+        return {
+            "occupancy": occupancy,
+            "time_to_departure": self.time_to_departure.to_config(),
+            "noise": [self.noise_low, self.noise_high],
+        }
+
+
+class PricingStrategyRegistry:
+    """
+    Strategies loaded from a JSON config and selected per route or airline:
+
+        {
+          "default": "standard",
+          "strategies": {"standard": {...tiers...}, "peak": {...}},
+          "routes": {"DEL-BOM": "peak"},
+          "airlines": {"BMF2": "peak"}
+        }
+
+    A route mapping wins over an airline mapping. The config file is re-read
+    when its mtime changes, so edits take effect without a restart.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self._load(self._read_config())
+
+    def _read_config(self):
+        if not self.path or not os.path.exists(self.path):
+            self._mtime = None
+            return {"default": "standard", "strategies": {"standard": DEFAULT_STRATEGY}}
+        self._mtime = os.path.getmtime(self.path)
+        with open(self.path) as fh:
+            return json.load(fh)
+
+    def _load(self, config):
+        strategies = {name: PricingStrategy(name, tiers) for name, tiers in config.get("strategies", {}).items()}
+        if not strategies:
+            strategies["standard"] = PricingStrategy("standard", DEFAULT_STRATEGY)
+        default = config.get("default") or next(iter(strategies))
+        routes = config.get("routes", {})
+        airlines = config.get("airlines", {})
+        for name in [default, *routes.values(), *airlines.values()]:
+            if name not in strategies:
+                raise ValueError(f"Unknown pricing strategy: {name}")
+        # Swap in one assignment so readers never see a half-loaded config
+        self._state = (strategies, strategies[default], routes, airlines)
+
+    def reload(self):
+        """Re-read the config file; on error the previous strategies stay active"""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            self._load(self._read_config())
+
+    def _maybe_reload(self):
+        if not self.path:
+            return
+        now = time.monotonic()
+        if now - self._checked_at < RELOAD_CHECK_SECONDS:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+            if mtime != self._mtime:
+                self.reload()
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Pricing config reload failed, keeping previous strategies: {e}")
+
+    def select(self, airline_code=None, origin_code=None, destination_code=None):
+        self._maybe_reload()
+        strategies, default, routes, airlines = self._state
+        name = routes.get(f"{origin_code}-{destination_code}") or airlines.get(airline_code)
+        return strategies[name] if name else default
+
+    def get(self, name=None):
+        """Strategy by name, or the default strategy"""
+        self._maybe_reload()
+        strategies, default = self._state[:2]
+        if name is None:
+            return default
+        if name not in strategies:
+            raise KeyError(f"Unknown pricing strategy: {name}")
+        return strategies[name]
+
+    def for_flight(self, flight):
+        return self.select(flight.airline.code, flight.origin.code, flight.destination.code)
+
+    def describe(self):
+        self._maybe_reload()
+        strategies, default, routes, airlines = self._state
+        return {
+            "config_path": self.path,
+            "default": default.name,
+            "strategies": {name: s.to_config() for name, s in strategies.items()},
+            "routes": routes,
+            "airlines": airlines,
+        }
+
+
+pricing_strategies = PricingStrategyRegistry(PRICING_CONFIG)
+
 
 class DynamicPricingEngine:
-    
+
     @staticmethod
-    def calculate_price(base_price: float, total_seats: int, available_seats: int, departure_time: datetime) -> float:
+    def calculate_price(base_price: float, total_seats: int, available_seats: int, departure_time: datetime,
+                        now: datetime = None, rng: random.Random = None, strategy: PricingStrategy = None) -> float:
         """
         Calculate dynamic price based on:
         1. Seat availability (demand)
         2. Time to departure
         3. Random demand fluctuation
+
+        Tiers come from `strategy` (the default strategy when omitted).
+        `now` and `rng` default to the wall clock and the global random module;
+        simulations pass their own to replay prices at a simulated time.
         """
-        
+        strategy = strategy or pricing_strategies.select()
+
         occupancy_rate = (total_seats - available_seats) / total_seats if total_seats > 0 else 0
-        
-        if occupancy_rate < 0.3:
-            demand_multiplier = 0.85
-        elif occupancy_rate < 0.5:
-            demand_multiplier = 1.0
-        elif occupancy_rate < 0.7:
-            demand_multiplier = 1.15
-        elif occupancy_rate < 0.9:
-            demand_multiplier = 1.35
-        else:
-            demand_multiplier = 1.65
-        
-        time_to_departure = (departure_time - datetime.now()).total_seconds() / 3600
-        
-        if time_to_departure < 24:
-            time_multiplier = 1.5
-        elif time_to_departure < 48:
-            time_multiplier = 1.3
-        elif time_to_departure < 168:
-            time_multiplier = 1.1
-        elif time_to_departure < 720:
-            time_multiplier = 1.0
-        else:
-            time_multiplier = 0.9
-        
-        random_factor = random.uniform(0.95, 1.05)
-        
+        demand_multiplier = strategy.occupancy.lookup(occupancy_rate)
+
+        time_to_departure = (departure_time - (now or datetime.now())).total_seconds() / 3600
+        time_multiplier = strategy.time_to_departure.lookup(time_to_departure)
+
+        random_factor = (rng or random).uniform(strategy.noise_low, strategy.noise_high)
+
         final_price = base_price * demand_multiplier * time_multiplier * random_factor
-        
+
         return round(final_price, 2)
-    
+
+    @staticmethod
+    def calculate_prices(flights, now: datetime = None, rng: random.Random = None,
+                         strategy: PricingStrategy = None) -> list:
+        """
+        Batch form of calculate_price over (base_price, total_seats, available_seats,
+        departure_time) tuples, all priced at the same moment with one strategy.
+        The strategy's tables and the noise source are looked up once for the batch;
+        prices match calculate_price given the same random draws.
+        """
+        now = now or datetime.now()
+        strategy = strategy or pricing_strategies.select()
+        demand = strategy.occupancy.lookup
+        timing = strategy.time_to_departure.lookup
+        uniform = (rng or random).uniform
+        noise_low, noise_high = strategy.noise_low, strategy.noise_high
+        prices = []
+        for base_price, total_seats, available_seats, departure_time in flights:
+            occupancy_rate = (total_seats - available_seats) / total_seats if total_seats > 0 else 0
+            time_to_departure = (departure_time - now).total_seconds() / 3600
+            prices.append(round(
+                base_price * demand(occupancy_rate) * timing(time_to_departure) * uniform(noise_low, noise_high), 2
+            ))
+        return prices
+
     @staticmethod
-    def get_price_trend(base_price: float, total_seats: int, available_seats: int) -> str:
+    def get_price_trend(base_price: float, total_seats: int, available_seats: int,
+                        strategy: PricingStrategy = None) -> str:
         """
         Returns price trend indicator: 'low', 'moderate', or 'high'
         """
+        strategy = strategy or pricing_strategies.select()
         occupancy_rate = (total_seats - available_seats) / total_seats if total_seats > 0 else 0
-        
-        if occupancy_rate < 0.5:
-            return "low"
-        elif occupancy_rate < 0.8:
-            return "moderate"
-        else:
-            return "high"
+        return strategy.trend.lookup(occupancy_rate)
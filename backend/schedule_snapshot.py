@@ -0,0 +1,324 @@
+"""
+Columnar flight schedule snapshot shared by every process on the host.
+
+The schedule (ids, route, airline, departure/arrival, base price, seat
+counts and flight number) is written once as fixed-width columns to a file
+in shared memory (/dev/shm when available). Workers mmap it read-only and
+read the columns through typed memoryviews, so attaching costs a few
+milliseconds and no per-process copy, however many workers there are.
+
+Readers are the pricing simulation and the API's explore index, which
+takes everything but seat counts from here (those are as of the publish).
+The first reader publishes a snapshot if there is none; after that,
+schedule writes in the server and in the archive and rebalance jobs
+republish it, at most once per SCHEDULE_SNAPSHOT_REPUBLISH_SECONDS.
+
+A new version is written beside the old one and renamed over it. Readers
+notice the new inode on their next check and remap; a process still holding
+the old version keeps a valid mapping until it lets go.
+
+    python -m backend.schedule_snapshot --publish
+    python -m backend.schedule_snapshot --status
+"""
+from array import array
+from datetime import datetime, timedelta
+import argparse
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # no flock: concurrent publishers race and the last rename wins
+    fcntl = None
+
+from backend.database import DATABASE_URL, SessionLocal
+from backend.models import Flight
+from backend.sharding import shard_map
+
+_SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+# Named after the database so two deployments on one host never share a file
+SCHEDULE_SNAPSHOT_PATH = os.getenv(
+    "SCHEDULE_SNAPSHOT_PATH",
+    os.path.join(_SHM_DIR, f"flightbooker-schedule-{zlib.crc32(DATABASE_URL.encode()):08x}.bin"),
+)
+# A snapshot older than this is republished by ensure()
+SCHEDULE_SNAPSHOT_MAX_AGE = float(os.getenv("SCHEDULE_SNAPSHOT_MAX_AGE", "3600"))
+# How often a reader stats the file to pick up a newer version
+SCHEDULE_SNAPSHOT_CHECK_SECONDS = 1.0
+# Schedule writes within this window are folded into one republish
+SCHEDULE_SNAPSHOT_REPUBLISH_SECONDS = float(os.getenv("SCHEDULE_SNAPSHOT_REPUBLISH_SECONDS", "5"))
+
+MAGIC = b"FBSCHED1"
+# magic, row count, generation (publish time in ns), built_at (epoch seconds)
+HEADER = struct.Struct("<8sQqd")
+HEADER_SIZE = 64
+FLIGHT_NUMBER_WIDTH = 10
+EPOCH = datetime(1970, 1, 1)
+# (attribute, memoryview format, bytes per row); rows are ordered by departure, then id
+COLUMNS = [
+    ("ids", "q", 8),
+    ("airline_ids", "i", 4),
+    ("origin_ids", "i", 4),
+    ("destination_ids", "i", 4),
+    ("departures", "q", 8),
+    ("arrivals", "q", 8),
+    ("base_prices", "d", 8),
+    ("total_seats", "i", 4),
+    ("available_seats", "i", 4),
+    ("flight_numbers", "B", FLIGHT_NUMBER_WIDTH),
+    # Row positions in id order, for lookups by flight id
+    ("by_id", "i", 4),
+]
+
+
+def to_epoch(value):
+    """Naive datetimes are stored as whole seconds since 1970-01-01, without any timezone shift"""
+    return int((value - EPOCH).total_seconds())
+
+
+def from_epoch(seconds):
+    return EPOCH + timedelta(seconds=seconds)
+
+
+def _aligned(offset):
+    return (offset + 7) & ~7
+
+
+def _layout(count):
+    """Byte offset of every column, and the file size"""
+    offsets = {}
+    offset = HEADER_SIZE
+    for name, _, width in COLUMNS:
+        offsets[name] = offset
+        offset = _aligned(offset + width * count)
+    return offsets, offset
+
+
+def _schedule_rows(db):
+    """Plain column tuples from every shard; no ORM objects are built"""
+    columns = (
+        Flight.id, Flight.airline_id, Flight.origin_id, Flight.destination_id,
+        Flight.departure_time, Flight.arrival_time, Flight.base_price,
+        Flight.total_seats, Flight.available_seats, Flight.flight_number,
+    )
+    shards = shard_map.gather(lambda s: s.query(*columns).all(), db)
+    rows = [row for rows in shards for row in rows]
+    rows.sort(key=lambda r: (r[4], r[0]))
+    return rows
+
+
+def write_snapshot(path, rows):
+    """Write rows from _schedule_rows to path, replacing any previous version atomically"""
+    count = len(rows)
+    offsets, size = _layout(count)
+    columns = {
+        "ids": array("q", [r[0] for r in rows]),
+        "airline_ids": array("i", [r[1] or 0 for r in rows]),
+        "origin_ids": array("i", [r[2] or 0 for r in rows]),
+        "destination_ids": array("i", [r[3] or 0 for r in rows]),
+        "departures": array("q", [to_epoch(r[4]) for r in rows]),
+        "arrivals": array("q", [to_epoch(r[5]) for r in rows]),
+        "base_prices": array("d", [r[6] or 0.0 for r in rows]),
+        "total_seats": array("i", [r[7] or 0 for r in rows]),
+        "available_seats": array("i", [r[8] or 0 for r in rows]),
+        "flight_numbers": b"".join(
+            (r[9] or "").encode()[:FLIGHT_NUMBER_WIDTH].ljust(FLIGHT_NUMBER_WIDTH, b"\0") for r in rows
+        ),
+        "by_id": array("i", sorted(range(count), key=lambda i: rows[i][0])),
+    }
+    generation = time.time_ns()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as fh:
+        fh.truncate(size)
+        fh.write(HEADER.pack(MAGIC, count, generation, time.time()))
+        for name, _, _ in COLUMNS:
+            fh.seek(offsets[name])
+            fh.write(bytes(columns[name]))
+    os.replace(tmp_path, path)
+    return generation
+
+
+class ScheduleSnapshot:
+    """One mapped version of the snapshot; column attributes are read-only memoryviews"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as fh:
+            self.inode = os.fstat(fh.fileno()).st_ino
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.generation, self.built_at = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a schedule snapshot")
+        offsets, size = _layout(self.count)
+        if len(self._map) < size:
+            raise ValueError(f"{path} is truncated")
+        view = memoryview(self._map)
+        for name, fmt, width in COLUMNS:
+            start = offsets[name]
+            setattr(self, name, view[start:start + width * self.count].cast(fmt))
+
+    def __len__(self):
+        return self.count
+
+    def flight_number(self, i):
+        start = i * FLIGHT_NUMBER_WIDTH
+        return bytes(self.flight_numbers[start:start + FLIGHT_NUMBER_WIDTH]).rstrip(b"\0").decode()
+
+    def departure(self, i):
+        return from_epoch(self.departures[i])
+
+    def position(self, flight_id):
+        """Row of flight_id, or None when it is not in this version"""
+        by_id, ids = self.by_id, self.ids
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if ids[by_id[mid]] < flight_id:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self.count and ids[by_id[low]] == flight_id:
+            return by_id[low]
+        return None
+
+    def age(self):
+        return time.time() - self.built_at
+
+
+class ScheduleSnapshots:
+    """The current snapshot version for this process"""
+
+    def __init__(self, path=SCHEDULE_SNAPSHOT_PATH, max_age=SCHEDULE_SNAPSHOT_MAX_AGE,
+                 republish_seconds=SCHEDULE_SNAPSHOT_REPUBLISH_SECONDS):
+        self.path = path
+        self.max_age = max_age
+        self.republish_seconds = republish_seconds
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._republish = None
+        self.attaches = 0
+        self.publishes = 0
+
+    def current(self):
+        """Latest published version, or None when nothing has been published yet"""
+        now = time.monotonic()
+        with self._lock:
+            if self._snapshot is not None and now - self._checked_at < SCHEDULE_SNAPSHOT_CHECK_SECONDS:
+                return self._snapshot
+            self._checked_at = now
+            try:
+                inode = os.stat(self.path).st_ino
+            except FileNotFoundError:
+                return self._snapshot
+            if self._snapshot is None or self._snapshot.inode != inode:
+                # Readers still holding the old version keep its mapping alive
+                self._snapshot = ScheduleSnapshot(self.path)
+                self.attaches += 1
+            return self._snapshot
+
+    def publish(self, db=None):
+        """Read the schedule from every shard and replace the shared file"""
+        session = db or SessionLocal()
+        try:
+            rows = _schedule_rows(session)
+        finally:
+            if db is None:
+                session.close()
+        write_snapshot(self.path, rows)
+        self.publishes += 1
+        with self._lock:
+            self._checked_at = 0.0
+        return self.current()
+
+    def schedule_changed(self):
+        """
+        Flights were added, changed or removed: republish after
+        republish_seconds, folding in any further changes until then. Nothing
+        is published when no snapshot exists, since nobody is reading one.
+        """
+        with self._lock:
+            if self._republish is not None or not os.path.exists(self.path):
+                return
+            self._republish = threading.Timer(self.republish_seconds, self._republish_now)
+            self._republish.daemon = True
+            self._republish.start()
+
+    def _republish_now(self):
+        with self._lock:
+            self._republish = None
+        try:
+            self.publish()
+        except Exception as e:
+            print(f"Schedule snapshot republish failed: {e}")
+
+    def flush(self):
+        """Run a pending republish now; for jobs that exit right after their last write"""
+        with self._lock:
+            pending, self._republish = self._republish, None
+        if pending is not None:
+            pending.cancel()
+            self._republish_now()
+
+    def ensure(self, db=None):
+        """Current version, publishing first when it is missing or older than max_age"""
+        snapshot = self.current()
+        if snapshot is not None and snapshot.age() < self.max_age:
+            return snapshot
+        with open(f"{self.path}.lock", "w") as lock:
+            # One process publishes; the others wait and attach to its result
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            with self._lock:
+                self._checked_at = 0.0
+            snapshot = self.current()
+            if snapshot is not None and snapshot.age() < self.max_age:
+                return snapshot
+            return self.publish(db)
+
+    def stats(self):
+        snapshot = self.current()
+        return {
+            "path": self.path,
+            "flights": len(snapshot) if snapshot else 0,
+            "generation": snapshot.generation if snapshot else None,
+            "age_seconds": round(snapshot.age(), 1) if snapshot else None,
+            "bytes": os.path.getsize(self.path) if snapshot else 0,
+            "attaches": self.attaches,
+            "publishes": self.publishes,
+            "republish_pending": self._republish is not None,
+        }
+
+
+schedule_snapshots = ScheduleSnapshots()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish or inspect the shared schedule snapshot")
+    parser.add_argument("--publish", action="store_true", help="rebuild the snapshot from the database")
+    parser.add_argument("--status", action="store_true", help="print the current snapshot's size and age")
+    args = parser.parse_args()
+
+    if args.publish:
+        started = time.perf_counter()
+        snapshot = schedule_snapshots.publish()
+        print(f"Published {len(snapshot)} flights to {snapshot.path} in {time.perf_counter() - started:.2f}s")
+    if args.status or not args.publish:
+        started = time.perf_counter()
+        snapshot = schedule_snapshots.current()
+        if snapshot is None:
+            print(f"No snapshot at {schedule_snapshots.path}")
+            return
+        if not args.publish:
+            print(f"Attached in {(time.perf_counter() - started) * 1000:.1f}ms")
+        for key, value in schedule_snapshots.stats().items():
+            print(f"- {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+from functools import lru_cache
+import re
+
+from backend.seed_data import generate_seat_layout, SEATS_PER_ROW
+
+WINDOW_COLUMNS = {0, SEATS_PER_ROW - 1}
+# The aisle runs between the two halves of the row (C|D)
+AISLE_LEFT = SEATS_PER_ROW // 2 - 1
+AISLE_COLUMNS = {AISLE_LEFT, AISLE_LEFT + 1}
+
+_SEAT_NUMBER = re.compile(r"^(\d+)([A-Z])$")
+
+
+def _position(col):
+    if col in WINDOW_COLUMNS:
+        return "window"
+    if col in AISLE_COLUMNS:
+        return "aisle"
+    return "middle"
+
+
+def parse_seat_number(seat_number):
+    """(row, column index, position) for a seat number such as '12C'"""
+    match = _SEAT_NUMBER.match(seat_number or "")
+    if not match:
+        return None
+    col = ord(match.group(2)) - 65
+    return int(match.group(1)), col, _position(col)
+
+
+@lru_cache(maxsize=None)
+def seat_geometry(aircraft_type):
+    """Precomputed seat_number -> (row, column index, position) for an aircraft's cabin layout"""
+    return {seat_number: parse_seat_number(seat_number) for seat_number, _ in generate_seat_layout(aircraft_type)}
+
+
+def _preference_miss(cols, preference):
+    if preference == "window":
+        return 0 if WINDOW_COLUMNS & set(cols) else 1
+    if preference == "aisle":
+        return 0 if AISLE_COLUMNS & set(cols) else 1
+    return 0
+
+
+@lru_cache(maxsize=None)
+def _best_block(mask, count, preference):
+    """
+    Best run of `count` free columns in a row whose free columns are the bits
+    of `mask`, as (aisle_split, preference_miss, start); None if none fits.
+    Memoized, so a row is scored with one dict lookup.
+    """
+    best = None
+    for start in range(SEATS_PER_ROW - count + 1):
+        block = range(start, start + count)
+        if any(not mask >> c & 1 for c in block):
+            continue
+        crosses_aisle = start <= AISLE_LEFT < start + count - 1
+        # Crossing the aisle only matters when the group could fit on one side
+        aisle_split = 1 if crosses_aisle and count <= SEATS_PER_ROW // 2 else 0
+        key = (aisle_split, _preference_miss(block, preference), start)
+        if best is None or key < best:
+            best = key
+    return best
+
+
+def assign_seats(aircraft_type, available_seats, count, preference=None, together=True):
+    """
+    Pick the best `count` seats from available (seat_id, seat_number) pairs.
+
+    With `together`, a block of adjacent seats in one row is preferred, then a
+    block on one side of the aisle, then the requested window/aisle position,
+    then the front-most row. If no row can seat the whole group, the seats
+    spanning the fewest rows from the front are used instead.
+
+    Returns (list of (seat_id, seat_number, row, col, position), seated_together).
+    """
+    geometry = seat_geometry(aircraft_type)
+    rows = {}
+    masks = {}
+    for seat_id, seat_number in available_seats:
+        geo = geometry.get(seat_number) or parse_seat_number(seat_number)
+        if geo is None:
+            continue
+        row, col, position = geo
+        rows.setdefault(row, {})[col] = (seat_id, seat_number, row, col, position)
+        masks[row] = masks.get(row, 0) | 1 << col
+
+    total = sum(len(cols) for cols in rows.values())
+    if count > total:
+        return [], False
+
+    if not together or count == 1:
+        seats = [seat for cols in rows.values() for seat in cols.values()]
+        seats.sort(key=lambda s: (_preference_miss([s[3]], preference), s[2], s[3]))
+        return seats[:count], count == 1
+
+    if count <= SEATS_PER_ROW:
+        best_row, best_key = None, None
+        for row, mask in masks.items():
+            block = _best_block(mask, count, preference)
+            if block is None:
+                continue
+            key = (block[0], block[1], row, block[2])
+            if best_key is None or key < best_key:
+                best_row, best_key = row, key
+        if best_row is not None:
+            start = best_key[3]
+            return [rows[best_row][c] for c in range(start, start + count)], True
+
+    # No row fits the group: take the run of seats (front to back) spanning the fewest rows
+    seats = sorted((s for cols in rows.values() for s in cols.values()), key=lambda s: (s[2], s[3]))
+    span, start = min(
+        ((seats[i + count - 1][2] - seats[i][2], i) for i in range(len(seats) - count + 1))
+    )
+    return seats[start:start + count], False
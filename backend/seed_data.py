@@ -2,6 +2,31 @@ from datetime import datetime, timedelta
 from backend.database import SessionLocal, engine
 from backend.models import Base, Airport, Airline, Flight, Seat
 
+# Cabin configuration per aircraft type, in seat-number order
+SEAT_CLASSES = {
+    "Boeing 737": {"economy": 150, "business": 30},
+    "Airbus A320": {"economy": 120, "business": 30},
+    "Boeing 777": {"economy": 240, "business": 60},
+    "Airbus A350": {"economy": 180, "business": 40},
+    "Boeing 787": {"economy": 220, "business": 60},
+    "Airbus A380": {"economy": 280, "business": 70},
+}
+DEFAULT_SEAT_CLASSES = {"economy": 140, "business": 40}
+SEATS_PER_ROW = 6
+
+def generate_seat_layout(aircraft_type):
+    """Return [(seat_number, seat_class), ...] for an aircraft type, rows of six lettered A-F"""
+    classes = SEAT_CLASSES.get(aircraft_type, DEFAULT_SEAT_CLASSES)
+    layout = []
+    seat_num = 1
+    for class_type, count in classes.items():
+        for i in range(count):
+            row = (seat_num - 1) // SEATS_PER_ROW + 1
+            col = chr(65 + ((seat_num - 1) % SEATS_PER_ROW))
+            layout.append((f"{row}{col}", class_type))
+            seat_num += 1
+    return layout
+
 def seed_database():
     """Populate database with sample data"""
     
@@ -176,33 +201,15 @@ def seed_database():
         db.add_all(flights)
         db.commit()
         
-        seat_classes = {
-            "Boeing 737": {"economy": 150, "business": 30},
-            "Airbus A320": {"economy": 120, "business": 30},
-            "Boeing 777": {"economy": 240, "business": 60},
-            "Airbus A350": {"economy": 180, "business": 40},
-            "Boeing 787": {"economy": 220, "business": 60},
-            "Airbus A380": {"economy": 280, "business": 70},
-        }
-        
         for flight in flights:
-            classes = seat_classes.get(flight.aircraft_type, {"economy": 140, "business": 40})
-            
-            seat_num = 1
-            for class_type, count in classes.items():
-                for i in range(count):
-                    row = (seat_num - 1) // 6 + 1
-                    col = chr(65 + ((seat_num - 1) % 6))
-                    seat_number = f"{row}{col}"
-                    
-                    seat = Seat(
-                        flight_id=flight.id,
-                        seat_number=seat_number,
-                        seat_class=class_type,
-                        is_available=True
-                    )
-                    db.add(seat)
-                    seat_num += 1
+            for seat_number, class_type in generate_seat_layout(flight.aircraft_type):
+                seat = Seat(
+                    flight_id=flight.id,
+                    seat_number=seat_number,
+                    seat_class=class_type,
+                    is_available=True
+                )
+                db.add(seat)
         
         db.commit()
         
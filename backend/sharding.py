@@ -0,0 +1,673 @@
+"""
+Inventory sharding: flights, with their seats, bookings and analytics
+rollups, are spread over the primary (shard 0) and the databases listed in
+SHARD_DATABASE_URLS. A flight's shard comes from a hash of its route, so a
+route's flights share one shard, and is recorded in the flight_shards
+directory on the primary. Users, idempotency keys and the directory stay on
+the primary; airports, airlines and users (without password hashes) are
+copied to every shard so joins and lazy loads resolve locally. Booking PNRs
+and PINs are reserved in booking_codes on the primary, which keeps them
+unique across shards and says which flight (and so shard) holds each PNR.
+
+With no extra shards configured every helper here is a thin wrapper around
+the primary session and no directory lookups happen.
+
+    python -m backend.sharding --status
+    python -m backend.sharding --rebalance [--dry-run] [--batch-size 200]
+    python -m backend.sharding --sync-reference
+"""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+import argparse
+import os
+import random
+import string
+import threading
+import time
+import zlib
+
+from fastapi import Request
+from sqlalchemy import delete, event, func, insert, select, text, update
+from sqlalchemy.exc import IntegrityError
+
+from backend.database import Base, SessionLocal, ShardSessionLocals, shard_engines, get_read_db
+from backend.models import Airport, Airline, User, Flight, Seat, Booking, BookingCode, FlightShard, ShardIdCounter
+
+# How long a process trusts its cached copy of a flight's directory entry;
+# after a rebalance, requests for a moved flight may 404 for up to this long
+SHARD_DIRECTORY_TTL = float(os.getenv("SHARD_DIRECTORY_TTL", "10"))
+SHARD_GATHER_WORKERS = int(os.getenv("SHARD_GATHER_WORKERS", str(2 * len(shard_engines))))
+# Flight, seat and booking ids created on shard k are k modulo this, which
+# also caps the number of shards
+SHARD_ID_STRIDE = 64
+DIRECTORY_CACHE_MAX = 100000
+SHARDED_MODELS = (Flight, Seat, Booking)
+REFERENCE_MODELS = (Airport, Airline, User)
+# Credentials stay on the primary
+UNREPLICATED_COLUMNS = {"users": {"password_hash"}}
+PNR_ALPHABET = string.ascii_uppercase + string.digits
+PIN_ALPHABET = string.digits
+
+
+def route_shard(origin_id, destination_id, count):
+    """Shard for a route; crc32 rather than hash() so every process agrees"""
+    return zlib.crc32(f"{origin_id}-{destination_id}".encode()) % count
+
+
+def _first_free_value(table):
+    """Counter start whose ids lie above every id already on any shard"""
+    highest = 0
+    for shard_engine in shard_engines:
+        with shard_engine.connect() as conn:
+            highest = max(highest, conn.execute(select(func.max(table.c.id))).scalar() or 0)
+    return highest // SHARD_ID_STRIDE + 1
+
+
+def reserve_ids(db, shard, table, count):
+    """
+    `count` new ids for a sharded table on a SQLite shard. The counter is
+    bumped in the caller's transaction, so a rollback releases the ids and
+    SQLite's single writer already serializes it.
+    """
+    counters = ShardIdCounter.__table__
+    bumped = db.execute(
+        update(counters).where(counters.c.name == table.name).values(next_value=counters.c.next_value + count)
+    ).rowcount
+    if bumped:
+        start = db.execute(select(counters.c.next_value).where(counters.c.name == table.name)).scalar() - count
+    else:
+        start = _first_free_value(table)
+        db.execute(insert(counters).values(name=table.name, next_value=start + count))
+    return [(start + i) * SHARD_ID_STRIDE + shard for i in range(count)]
+
+
+def _configure_sequences(shard_engine, shard):
+    """Make a PostgreSQL shard's id sequences hand out shard + k * SHARD_ID_STRIDE"""
+    with shard_engine.begin() as conn:
+        for model in SHARDED_MODELS:
+            sequence = conn.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": model.__tablename__}).scalar()
+            increment = conn.execute(
+                text("SELECT seqincrement FROM pg_sequence WHERE seqrelid = CAST(:s AS regclass)"), {"s": sequence}
+            ).scalar()
+            if increment == SHARD_ID_STRIDE:
+                continue
+            start = _first_free_value(model.__table__) * SHARD_ID_STRIDE + shard
+            conn.execute(text(f"ALTER SEQUENCE {sequence} INCREMENT BY {SHARD_ID_STRIDE} RESTART WITH {start}"))
+
+
+def _uses_sequences(shard_engine):
+    return shard_engine.dialect.name == "postgresql"
+
+
+def _id_assigner(shard):
+    def assign_ids(session, flush_context, instances):
+        for model in SHARDED_MODELS:
+            new = [obj for obj in session.new if isinstance(obj, model) and obj.id is None]
+            if new:
+                for obj, new_id in zip(new, reserve_ids(session, shard, model.__table__, len(new))):
+                    obj.id = new_id
+    return assign_ids
+
+
+def _replace_rows(db, table, rows):
+    """Insert rows, overwriting any existing row with the same primary key"""
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(table)
+        keys = [c.name for c in table.primary_key.columns]
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=keys,
+                set_={name: stmt.excluded[name] for name in rows[0] if name not in keys},
+            ),
+            rows,
+        )
+        return
+    ids = [row["id"] for row in rows]
+    db.execute(delete(table).where(table.c.id.in_(ids)))
+    db.execute(insert(table), rows)
+
+
+def _insert_missing(db, table, rows):
+    """Insert rows, skipping any that clash with an existing key"""
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        keys = [c.name for c in table.primary_key.columns]
+        key = table.primary_key.columns[keys[0]]
+        existing = {row[0] for row in db.execute(select(key).where(key.in_([r[keys[0]] for r in rows])))}
+        rows = [r for r in rows if r[keys[0]] not in existing]
+        if rows:
+            db.execute(insert(table), rows)
+        return
+    db.execute(dialect_insert(table).on_conflict_do_nothing(), rows)
+
+
+def _generate_code(alphabet):
+    return ''.join(random.choices(alphabet, k=6))
+
+
+def unused_codes(db, column, count, alphabet):
+    """`count` distinct 6-character codes not already present in `column`"""
+    codes = set()
+    while len(codes) < count:
+        candidates = {_generate_code(alphabet) for _ in range(count - len(codes))} - codes
+        taken = {row[0] for row in db.query(column).filter(column.in_(candidates)).all()}
+        codes |= candidates - taken
+    return list(codes)
+
+
+def _table_rows(db, model, flight_ids):
+    column = model.id if model is Flight else model.flight_id
+    return [dict(row) for row in db.execute(select(model.__table__).where(column.in_(flight_ids))).mappings()]
+
+
+def _delete_flights(db, flight_ids):
+    db.execute(delete(Booking).where(Booking.flight_id.in_(flight_ids)))
+    db.execute(delete(Seat).where(Seat.flight_id.in_(flight_ids)))
+    db.execute(delete(Flight).where(Flight.id.in_(flight_ids)))
+
+
+def _record(db, flight_ids, shard):
+    """Point the directory entries of flight_ids at shard, in the caller's primary transaction"""
+    db.execute(delete(FlightShard).where(FlightShard.flight_id.in_(flight_ids)))
+    now = datetime.utcnow()
+    db.execute(insert(FlightShard), [{"flight_id": i, "shard": shard, "moved_at": now} for i in flight_ids])
+
+
+class ShardMap:
+    """Flight-to-shard directory with per-shard sessions and parallel scatter-gather"""
+
+    def __init__(self, sessionmakers=ShardSessionLocals, directory_ttl=SHARD_DIRECTORY_TTL):
+        self.directory_ttl = directory_ttl
+        self._directory = {}   # flight_id -> (shard, expires_at)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._id_listeners = []
+        self.gathers = 0
+        self.directory_reads = 0
+        self.configure(sessionmakers)
+
+    def configure(self, sessionmakers):
+        """
+        Spread inventory over these shard sessionmakers, shard 0 being the
+        primary's. Also lets the tests run the same process with one shard
+        and with several.
+        """
+        if len(sessionmakers) > SHARD_ID_STRIDE:
+            raise ValueError(f"At most {SHARD_ID_STRIDE} shards are supported")
+        for factory, listener in self._id_listeners:
+            event.remove(factory, "before_flush", listener)
+        self._id_listeners = []
+        self.sessionmakers = sessionmakers
+        self.count = len(sessionmakers)
+        with self._lock:
+            self._directory.clear()
+        if self.enabled:
+            for shard, factory in enumerate(sessionmakers):
+                if not _uses_sequences(shard_engines[shard]):
+                    listener = _id_assigner(shard)
+                    event.listen(factory, "before_flush", listener)
+                    self._id_listeners.append((factory, listener))
+
+    @property
+    def enabled(self):
+        return self.count > 1
+
+    def session(self, shard):
+        return self.sessionmakers[shard]()
+
+    def route_shard(self, origin_id, destination_id):
+        return route_shard(origin_id, destination_id, self.count)
+
+    # Directory
+
+    def shard_for_flight(self, flight_id):
+        if not self.enabled:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            entry = self._directory.get(flight_id)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+        db = SessionLocal()
+        try:
+            shard = db.query(FlightShard.shard).filter(FlightShard.flight_id == flight_id).scalar() or 0
+        finally:
+            db.close()
+        with self._lock:
+            self.directory_reads += 1
+            if len(self._directory) >= DIRECTORY_CACHE_MAX:
+                self._directory.clear()
+            self._directory[flight_id] = (shard, now + self.directory_ttl)
+        return shard
+
+    def record(self, db, flight_ids, shard):
+        """Record where new flights live, in the caller's primary-session transaction"""
+        if self.enabled and flight_ids:
+            _record(db, flight_ids, shard)
+            self.forget(*flight_ids)
+
+    def drop(self, db, flight_ids):
+        """Remove directory entries and booking codes of flights that left the hot tables"""
+        if self.enabled and flight_ids:
+            db.execute(delete(FlightShard).where(FlightShard.flight_id.in_(flight_ids)))
+            db.execute(delete(BookingCode).where(BookingCode.flight_id.in_(flight_ids)))
+            self.forget(*flight_ids)
+
+    def forget(self, *flight_ids):
+        with self._lock:
+            for flight_id in flight_ids:
+                self._directory.pop(flight_id, None)
+
+    # Booking codes
+
+    def booking_codes(self, db, flight_ids):
+        """
+        A (pnr, pin) pair for each booking about to be created on flight_ids.
+        Unsharded they only need to be free in `db`. Sharded they are reserved
+        in booking_codes on the primary, and committed before the booking is
+        written, so no two shards can issue the same code.
+        """
+        count = len(flight_ids)
+        if not self.enabled:
+            return list(zip(
+                unused_codes(db, Booking.pnr, count, PNR_ALPHABET),
+                unused_codes(db, Booking.unique_pin, count, PIN_ALPHABET),
+            ))
+        primary = SessionLocal()
+        try:
+            while True:
+                pnrs = unused_codes(primary, BookingCode.pnr, count, PNR_ALPHABET)
+                pins = unused_codes(primary, BookingCode.unique_pin, count, PIN_ALPHABET)
+                now = datetime.utcnow()
+                try:
+                    primary.execute(insert(BookingCode), [
+                        {"pnr": pnr, "unique_pin": pin, "flight_id": flight_id, "created_at": now}
+                        for pnr, pin, flight_id in zip(pnrs, pins, flight_ids)
+                    ])
+                    primary.commit()
+                    return list(zip(pnrs, pins))
+                except IntegrityError:
+                    # Another worker reserved one of them between our check and insert
+                    primary.rollback()
+        finally:
+            primary.close()
+
+    def release_codes(self, pnrs):
+        """Give back codes reserved for bookings that were not written"""
+        if not self.enabled or not pnrs:
+            return
+        primary = SessionLocal()
+        try:
+            primary.execute(delete(BookingCode).where(BookingCode.pnr.in_(pnrs)))
+            primary.commit()
+        except Exception as e:
+            # An unreleased code only stays unusable; the booking itself failed either way
+            primary.rollback()
+            print(f"Could not release booking codes {pnrs}: {e}")
+        finally:
+            primary.close()
+
+    def shard_for_pnr(self, pnr):
+        """Shard holding the hot booking with this PNR, or None when no hot booking has it"""
+        if not self.enabled:
+            return 0
+        primary = SessionLocal()
+        try:
+            flight_id = primary.query(BookingCode.flight_id).filter(BookingCode.pnr == pnr).scalar()
+        finally:
+            primary.close()
+        return None if flight_id is None else self.shard_for_flight(flight_id)
+
+    def backfill_booking_codes(self, force=False):
+        """
+        Reserve the codes of bookings made before sharding was enabled. Skipped
+        when there are at least as many reservations as bookings, unless forced.
+        """
+        if not self.enabled:
+            return 0
+        with self.session(0) as primary:
+            reserved = primary.query(func.count(BookingCode.pnr)).scalar()
+        if not force and reserved >= sum(self.gather(lambda db: db.query(func.count(Booking.id)).scalar())):
+            return 0
+        for shard in range(self.count):
+            with self.session(shard) as db:
+                rows = [
+                    {"pnr": pnr, "unique_pin": pin, "flight_id": flight_id, "created_at": datetime.utcnow()}
+                    for pnr, pin, flight_id in db.query(Booking.pnr, Booking.unique_pin, Booking.flight_id).all()
+                ]
+            with self.session(0) as primary:
+                _insert_missing(primary, BookingCode.__table__, rows)
+                primary.commit()
+        with self.session(0) as primary:
+            return primary.query(func.count(BookingCode.pnr)).scalar() - reserved
+
+    # Sessions
+
+    def flight_session(self, flight_id, db=None):
+        """Session on the flight's shard; `db`, a primary session, is reused for shard 0"""
+        return self.shard_session(self.shard_for_flight(flight_id), db)
+
+    @contextmanager
+    def shard_session(self, shard, db=None):
+        """Session on `shard`; `db`, a primary session, is reused for shard 0"""
+        if shard == 0 and db is not None:
+            yield db
+            return
+        shard_db = self.session(shard)
+        try:
+            yield shard_db
+        finally:
+            shard_db.close()
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=SHARD_GATHER_WORKERS, thread_name_prefix="shard")
+            return self._executor
+
+    def _call(self, shard, fn):
+        with self.session(shard) as db:
+            return fn(db)
+
+    def gather(self, fn, db=None):
+        """
+        [fn(session) for every shard] in shard order, with the shards queried
+        in parallel. `db`, if given, serves shard 0 (e.g. a replica session).
+        Results are computed inside fn because its session closes afterwards.
+        """
+        if not self.enabled:
+            if db is not None:
+                return [fn(db)]
+            return [self._call(0, fn)]
+        with self._lock:
+            self.gathers += 1
+        first = 0 if db is None else 1
+        futures = [self._pool().submit(self._call, shard, fn) for shard in range(first, self.count)]
+        results = [fn(db)] if db is not None else []
+        return results + [future.result() for future in futures]
+
+    def find(self, fn, db=None):
+        """First non-None fn(session) in shard order, e.g. a booking looked up by PNR"""
+        for result in self.gather(fn, db):
+            if result is not None:
+                return result
+        return None
+
+    def sessions(self, db=None):
+        """One session per shard, `db` standing in for shard 0; close the others with close_sessions"""
+        return [db if shard == 0 and db is not None else self.session(shard) for shard in range(self.count)]
+
+    def close_sessions(self, sessions, db=None):
+        for session in sessions:
+            if session is not db:
+                session.close()
+
+    def assign_ids(self, db, shard, model, rows):
+        """Give rows for a Core insert of a sharded table their ids (SQLite shards only)"""
+        if self.enabled and rows and not _uses_sequences(shard_engines[shard]):
+            for row, new_id in zip(rows, reserve_ids(db, shard, model.__table__, len(rows))):
+                row["id"] = new_id
+        return rows
+
+    # Schema and reference data
+
+    def prepare(self):
+        """Create the schema on every extra shard, set up id allocation and copy reference data"""
+        if not self.enabled:
+            return {}
+        for shard, shard_engine in enumerate(shard_engines):
+            if shard:
+                Base.metadata.create_all(bind=shard_engine)
+            if _uses_sequences(shard_engine):
+                _configure_sequences(shard_engine, shard)
+        self.backfill_booking_codes()
+        return self.sync_reference_data()
+
+    def _reference_rows(self, model, rows):
+        skip = UNREPLICATED_COLUMNS.get(model.__tablename__, set())
+        return [{name: value for name, value in row.items() if name not in skip} for row in rows]
+
+    def replicate(self, model, objects):
+        """Copy reference rows that just changed on the primary to every extra shard"""
+        if not self.enabled or not objects:
+            return
+        rows = self._reference_rows(model, [
+            {column.name: getattr(obj, column.name) for column in model.__table__.columns} for obj in objects
+        ])
+        for shard in range(1, self.count):
+            with self.session(shard) as db:
+                _replace_rows(db, model.__table__, rows)
+                db.commit()
+
+    def sync_reference_data(self):
+        """Copy every airport, airline and user from the primary to the extra shards"""
+        with self.session(0) as db:
+            tables = {
+                model: self._reference_rows(model, [dict(row) for row in db.execute(select(model.__table__)).mappings()])
+                for model in REFERENCE_MODELS
+            }
+        for shard in range(1, self.count):
+            with self.session(shard) as db:
+                for model, rows in tables.items():
+                    _replace_rows(db, model.__table__, rows)
+                db.commit()
+        return {model.__tablename__: len(rows) for model, rows in tables.items()}
+
+    def stats(self):
+        counts = self.gather(lambda db: (
+            db.query(func.count(Flight.id)).scalar(),
+            db.query(func.count(Booking.id)).scalar(),
+        ))
+        with self._lock:
+            cached = len(self._directory)
+        return {
+            "enabled": self.enabled,
+            "shards": [
+                {"shard": shard, "dialect": shard_engines[shard].dialect.name, "flights": flights, "bookings": bookings}
+                for shard, (flights, bookings) in enumerate(counts)
+            ],
+            "gathers": self.gathers,
+            "directory_reads": self.directory_reads,
+            "directory_cached": cached,
+        }
+
+
+shard_map = ShardMap()
+
+
+def get_flight_db(flight_id: int):
+    """Session on the shard holding the path's flight"""
+    db = shard_map.session(shard_map.shard_for_flight(flight_id))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_flight_read_db(flight_id: int, request: Request):
+    """get_read_db (replica-aware) for flights on the primary, the flight's shard otherwise"""
+    shard = shard_map.shard_for_flight(flight_id)
+    if shard == 0:
+        yield from get_read_db(request)
+        return
+    db = shard_map.session(shard)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# Rebalancing
+
+def plan_rebalance():
+    """
+    ({(source, target): [flight ids]} for flights not on their route's shard,
+    {shard: [flight ids]} for copies the directory does not point at, which
+    an interrupted move leaves behind)
+    """
+    db = SessionLocal()
+    try:
+        directory = dict(db.query(FlightShard.flight_id, FlightShard.shard).all())
+    finally:
+        db.close()
+    placements = shard_map.gather(lambda db: db.query(Flight.id, Flight.origin_id, Flight.destination_id).all())
+    moves = defaultdict(list)
+    stale = defaultdict(list)
+    for source, rows in enumerate(placements):
+        for flight_id, origin_id, destination_id in rows:
+            if directory.get(flight_id, 0) != source:
+                stale[source].append(flight_id)
+                continue
+            target = shard_map.route_shard(origin_id, destination_id)
+            if target != source:
+                moves[(source, target)].append(flight_id)
+    return moves, stale
+
+
+def drop_stale_copies(shard, flight_ids):
+    from backend.analytics import apply_deltas, difference, flight_rollups
+    db = shard_map.session(shard)
+    try:
+        apply_deltas(db, difference(flight_rollups(db, flight_ids), {}))
+        _delete_flights(db, flight_ids)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def move_flights(source, target, flight_ids):
+    """
+    Move flights with their seats, bookings and rollup contribution between
+    shards: copy and commit on the target, repoint the directory, then delete
+    from the source. The source rows stay write-locked throughout, so no
+    booking can land on the old copy after it was read; a crash part way
+    leaves a stale copy that the next rebalance removes.
+    """
+    from backend.analytics import apply_deltas, difference, flight_rollups
+    src = shard_map.session(source)
+    dst = shard_map.session(target)
+    central = None if 0 in (source, target) else SessionLocal()
+    try:
+        src.execute(
+            update(Flight).where(Flight.id.in_(flight_ids))
+            .values(available_seats=Flight.available_seats)
+            .execution_options(synchronize_session=False)
+        )
+        rows = [(model, _table_rows(src, model, flight_ids)) for model in SHARDED_MODELS]
+        contribution = flight_rollups(src, flight_ids)
+
+        apply_deltas(dst, difference(flight_rollups(dst, flight_ids), {}))
+        _delete_flights(dst, flight_ids)
+        for model, model_rows in rows:
+            if model_rows:
+                dst.execute(insert(model.__table__), model_rows)
+        apply_deltas(dst, contribution)
+        if target == 0:
+            _record(dst, flight_ids, target)
+        dst.commit()
+
+        if central is not None:
+            _record(central, flight_ids, target)
+            central.commit()
+
+        apply_deltas(src, difference(contribution, {}))
+        _delete_flights(src, flight_ids)
+        if source == 0:
+            _record(src, flight_ids, target)
+        src.commit()
+    except Exception:
+        src.rollback()
+        dst.rollback()
+        if central is not None:
+            central.rollback()
+        raise
+    finally:
+        src.close()
+        dst.close()
+        if central is not None:
+            central.close()
+        shard_map.forget(*flight_ids)
+
+
+def _batches(flight_ids, batch_size):
+    for start in range(0, len(flight_ids), batch_size):
+        yield flight_ids[start:start + batch_size]
+
+
+def rebalance(batch_size=200, dry_run=False):
+    """Move every flight to its route's shard, batch by batch; returns what was (or would be) moved"""
+    from backend.analytics import rebuild_rollups, rollups_missing
+    moves, stale = plan_rebalance()
+    report = {
+        "moves": {f"{source}->{target}": len(ids) for (source, target), ids in sorted(moves.items())},
+        "stale_copies": {str(shard): len(ids) for shard, ids in sorted(stale.items())},
+    }
+    if dry_run:
+        return report
+    if rollups_missing():
+        # Moves carry each flight's rollup contribution along, so it must exist first
+        rebuild_rollups()
+    for shard, flight_ids in sorted(stale.items()):
+        for batch in _batches(flight_ids, batch_size):
+            drop_stale_copies(shard, batch)
+    for (source, target), flight_ids in sorted(moves.items()):
+        moved = 0
+        for batch in _batches(flight_ids, batch_size):
+            move_flights(source, target, batch)
+            moved += len(batch)
+            print(f"Moved {moved}/{len(flight_ids)} flights from shard {source} to shard {target}")
+    if moves or stale:
+        from backend.schedule_snapshot import schedule_snapshots
+        schedule_snapshots.schedule_changed()
+        schedule_snapshots.flush()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inventory shard status, reference data sync and rebalancing")
+    parser.add_argument("--status", action="store_true", help="flights and bookings per shard")
+    parser.add_argument("--sync-reference", action="store_true", help="create shard schemas, copy airports, airlines and users to every shard and reserve existing booking codes")
+    parser.add_argument("--rebalance", action="store_true", help="move flights to the shard their route hashes to")
+    parser.add_argument("--dry-run", action="store_true", help="with --rebalance, only report the moves")
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+    if not (args.status or args.sync_reference or args.rebalance):
+        parser.error("nothing to do; pass --status, --sync-reference or --rebalance")
+    if not shard_map.enabled:
+        raise SystemExit("SHARD_DATABASE_URLS is not set; all inventory is on the primary")
+
+    copied = shard_map.prepare()
+    if args.sync_reference:
+        print(f"Reference data copied to {shard_map.count - 1} shards: {copied}")
+        print(f"Reserved {shard_map.backfill_booking_codes(force=True)} missing booking codes")
+    if args.rebalance:
+        started = time.perf_counter()
+        report = rebalance(args.batch_size, dry_run=args.dry_run)
+        verb = "Would move" if args.dry_run else "Moved"
+        print(f"{verb} {report['moves'] or 'nothing'}; stale copies {report['stale_copies'] or 'none'} "
+              f"({time.perf_counter() - started:.1f}s)")
+    if args.status:
+        for shard in shard_map.stats()["shards"]:
+            print(f"shard {shard['shard']} ({shard['dialect']}): {shard['flights']} flights, {shard['bookings']} bookings")
+
+
+if __name__ == "__main__":
+    main()
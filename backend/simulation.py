@@ -0,0 +1,353 @@
+"""
+Offline pricing simulation: replay synthetic booking demand against the
+flight schedule and report what DynamicPricingEngine would have earned.
+
+    python -m backend.simulation --scenario diurnal --days 90 --workers 8 --output sim.json
+
+The schedule comes from the shared schedule snapshot (see
+backend.schedule_snapshot): worker processes map it themselves and build
+only their own slice, instead of being sent a pickled copy of the season.
+"""
+from dataclasses import dataclass, field, replace
+from datetime import timedelta
+from multiprocessing import Pool
+import argparse
+import json
+import math
+import os
+import random
+import time
+
+from backend.pricing_engine import DynamicPricingEngine, pricing_strategies
+
+# Share of daily demand arriving in each hour of the day (sums to 24 so a flat curve is all 1.0)
+DIURNAL_CURVE = [
+    0.2, 0.1, 0.1, 0.1, 0.2, 0.4, 0.8, 1.2, 1.5, 1.6, 1.5, 1.4,
+    1.3, 1.3, 1.4, 1.5, 1.5, 1.6, 1.8, 1.9, 1.7, 1.4, 0.9, 0.5,
+]
+FLAT_CURVE = [1.0] * 24
+
+
+@dataclass
+class Scenario:
+    name: str = "poisson"
+    # Expected booking requests over the whole horizon, as a multiple of seats
+    demand_factor: float = 1.2
+    horizon_days: int = 60
+    step_hours: int = 6
+    # Arrivals ramp up towards departure with this time constant (hours); 0 = uniform
+    ramp_hours: float = 240.0
+    hourly_curve: list = field(default_factory=lambda: FLAT_CURVE)
+    # Willingness to pay is base_price * lognormal(wtp_mu, wtp_sigma), plus a bump inside late_hours
+    wtp_mu: float = 0.15
+    wtp_sigma: float = 0.35
+    late_hours: float = 72.0
+    late_wtp_bonus: float = 0.3
+    trajectory_every_hours: int = 24
+    seed: int = 42
+    # Pricing strategy name from the pricing config, applied to every flight; None
+    # selects each flight's strategy by route and airline as the booking API does
+    strategy: str = None
+
+
+SCENARIOS = {
+    "poisson": Scenario(),
+    "diurnal": Scenario(name="diurnal", hourly_curve=DIURNAL_CURVE),
+    "high-demand": Scenario(name="high-demand", demand_factor=1.8, hourly_curve=DIURNAL_CURVE),
+    "low-demand": Scenario(name="low-demand", demand_factor=0.7),
+}
+
+
+def poisson(rng, lam):
+    """Draw from Poisson(lam); Knuth for small means, normal approximation for large"""
+    if lam <= 0:
+        return 0
+    if lam > 30:
+        return max(0, int(round(rng.gauss(lam, math.sqrt(lam)))))
+    threshold = math.exp(-lam)
+    k, p = 0, rng.random()
+    while p > threshold:
+        k += 1
+        p *= rng.random()
+    return k
+
+
+def load_codes(db):
+    """Airline and airport codes by id, which pricing strategies are selected on"""
+    from backend.models import Airline, Airport
+
+    return dict(db.query(Airline.id, Airline.code).all()), dict(db.query(Airport.id, Airport.code).all())
+
+
+def load_schedule(db, days=1):
+    """
+    Read the flight schedule as plain tuples
+    (id, flight_number, base_price, total_seats, departure_time,
+    (airline_code, origin_code, destination_code)).
+    With days > 1 the schedule is repeated day after day to build a season.
+    """
+    from backend.models import Flight
+
+    airlines, airports = load_codes(db)
+    rows = db.query(
+        Flight.id, Flight.flight_number, Flight.base_price, Flight.total_seats, Flight.departure_time,
+        Flight.airline_id, Flight.origin_id, Flight.destination_id,
+    ).order_by(Flight.departure_time).all()
+
+    schedule = []
+    for day in range(days):
+        offset = timedelta(days=day)
+        for flight_id, flight_number, base_price, total_seats, departure_time, airline_id, origin_id, destination_id in rows:
+            key = flight_id if day == 0 else f"{flight_id}+{day}d"
+            route = (airlines.get(airline_id), airports.get(origin_id), airports.get(destination_id))
+            schedule.append((key, flight_number, base_price, total_seats, departure_time + offset, route))
+    return schedule
+
+
+def snapshot_schedule(snapshot, codes, days=1, stripe=0, stripes=1):
+    """
+    Every stripes-th entry, from stripe on, of the schedule load_schedule
+    would build, read from a ScheduleSnapshot; codes is from load_codes.
+    """
+    airlines, airports = codes
+    count = len(snapshot)
+    schedule = []
+    for position in range(stripe, count * days, stripes):
+        day, i = divmod(position, count)
+        key = snapshot.ids[i] if day == 0 else f"{snapshot.ids[i]}+{day}d"
+        route = (
+            airlines.get(snapshot.airline_ids[i]),
+            airports.get(snapshot.origin_ids[i]),
+            airports.get(snapshot.destination_ids[i]),
+        )
+        schedule.append((
+            key, snapshot.flight_number(i), snapshot.base_prices[i], snapshot.total_seats[i],
+            snapshot.departure(i) + timedelta(days=day), route,
+        ))
+    return schedule
+
+
+@dataclass
+class SnapshotSlice:
+    """A worker's share of the schedule, read from the snapshot file in the worker"""
+    path: str
+    generation: int
+    codes: tuple
+    days: int
+    stripe: int
+    stripes: int
+
+    def load(self):
+        from backend.schedule_snapshot import ScheduleSnapshot
+
+        snapshot = ScheduleSnapshot(self.path)
+        if snapshot.generation != self.generation:
+            raise RuntimeError("The schedule snapshot was republished during the simulation; run it again")
+        return snapshot_schedule(snapshot, self.codes, self.days, self.stripe, self.stripes)
+
+
+def _arrival_weights(scenario):
+    """Relative arrival intensity for each step index, counted back from departure"""
+    steps = scenario.horizon_days * 24 // scenario.step_hours
+    weights = []
+    for i in range(steps):
+        hours_left = (steps - i) * scenario.step_hours
+        weights.append(math.exp(-hours_left / scenario.ramp_hours) if scenario.ramp_hours else 1.0)
+    total = sum(weights)
+    return [w / total for w in weights]
+
+
+def simulate_shard(args):
+    """Simulate one shard of flights on a shared simulated clock; returns per-flight results"""
+    flights, scenario, shard_index = args
+    if isinstance(flights, SnapshotSlice):
+        flights = flights.load()
+    rng = random.Random(scenario.seed * 1000003 + shard_index)
+    step = timedelta(hours=scenario.step_hours)
+    horizon = timedelta(days=scenario.horizon_days)
+    weights = _arrival_weights(scenario)
+    n_steps = len(weights)
+    # Average the hour-of-day curve over each step's hours
+    curve = [
+        sum(scenario.hourly_curve[(h + j) % 24] for j in range(scenario.step_hours)) / scenario.step_hours
+        for h in range(24)
+    ]
+    calculate_prices = DynamicPricingEngine.calculate_prices
+    # Same selection as the booking API (route, then airline, then default) unless the scenario overrides it
+    override = pricing_strategies.get(scenario.strategy) if scenario.strategy else None
+    strategies = {f[0]: override or pricing_strategies.select(*f[5]) for f in flights}
+
+    flights = sorted(flights, key=lambda f: f[4])
+    state = {
+        f[0]: {"available": f[3], "revenue": 0.0, "sold": 0, "requests": 0, "trajectory": [], "bucket": None}
+        for f in flights
+    }
+    if not flights:
+        return []
+
+    clock = flights[0][4] - horizon
+    end = flights[-1][4]
+    next_to_open = 0
+    active = []
+
+    while clock < end:
+        # Open sales for flights whose booking horizon has started, close departed ones
+        while next_to_open < len(flights) and flights[next_to_open][4] - horizon <= clock:
+            active.append(flights[next_to_open])
+            next_to_open += 1
+        active = [f for f in active if f[4] > clock]
+
+        # One batch per strategy, in order of first appearance so the noise draws are reproducible
+        by_strategy = {}
+        for f in active:
+            by_strategy.setdefault(strategies[f[0]], []).append(f)
+        prices = {}
+        for strategy, group in by_strategy.items():
+            batch = [(f[2], f[3], state[f[0]]["available"], f[4]) for f in group]
+            prices.update(zip((f[0] for f in group), calculate_prices(batch, clock, rng, strategy)))
+        hour_weight = curve[clock.hour]
+
+        for flight in active:
+            key, _, base_price, total_seats, departure, _ = flight
+            price = prices[key]
+            s = state[key]
+            hours_left = (departure - clock).total_seconds() / 3600
+            step_index = n_steps - int(math.ceil(hours_left / scenario.step_hours))
+            bucket = int(hours_left // scenario.trajectory_every_hours)
+            if bucket != s["bucket"]:
+                s["bucket"] = bucket
+                s["trajectory"].append((round(hours_left), price))
+            if s["available"] <= 0 or step_index < 0:
+                continue
+
+            expected = scenario.demand_factor * total_seats * weights[step_index] * hour_weight
+            for _ in range(poisson(rng, expected)):
+                s["requests"] += 1
+                wtp_mu = scenario.wtp_mu + (scenario.late_wtp_bonus if hours_left < scenario.late_hours else 0.0)
+                if price <= base_price * rng.lognormvariate(wtp_mu, scenario.wtp_sigma):
+                    s["available"] -= 1
+                    s["sold"] += 1
+                    s["revenue"] += price
+                    if s["available"] <= 0:
+                        break
+
+        clock += step
+
+    results = []
+    for key, flight_number, base_price, total_seats, departure, _ in flights:
+        s = state[key]
+        results.append({
+            "flight_id": key,
+            "flight_number": flight_number,
+            "departure_time": departure.isoformat(),
+            "base_price": base_price,
+            "total_seats": total_seats,
+            "seats_sold": s["sold"],
+            "booking_requests": s["requests"],
+            "revenue": round(s["revenue"], 2),
+            "load_factor": round(s["sold"] / total_seats, 4) if total_seats else 0.0,
+            "average_fare": round(s["revenue"] / s["sold"], 2) if s["sold"] else None,
+            "price_trajectory": s["trajectory"],
+        })
+    return results
+
+
+def run_simulation(schedule, scenario, workers=None, days=1, codes=None):
+    """
+    Shard the schedule across worker processes and merge the per-flight
+    results. schedule is a list from load_schedule, or a ScheduleSnapshot
+    repeated over days whose slices the workers read for themselves; codes
+    (from load_codes) name its airlines and airports and is read from the
+    database when omitted.
+    """
+    workers = workers or os.cpu_count() or 1
+    if isinstance(schedule, list):
+        shards = [schedule[i::workers] for i in range(workers)]
+        jobs = [(shard, scenario, i) for i, shard in enumerate(shards) if shard]
+    else:
+        if codes is None:
+            from backend.database import SessionLocal
+
+            db = SessionLocal()
+            try:
+                codes = load_codes(db)
+            finally:
+                db.close()
+        total = len(schedule) * days
+        jobs = [
+            (SnapshotSlice(schedule.path, schedule.generation, codes, days, i, workers), scenario, i)
+            for i in range(min(workers, total))
+        ]
+
+    if workers == 1 or len(jobs) <= 1:
+        shard_results = [simulate_shard(job) for job in jobs]
+    else:
+        with Pool(processes=len(jobs)) as pool:
+            shard_results = pool.map(simulate_shard, jobs)
+
+    flights = [r for shard in shard_results for r in shard]
+    flights.sort(key=lambda r: (r["departure_time"], r["flight_number"]))
+    return {"scenario": scenario.name, "summary": summarize(flights), "flights": flights}
+
+
+def summarize(flights):
+    seats = sum(f["total_seats"] for f in flights)
+    sold = sum(f["seats_sold"] for f in flights)
+    revenue = sum(f["revenue"] for f in flights)
+    return {
+        "flights": len(flights),
+        "seats": seats,
+        "seats_sold": sold,
+        "booking_requests": sum(f["booking_requests"] for f in flights),
+        "revenue": round(revenue, 2),
+        "load_factor": round(sold / seats, 4) if seats else 0.0,
+        "average_fare": round(revenue / sold, 2) if sold else None,
+        "sold_out_flights": sum(1 for f in flights if f["seats_sold"] >= f["total_seats"]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay synthetic demand against the dynamic pricing engine")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="poisson")
+    parser.add_argument("--days", type=int, default=1, help="repeat the seeded daily schedule this many days")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--demand-factor", type=float, default=None)
+    parser.add_argument("--step-hours", type=int, default=None)
+    parser.add_argument("--strategy", default=None,
+                        help="pricing strategy name from PRICING_CONFIG for every flight (default: per route/airline)")
+    parser.add_argument("--no-trajectories", action="store_true", help="omit per-flight price trajectories")
+    parser.add_argument("--output", help="write the full JSON report here (summary is always printed)")
+    args = parser.parse_args()
+
+    overrides = {
+        "seed": args.seed,
+        "demand_factor": args.demand_factor,
+        "step_hours": args.step_hours,
+        "strategy": args.strategy,
+    }
+    scenario = replace(SCENARIOS[args.scenario], **{k: v for k, v in overrides.items() if v is not None})
+
+    from backend.schedule_snapshot import schedule_snapshots
+    snapshot = schedule_snapshots.ensure()
+
+    started = time.perf_counter()
+    report = run_simulation(snapshot, scenario, workers=args.workers, days=args.days)
+    elapsed = time.perf_counter() - started
+
+    if args.no_trajectories:
+        for f in report["flights"]:
+            del f["price_trajectory"]
+
+    print(f"Simulated {len(snapshot) * args.days} flights ({scenario.name}) in {elapsed:.1f}s")
+    for key, value in report["summary"].items():
+        print(f"- {key}: {value}")
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(report, fh, default=str)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
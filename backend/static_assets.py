@@ -0,0 +1,245 @@
+"""
+Frontend asset pipeline: minify and content-hash styles.css / script.js,
+precompress them (gzip, plus brotli when the module is installed) and
+rewrite the HTML pages to reference the fingerprinted names.
+
+    python -m backend.static_assets          # writes frontend/dist
+
+The server loads frontend/dist when present and otherwise builds the same
+assets in memory at startup, so a build step is an optimization rather than
+a requirement.
+"""
+from email.utils import formatdate
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+
+from fastapi import HTTPException, Response
+
+try:
+    import brotli
+except ImportError:  # optional: gzip alone when brotli is not installed
+    brotli = None
+
+FRONTEND_DIR = "frontend"
+DIST_DIR = os.path.join(FRONTEND_DIR, "dist")
+ASSETS = ["styles.css", "script.js"]
+PAGES = ["index.html", "admin.html"]
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+CONTENT_TYPES = {
+    ".css": "text/css",
+    ".js": "application/javascript; charset=utf-8",
+    ".html": "text/html",
+}
+# Only worth compressing above this size
+MIN_COMPRESS_BYTES = 256
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def minify_css(source):
+    source = re.sub(r"/\*.*?\*/", "", source, flags=re.S)
+    source = re.sub(r"\s+", " ", source)
+    source = re.sub(r"\s*([{};,])\s*", r"\1", source)
+    source = re.sub(r":\s+", ":", source)
+    return source.replace(";}", "}").strip()
+
+
+def minify_js(source):
+    """
+    Conservative line-level minifier: drops indentation, blank lines and
+    whole-line // comments, leaving lines inside template literals untouched.
+    """
+    lines = []
+    in_template = False
+    for line in source.splitlines():
+        stripped = line if in_template else line.strip()
+        if not in_template and (not stripped or stripped.startswith("//")):
+            continue
+        lines.append(stripped)
+        if len(re.findall(r"(?<!\\)`", line)) % 2:
+            in_template = not in_template
+    return "\n".join(lines) + "\n"
+
+
+MINIFIERS = {".css": minify_css, ".js": minify_js}
+
+
+def fingerprint(name, body):
+    root, ext = os.path.splitext(name)
+    return f"{root}.{hashlib.sha256(body).hexdigest()[:12]}{ext}"
+
+
+def compress(body):
+    """{encoding: bytes} for the identity body and every worthwhile compressed variant"""
+    variants = {"identity": body}
+    if len(body) >= MIN_COMPRESS_BYTES:
+        variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+        if brotli is not None:
+            variants["br"] = brotli.compress(body, quality=11)
+    return variants
+
+
+def rewrite_html(html, manifest):
+    """Point stylesheet/script references (relative or under /static/) at the fingerprinted files"""
+    for name, hashed in manifest.items():
+        html = re.sub(
+            r'((?:href|src)=")(?:/static/)?' + re.escape(name) + '"',
+            r"\g<1>/static/" + hashed + '"',
+            html,
+        )
+    return html
+
+
+def build_assets(frontend_dir=FRONTEND_DIR):
+    """
+    Returns (manifest, files): manifest maps source names to fingerprinted
+    names; files maps output names to {encoding: bytes}.
+    """
+    manifest = {}
+    files = {}
+    for name in ASSETS:
+        with open(os.path.join(frontend_dir, name), encoding="utf-8") as f:
+            source = f.read()
+        body = MINIFIERS[os.path.splitext(name)[1]](source).encode("utf-8")
+        hashed = fingerprint(name, body)
+        manifest[name] = hashed
+        files[hashed] = compress(body)
+    for name in PAGES:
+        with open(os.path.join(frontend_dir, name), encoding="utf-8") as f:
+            files[name] = compress(rewrite_html(f.read(), manifest).encode("utf-8"))
+    return manifest, files
+
+
+def write_dist(manifest, files, dist_dir=DIST_DIR):
+    os.makedirs(dist_dir, exist_ok=True)
+    for name, variants in files.items():
+        for encoding, body in variants.items():
+            with open(os.path.join(dist_dir, name + ENCODING_SUFFIXES.get(encoding, "")), "wb") as f:
+                f.write(body)
+    with open(os.path.join(dist_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def load_dist(dist_dir=DIST_DIR):
+    """Read a previously built dist directory back into (manifest, files)"""
+    with open(os.path.join(dist_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    files = {}
+    for name in list(manifest.values()) + PAGES:
+        variants = {}
+        for encoding, suffix in [("identity", "")] + list(ENCODING_SUFFIXES.items()):
+            path = os.path.join(dist_dir, name + suffix)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    variants[encoding] = f.read()
+        files[name] = variants
+    return manifest, files
+
+
+def _accepted_encodings(accept_encoding):
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        token, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        accepted.add(token.strip().lower())
+    return accepted
+
+
+class StaticAssets:
+    """Fingerprinted assets and HTML pages held in memory with their precompressed variants"""
+
+    def __init__(self, frontend_dir=FRONTEND_DIR, dist_dir=DIST_DIR):
+        self.frontend_dir = frontend_dir
+        self.dist_dir = dist_dir
+        self.manifest = {}
+        self.files = {}
+        self.etags = {}
+        self.last_modified = formatdate(usegmt=True)
+
+    def _dist_is_current(self):
+        manifest_path = os.path.join(self.dist_dir, "manifest.json")
+        if not os.path.exists(manifest_path):
+            return False
+        built_at = os.path.getmtime(manifest_path)
+        if any(os.path.getmtime(os.path.join(self.frontend_dir, name)) > built_at for name in ASSETS + PAGES):
+            print(f"{self.dist_dir} is older than the frontend sources; building assets in memory")
+            return False
+        return True
+
+    def load(self):
+        if self._dist_is_current():
+            self.manifest, self.files = load_dist(self.dist_dir)
+        else:
+            self.manifest, self.files = build_assets(self.frontend_dir)
+        self.etags = {
+            name: '"' + hashlib.sha1(variants["identity"]).hexdigest()[:20] + '"'
+            for name, variants in self.files.items()
+        }
+        return self
+
+    def response(self, name, accept_encoding=None, if_none_match=None, cache_control=IMMUTABLE):
+        variants = self.files.get(name)
+        if variants is None:
+            raise HTTPException(status_code=404, detail="Not found")
+        accepted = _accepted_encodings(accept_encoding)
+        encoding = next((e for e in ("br", "gzip") if e in accepted and e in variants), "identity")
+        # Each encoding is a distinct representation, so it gets its own ETag
+        etag = self.etags[name] if encoding == "identity" else self.etags[name][:-1] + "-" + encoding + '"'
+        headers = {
+            "Cache-Control": cache_control,
+            "ETag": etag,
+            "Last-Modified": self.last_modified,
+            "Vary": "Accept-Encoding",
+        }
+        if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(
+            content=variants[encoding],
+            media_type=CONTENT_TYPES.get(os.path.splitext(name)[1], "application/octet-stream"),
+            headers=headers,
+        )
+
+    def asset(self, path, accept_encoding=None, if_none_match=None):
+        """
+        Serve /static/<path>. Fingerprinted names are immutable; the plain
+        source names still resolve to the current build but must revalidate.
+        """
+        if path in self.files and path not in PAGES:
+            return self.response(path, accept_encoding, if_none_match)
+        if path in self.manifest:
+            return self.response(self.manifest[path], accept_encoding, if_none_match, cache_control=REVALIDATE)
+        raise HTTPException(status_code=404, detail="Not found")
+
+    def page(self, name, accept_encoding=None, if_none_match=None):
+        return self.response(name, accept_encoding, if_none_match, cache_control=REVALIDATE)
+
+
+static_assets = StaticAssets()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Minify, fingerprint and precompress the frontend assets")
+    parser.add_argument("--frontend-dir", default=FRONTEND_DIR)
+    parser.add_argument("--output", default=None, help="defaults to <frontend-dir>/dist")
+    args = parser.parse_args()
+
+    output = args.output or os.path.join(args.frontend_dir, "dist")
+    manifest, files = build_assets(args.frontend_dir)
+    write_dist(manifest, files, output)
+    for name, variants in files.items():
+        sizes = ", ".join(f"{encoding} {len(body)}B" for encoding, body in variants.items())
+        print(f"{name}: {sizes}")
+    if brotli is None:
+        print("brotli not installed; wrote gzip variants only")
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,7 +15,8 @@ document.addEventListener('DOMContentLoaded', () => {
 
 function checkLoginStatus() {
     const user = localStorage.getItem('currentUser');
-    if (user) {
+    // Sessions saved before login tokens existed must log in again
+    if (user && JSON.parse(user).token) {
         currentUser = JSON.parse(user);
         showMainSection();
     } else {
@@ -139,7 +140,18 @@ async function handleRegister(e) {
     }
 }
 
+function authHeaders() {
+    const headers = { 'Content-Type': 'application/json' };
+    if (currentUser && currentUser.token) {
+        headers['Authorization'] = 'Bearer ' + currentUser.token;
+    }
+    return headers;
+}
+
 function handleLogout() {
+    if (currentUser && currentUser.token) {
+        fetch('/api/auth/logout', { method: 'POST', headers: authHeaders() }).catch(() => {});
+    }
     localStorage.removeItem('currentUser');
     currentUser = null;
     showLoginSection();
@@ -166,8 +178,9 @@ function showMainSection() {
         }
     }
     
-    // Load airports and airlines after login
-    loadAirports();
+    // Airport inputs suggest as you type; airlines are loaded after login
+    setupAirportTypeahead('origin');
+    setupAirportTypeahead('destination');
     loadAirlines();
     
     // Setup event listeners for booking
@@ -198,28 +211,53 @@ function setMinDate() {
     }
 }
 
-async function loadAirports() {
-    try {
-        const response = await fetch('/api/airports');
-        const airports = await response.json();
-        
-        const originSelect = document.getElementById('origin');
-        const destSelect = document.getElementById('destination');
-        
-        if (originSelect && destSelect) {
-            originSelect.innerHTML = '<option value="">Select Origin</option>';
-            destSelect.innerHTML = '<option value="">Select Destination</option>';
-            
-            airports.forEach(airport => {
-                const option1 = new Option(`${airport.city} (${airport.code})`, airport.code);
-                const option2 = new Option(`${airport.city} (${airport.code})`, airport.code);
-                originSelect.add(option1);
-                destSelect.add(option2);
-            });
+// Latest suggestions per airport input, used to resolve typed text to a code
+const airportSuggestions = { origin: [], destination: [] };
+
+function setupAirportTypeahead(inputId) {
+    const input = document.getElementById(inputId);
+    const list = document.getElementById(`${inputId}-suggestions`);
+    // showMainSection runs again after every login
+    if (!input || !list || input.dataset.typeahead) return;
+    input.dataset.typeahead = 'on';
+    
+    let timer = null;
+    let latest = 0;
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        const query = input.value.trim();
+        if (!query) {
+            airportSuggestions[inputId] = [];
+            list.innerHTML = '';
+            return;
         }
-    } catch (error) {
-        console.error('Error loading airports:', error);
+        timer = setTimeout(async () => {
+            const requestId = ++latest;
+            try {
+                const response = await fetch(`/api/airports/suggest?q=${encodeURIComponent(query)}&limit=8`);
+                const airports = await response.json();
+                // A slower response to an earlier keystroke must not replace newer suggestions
+                if (requestId !== latest) return;
+                airportSuggestions[inputId] = airports;
+                list.innerHTML = '';
+                airports.forEach(airport => {
+                    list.appendChild(new Option(`${airport.city} - ${airport.name}`, airport.code));
+                });
+            } catch (error) {
+                console.error('Error loading airport suggestions:', error);
+            }
+        }, 150);
+    });
+}
+
+function airportCode(inputId) {
+    const value = document.getElementById(inputId).value.trim();
+    const suggestions = airportSuggestions[inputId];
+    if (suggestions.some(airport => airport.code.toUpperCase() === value.toUpperCase())) {
+        return value.toUpperCase();
     }
+    // Typed a city or name without picking a suggestion: take the best match
+    return suggestions.length ? suggestions[0].code : value.toUpperCase();
 }
 
 async function loadAirlines() {
@@ -245,8 +283,8 @@ async function handleSearch(e) {
     e.preventDefault();
     
     const params = {
-        origin: document.getElementById('origin').value,
-        destination: document.getElementById('destination').value,
+        origin: airportCode('origin'),
+        destination: airportCode('destination'),
         date: document.getElementById('date').value,
         airline: document.getElementById('airline').value || null,
         sort_by: document.getElementById('sort').value
@@ -631,7 +669,7 @@ async function handleBooking(e) {
             
             return fetch('/api/bookings', {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
+                headers: authHeaders(),
                 body: JSON.stringify(bookingData)
             }).then(async res => {
                 if (!res.ok) {
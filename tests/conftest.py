@@ -0,0 +1,146 @@
+"""
+Test configuration: a throwaway primary, two extra inventory shards and an
+archive, all SQLite files in a temporary directory. The environment is set
+here, before any backend module is imported, because the engines are
+created at import time.
+
+Tests that use the app run twice: unsharded (the primary alone, as without
+SHARD_DATABASE_URLS) and sharded across all three databases. Each run
+starts from a freshly seeded schedule.
+"""
+import itertools
+import os
+import shutil
+import tempfile
+
+import pytest
+
+_DB_DIR = tempfile.mkdtemp(prefix="flightbooker-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_DB_DIR}/primary.db",
+    "SHARD_DATABASE_URLS": f"sqlite:///{_DB_DIR}/shard1.db,sqlite:///{_DB_DIR}/shard2.db",
+    "ARCHIVE_DATABASE_URL": f"sqlite:///{_DB_DIR}/archive.db",
+    "SCHEDULE_SNAPSHOT_PATH": os.path.join(_DB_DIR, "schedule.bin"),
+    "SESSION_SECRET": "test-session-secret",
+    "SESSION_REVOCATION_SYNC_SECONDS": "0",
+})
+for name in ("REPLICA_DATABASE_URL", "PRICING_CONFIG", "BOOKING_PIPELINE", "IDEMPOTENCY_PERSIST"):
+    os.environ.pop(name, None)
+
+_emails = itertools.count(1)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _database_dir():
+    yield _DB_DIR
+    shutil.rmtree(_DB_DIR, ignore_errors=True)
+
+
+def _reset_process_state():
+    """Drop what this process cached about the previous configuration's data"""
+    from backend.airport_index import airport_suggestions
+    from backend.booking_cache import booking_cache
+    from backend.coalescing import search_coalescer
+    from backend.explore import explore_index
+    from backend.schedule_snapshot import schedule_snapshots
+    booking_cache.clear()
+    search_coalescer.clear()
+    explore_index.invalidate()
+    airport_suggestions.invalidate()
+    schedule_snapshots.publish()
+
+
+@pytest.fixture(scope="session", params=["unsharded", "sharded"])
+def app(request):
+    """The API over the seeded schedule; sharded, flights are spread across the shards by route"""
+    from backend.database import ArchiveBase, Base, ShardSessionLocals, archive_engine, engine, shard_engines
+    from backend.seed_data import seed_database
+    from backend.sharding import rebalance, shard_map
+    for shard_engine in shard_engines[1:]:
+        Base.metadata.drop_all(bind=shard_engine)
+    ArchiveBase.metadata.drop_all(bind=archive_engine)
+    ArchiveBase.metadata.create_all(bind=archive_engine)
+    shard_map.configure(ShardSessionLocals if request.param == "sharded" else ShardSessionLocals[:1])
+    Base.metadata.create_all(bind=engine)
+    # Seeding allocates flight and seat ids across every shard, so their schema must exist first
+    shard_map.prepare()
+    seed_database()
+    from backend import main
+    # What importing the app does once: the admin user, reference data on the shards, analytics rollups
+    main.ensure_default_admin()
+    shard_map.prepare()
+    main.ensure_analytics_rollups()
+    rebalance()
+    _reset_process_state()
+    return main.app
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    from fastapi.testclient import TestClient
+    return TestClient(app)
+
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def admin_headers(client):
+    response = client.post("/api/auth/login", json={"email": "admin@bookmyflight.com", "password": "admin123"})
+    return bearer(response.json()["token"])
+
+
+@pytest.fixture
+def user(client):
+    """A newly registered user: (id, headers)"""
+    email = f"traveller{next(_emails)}@example.com"
+    body = client.post("/api/auth/register", json={"email": email, "name": "Traveller", "password": "secret"}).json()
+    return body["id"], bearer(body["token"])
+
+
+@pytest.fixture(scope="session")
+def sharded(app):
+    from backend.sharding import shard_map
+    return shard_map.enabled
+
+
+@pytest.fixture(scope="session")
+def flights_by_shard(app):
+    """Upcoming flight ids grouped by the shard holding them (all on shard 0 when unsharded)"""
+    from backend.models import Flight
+    from backend.sharding import shard_map
+    ids = shard_map.gather(lambda db: [flight_id for flight_id, in db.query(Flight.id).order_by(Flight.id)])
+    return {shard: flight_ids for shard, flight_ids in enumerate(ids) if flight_ids}
+
+
+@pytest.fixture
+def book(client):
+    """book(headers, user_id, flight_id, name): books the first free seat and returns the response body"""
+    def book(headers, user_id, flight_id, name="Traveller"):
+        return _book(client, headers, user_id, flight_id, name)
+    return book
+
+
+@pytest.fixture
+def pay(client):
+    """pay(booking_ids, headers=None): confirms the bookings and returns the response body"""
+    def pay(booking_ids, headers=None):
+        response = client.post("/api/payments", headers=headers or {}, json={"booking_ids": booking_ids, "payment_method": "card"})
+        assert response.status_code == 200, response.text
+        return response.json()
+    return pay
+
+
+def _book(client, headers, user_id, flight_id, name):
+    seat = next(s for s in client.get(f"/api/flights/{flight_id}/seats").json() if s["is_available"])
+    response = client.post("/api/bookings", headers=headers, json={
+        "flight_id": flight_id,
+        "seat_id": seat["id"],
+        "user_id": user_id,
+        "passenger_name": name,
+        "passenger_email": "traveller@example.com",
+        "passenger_phone": "9999999999",
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from backend import admission
+from backend.admission import AdmissionController, WaitingRoom
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_lane_queues_in_arrival_order_then_sheds_with_retry_after():
+    async def scenario():
+        controller = AdmissionController(limit=1, max_queue=2, max_latency_ms=60000)
+        order = []
+        release = asyncio.Event()
+
+        async def book(name):
+            async with controller.slot(7):
+                order.append(name)
+                await release.wait()
+
+        tasks = [asyncio.create_task(book(name)) for name in ("first", "second", "third")]
+        await settle()
+        assert order == ["first"]
+        assert controller.stats()["7"]["queued"] == 2
+
+        with pytest.raises(HTTPException) as shed:
+            async with controller.slot(7):
+                pass
+        assert shed.value.status_code == 503
+        assert int(shed.value.headers["Retry-After"]) >= 1
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert order == ["first", "second", "third"]
+        assert controller.stats()["7"]["shed"] == 1
+
+    run(scenario())
+
+
+def test_slow_lane_sheds_newcomers_but_not_admitted_clients():
+    async def scenario():
+        controller = AdmissionController(limit=1, max_queue=10, max_latency_ms=100)
+        release = asyncio.Event()
+
+        async def hold(priority=False):
+            async with controller.slot(7, priority=priority):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await settle()
+        queued = asyncio.create_task(hold())
+        await settle()
+        controller.lanes[7].latency = 5.0   # bookings are taking five seconds
+
+        with pytest.raises(HTTPException) as shed:
+            async with controller.slot(7):
+                pass
+        assert shed.value.status_code == 503
+
+        admitted = asyncio.create_task(hold(priority=True))
+        await settle()
+        assert controller.stats()["7"]["queued"] == 2
+        release.set()
+        await asyncio.gather(holder, queued, admitted)
+
+    run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        controller = AdmissionController(limit=1, max_queue=10, max_latency_ms=60000)
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller.slot(7):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await settle()
+        waiter = asyncio.create_task(hold())
+        await settle()
+        waiter.cancel()
+        await settle()
+        assert controller.stats()["7"]["queued"] == 0
+        release.set()
+        await holder
+        assert controller.stats()["7"]["active"] == 0
+
+    run(scenario())
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(admission.time, "time", lambda: now[0])
+    return now
+
+
+def test_waiting_room_admits_up_to_capacity_and_reports_positions(clock):
+    room = WaitingRoom(capacity=2, admit_seconds=300)
+    first, second, third, fourth = (room.join(42) for _ in range(4))
+    assert room.is_admitted(first, 42) and room.is_admitted(second, 42)
+    assert not room.is_admitted(first, 43)
+    assert room.status(third)["position"] == 1
+    assert room.status(fourth)["position"] == 2
+
+    room.complete(first)
+    assert room.status(first)["status"] == "completed"
+    assert room.is_admitted(third, 42)
+    assert room.status(fourth)["position"] == 1
+
+
+def test_admissions_expire_and_idle_tokens_lose_their_place(clock):
+    room = WaitingRoom(capacity=1, admit_seconds=300)
+    admitted, idle, polling = (room.join(42) for _ in range(3))
+    clock[0] += 250
+    room.status(polling)
+    clock[0] += 100   # the admission has run out; the idle token was last seen 350s ago
+    assert not room.is_admitted(admitted, 42)
+    assert room.status(polling)["status"] == "admitted"
+    assert room.status(admitted)["status"] == "expired"
+    assert room.status(idle)["status"] == "expired"
+    clock[0] += 301
+    room.status(polling)
+    assert room.status(admitted) is None
+
+
+def test_waiting_room_endpoints(client, flights_by_shard):
+    flight_id = flights_by_shard[0][0]
+    joined = client.post(f"/api/waiting-room/{flight_id}")
+    assert joined.status_code == 200
+    body = joined.json()
+    assert body["flight_id"] == flight_id and body["status"] in ("admitted", "waiting")
+    assert client.get(f"/api/waiting-room/status/{body['token']}").json()["token"] == body["token"]
+    assert client.get("/api/waiting-room/status/not-a-token").status_code == 404
+    assert client.post("/api/waiting-room/999999").status_code == 404
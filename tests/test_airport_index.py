@@ -0,0 +1,114 @@
+from backend.airport_index import AirportIndex, normalize
+
+AIRPORTS = [
+    {"id": 1, "code": "DEL", "name": "Indira Gandhi International Airport", "city": "New Delhi", "country": "India"},
+    {"id": 2, "code": "BOM", "name": "Chhatrapati Shivaji Maharaj International Airport", "city": "Mumbai", "country": "India"},
+    {"id": 3, "code": "BLR", "name": "Kempegowda International Airport", "city": "Bangalore", "country": "India"},
+    {"id": 4, "code": "DEN", "name": "Denver International Airport", "city": "Denver", "country": "United States"},
+    {"id": 5, "code": "ZRH", "name": "Zürich Airport", "city": "Zürich", "country": "Switzerland"},
+    {"id": 6, "code": "INN", "name": "Innsbruck Airport", "city": "Innsbruck", "country": "Austria"},
+    {"id": 7, "code": "IND", "name": "Indianapolis International Airport", "city": "Indianapolis", "country": "United States"},
+]
+
+
+def codes(results):
+    return [r["code"] for r in results]
+
+
+def test_normalize_drops_case_accents_and_punctuation():
+    assert normalize("  Zürich-Kloten  ") == "zurich kloten"
+    assert normalize(None) == ""
+
+
+def test_code_match_ranks_first():
+    results = AirportIndex(AIRPORTS).suggest("de")
+    assert codes(results)[:2] == ["DEL", "DEN"]
+    assert results[0]["match"] == "code"
+
+
+def test_tiers_rank_code_then_city_then_name_then_later_words_then_country():
+    results = AirportIndex(AIRPORTS).suggest("ind", limit=10)
+    assert [(r["code"], r["match"]) for r in results] == [
+        ("IND", "code"),      # its city and name also match, but it is listed once
+        ("DEL", "name"),      # "Indira Gandhi ..."
+        ("BOM", "country"),
+        ("BLR", "country"),
+    ]
+
+
+def test_field_start_beats_later_word():
+    airports = [
+        {"id": 1, "code": "SPI", "name": "Springfield Regional", "city": "Springfield", "country": "Neverland"},
+        {"id": 2, "code": "RGA", "name": "Regional Airfield", "city": "Ashford", "country": "Neverland"},
+    ]
+    assert codes(AirportIndex(airports).suggest("regional")) == ["RGA", "SPI"]
+
+
+def test_each_airport_appears_once_with_its_best_match():
+    results = AirportIndex(AIRPORTS).suggest("indianapolis")
+    assert codes(results) == ["IND"]
+    assert results[0]["match"] == "city"
+
+
+def test_later_words_and_accents_match():
+    index = AirportIndex(AIRPORTS)
+    assert codes(index.suggest("gandhi int")) == ["DEL"]
+    assert index.suggest("gandhi int")[0]["match"] == "name"
+    assert codes(index.suggest("zur")) == ["ZRH"]
+    assert index.suggest("delhi")[0]["match"] == "city"
+
+
+def test_limit_and_empty_queries():
+    index = AirportIndex(AIRPORTS)
+    assert len(index.suggest("i", limit=2)) == 2
+    assert index.suggest("") == []
+    assert index.suggest("   ") == []
+    assert index.suggest("xyz") == []
+
+
+def test_a_change_committed_elsewhere_is_picked_up_by_updated_at(app):
+    from sqlalchemy import update
+
+    from backend.airport_index import AirportSuggestions
+    from backend.database import SessionLocal
+    from backend.models import Airport
+
+    suggestions = AirportSuggestions(check_seconds=0)
+    db = SessionLocal()
+    try:
+        assert codes(suggestions.suggest(db, "ixc")) == ["IXC"]
+        # Another process renames a city: same row count and ids, and no ORM events here
+        db.execute(update(Airport).where(Airport.code == "IXC").values(city="Mohali"))
+        db.commit()
+        try:
+            assert codes(suggestions.suggest(db, "mohali")) == ["IXC"]
+        finally:
+            db.execute(update(Airport).where(Airport.code == "IXC").values(city="Chandigarh"))
+            db.commit()
+    finally:
+        db.close()
+
+
+def test_local_changes_invalidate_only_once_committed(app):
+    from backend.airport_index import airport_suggestions
+    from backend.database import SessionLocal
+    from backend.models import Airport
+
+    db = SessionLocal()
+    try:
+        airport_suggestions.suggest(db, "del")
+        airport = db.query(Airport).filter(Airport.code == "GAU").one()
+        airport.city = "Gauhati"
+        db.flush()
+        assert airport_suggestions._signature is not None
+        db.rollback()
+        assert airport_suggestions._signature is not None
+
+        airport.city = "Gauhati"
+        db.commit()
+        assert airport_suggestions._signature is None
+        assert codes(airport_suggestions.suggest(db, "gauhati")) == ["GAU"]
+        airport.city = "Guwahati"
+        db.commit()
+    finally:
+        db.close()
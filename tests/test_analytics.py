@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.analytics import DIMENSIONS, MEASURES, rebuild_rollups
+
+ROUTE = "DEL-GAU"
+
+
+def report(client, headers, dimension):
+    rows = client.get("/api/admin/analytics", headers=headers, params={"dimension": dimension, "sort": "key", "limit": 1000})
+    assert rows.status_code == 200
+    return {row["key"]: row for row in rows.json()}
+
+
+def reports(client, headers):
+    return {dimension: report(client, headers, dimension) for dimension in DIMENSIONS}
+
+
+def assert_same_totals(actual, expected):
+    for dimension in DIMENSIONS:
+        assert actual[dimension].keys() == expected[dimension].keys(), dimension
+        for key, row in expected[dimension].items():
+            assert {m: actual[dimension][key][m] for m in MEASURES} == pytest.approx({m: row[m] for m in MEASURES}), (dimension, key)
+
+
+@pytest.fixture
+def route_flight(client, admin_headers):
+    airports = {a["id"]: a["code"] for a in client.get("/api/airports").json()}
+    return next(
+        f for f in sorted(client.get("/api/admin/flights", headers=admin_headers).json(), key=lambda f: f["id"])
+        if f"{airports[f['origin_id']]}-{airports[f['destination_id']]}" == ROUTE
+    )
+
+
+def test_bookings_and_payments_add_to_their_route(client, admin_headers, user, book, pay, route_flight):
+    before = report(client, admin_headers, "route")[ROUTE]
+    first = book(user[1], user[0], route_flight["id"])
+    second = book(user[1], user[0], route_flight["id"])
+    pay([first["id"]], user[1])
+
+    after = report(client, admin_headers, "route")[ROUTE]
+    assert after["bookings"] == before["bookings"] + 2
+    assert after["seats_sold"] == before["seats_sold"] + 2
+    assert after["confirmed_bookings"] == before["confirmed_bookings"] + 1
+    assert after["booked_value"] == pytest.approx(before["booked_value"] + first["total_price"] + second["total_price"], abs=0.01)
+    assert after["revenue"] == pytest.approx(before["revenue"] + first["total_price"], abs=0.01)
+    assert after["flights"] == before["flights"]
+
+
+def test_incremental_rollups_match_a_rebuild(client, admin_headers, user, book, pay, route_flight):
+    booking = book(user[1], user[0], route_flight["id"])
+    pay([booking["id"]], user[1])
+    # Moves the flight, with its bookings, to another day, airline and base fare
+    departure = datetime.fromisoformat(route_flight["departure_time"]) + timedelta(days=1)
+    edited = client.put(f"/api/admin/flights/{route_flight['id']}", headers=admin_headers, json={
+        "departure_time": departure.isoformat(),
+        "arrival_time": (departure + timedelta(hours=3)).isoformat(),
+        "airline_id": route_flight["airline_id"] % 6 + 1,
+        "base_price": route_flight["base_price"] + 250,
+    })
+    assert edited.status_code == 200
+
+    incremental = reports(client, admin_headers)
+    assert departure.date().isoformat() in incremental["day"]
+    rebuild_rollups()
+    assert_same_totals(reports(client, admin_headers), incremental)
+
+
+def test_report_parameters_are_validated(client, admin_headers, user):
+    assert client.get("/api/admin/analytics", headers=admin_headers, params={"dimension": "seat"}).status_code == 400
+    assert client.get("/api/admin/analytics", headers=admin_headers, params={"sort": "profit"}).status_code == 400
+    assert client.get("/api/admin/analytics", headers=user[1]).status_code == 403
+    by_revenue = client.get("/api/admin/analytics", headers=admin_headers, params={"limit": 3}).json()
+    assert len(by_revenue) == 3
+    assert [row["revenue"] for row in by_revenue] == sorted((row["revenue"] for row in by_revenue), reverse=True)
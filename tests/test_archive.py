@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.archive import archive_departed_flights, find_archived_booking
+from backend.booking_cache import booking_cache
+from backend.models import Booking, Flight, Seat
+from backend.seed_data import generate_seat_layout
+from backend.sharding import shard_map
+
+AIRCRAFT = "Airbus A320"
+
+
+@pytest.fixture
+def departed_flight(client, admin_headers):
+    """A flight of its own that left two days ago, with a seat map"""
+    airports = {a["code"]: a["id"] for a in client.get("/api/airports").json()}
+    departure = datetime.now().replace(microsecond=0) - timedelta(days=2)
+    layout = generate_seat_layout(AIRCRAFT)
+    response = client.post("/api/admin/flights", headers=admin_headers, json={
+        "flight_number": "BMF900",
+        "airline_id": 1,
+        "origin_id": airports["GAU"],
+        "destination_id": airports["DEL"],
+        "departure_time": departure.isoformat(),
+        "arrival_time": (departure + timedelta(hours=3)).isoformat(),
+        "base_price": 5000.0,
+        "total_seats": len(layout),
+        "available_seats": len(layout),
+        "aircraft_type": AIRCRAFT,
+    })
+    assert response.status_code == 200
+    flight_id = response.json()["id"]
+    with shard_map.flight_session(flight_id) as db:
+        db.add_all(Seat(flight_id=flight_id, seat_number=number, seat_class=seat_class, is_available=True)
+                   for number, seat_class in layout)
+        db.commit()
+    return flight_id
+
+
+def hot_rows(shard, flight_id):
+    with shard_map.session(shard) as db:
+        return (
+            db.query(Flight).filter(Flight.id == flight_id).count(),
+            db.query(Seat).filter(Seat.flight_id == flight_id).count(),
+            db.query(Booking).filter(Booking.flight_id == flight_id).count(),
+        )
+
+
+def test_departed_flights_move_to_the_archive_and_stay_readable(client, user, book, pay, departed_flight):
+    user_id, headers = user
+    booking = book(headers, user_id, departed_flight, "Archived Traveller")
+    pay([booking["id"]], headers)
+    before = client.get(f"/api/bookings/{booking['pnr']}").json()
+    seats = len(generate_seat_layout(AIRCRAFT))
+    shard = shard_map.shard_for_flight(departed_flight)
+
+    totals = archive_departed_flights(older_than_hours=24, vacuum=False)
+    assert totals == {"flights": 1, "seats": seats, "bookings": 1}
+    assert hot_rows(shard, departed_flight) == (0, 0, 0)
+    assert client.get(f"/api/flights/{departed_flight}/seats").status_code == 404
+
+    # The PNR lookup falls back to the archive, in a worker that had not cached it
+    booking_cache.clear()
+    archived = client.get(f"/api/bookings/{booking['pnr']}")
+    assert archived.status_code == 200
+    assert archived.json() == before
+    assert find_archived_booking("NOSUCH") is None
+
+    history = client.get(f"/api/users/{user_id}/bookings", headers=headers).json()
+    assert [b["pnr"] for b in history["bookings"]] == [booking["pnr"]]
+    assert history["bookings"][0]["status"] == "confirmed"
+
+    # Nothing else has departed
+    assert archive_departed_flights(older_than_hours=24, vacuum=False) == {"flights": 0, "seats": 0, "bookings": 0}
@@ -0,0 +1,143 @@
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+
+from backend import auth
+from backend.auth import issue_session_token, revoke_session_token, verify_session_token
+from backend.database import SessionLocal, engine, shard_engines
+from backend.models import PrincipalChange, User
+
+
+def make_user(**overrides):
+    fields = {"id": 7, "email": "pat@example.com", "name": "Pat", "is_admin": False}
+    fields.update(overrides)
+    return SimpleNamespace(**fields)
+
+
+@pytest.fixture(autouse=True)
+def _schema(app):
+    """Revocations are stored in the primary database"""
+
+
+def test_signed_token_verifies_to_its_claims():
+    principal = verify_session_token(issue_session_token(make_user()))
+    assert principal["id"] == 7
+    assert principal["email"] == "pat@example.com"
+    assert principal["is_admin"] is False
+
+
+def test_admin_claim_of_a_non_admin_is_not_trusted():
+    # Signed with adm=True, but user 7 is no admin in the users table
+    assert verify_session_token(issue_session_token(make_user(is_admin=True)))["is_admin"] is False
+
+
+def test_tampered_token_is_rejected():
+    payload, signature = issue_session_token(make_user()).split(".")
+    other_payload = issue_session_token(make_user(id=8)).split(".")[0]
+    assert verify_session_token(f"{other_payload}.{signature}") is None
+    assert verify_session_token(f"{payload}.{signature[:-2]}xx") is None
+    assert verify_session_token("not-a-token") is None
+
+
+def test_expired_token_is_rejected(monkeypatch):
+    monkeypatch.setattr(auth, "SESSION_TTL_SECONDS", -1)
+    assert verify_session_token(issue_session_token(make_user())) is None
+
+
+def test_revoked_token_is_rejected():
+    token = issue_session_token(make_user())
+    assert revoke_session_token(token)
+    assert verify_session_token(token) is None
+    assert not revoke_session_token(token)
+
+
+def test_revocation_reaches_other_workers():
+    # Another worker: its own denylist, which never saw the logout itself
+    other_worker = auth.SessionDenylist(sync_seconds=0)
+    token = issue_session_token(make_user())
+    jti = verify_session_token(token)["jti"]
+    assert not other_worker.is_revoked(jti)
+    revoke_session_token(token)
+    assert other_worker.is_revoked(jti)
+
+
+def test_logout_ends_the_session(client, user):
+    _, headers = user
+    assert client.post("/api/auth/logout", headers=headers).status_code == 200
+    assert client.post("/api/auth/logout", headers=headers).status_code == 401
+
+
+@contextmanager
+def counted_queries():
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engines = {engine, *shard_engines}
+    for e in engines:
+        event.listen(e, "before_cursor_execute", count)
+    try:
+        yield statements
+    finally:
+        for e in engines:
+            event.remove(e, "before_cursor_execute", count)
+
+
+@contextmanager
+def admin_rights(is_admin):
+    db = SessionLocal()
+    try:
+        admin = db.query(User).filter(User.email == "admin@bookmyflight.com").one()
+        admin.is_admin = is_admin
+        db.commit()
+        yield admin.id
+    finally:
+        admin.is_admin = True
+        db.commit()
+        db.close()
+
+
+def test_cached_admin_request_issues_no_query(monkeypatch, client, admin_headers):
+    assert client.get("/api/admin/admission", headers=admin_headers).status_code == 200
+    # Revocations were just read; hold off the next read so only the request itself could query
+    monkeypatch.setattr(auth.session_denylist, "sync_seconds", 3600)
+    monkeypatch.setattr(auth.session_denylist, "_synced_at", time.monotonic())
+    with counted_queries() as statements:
+        assert client.get("/api/admin/admission", headers=admin_headers).status_code == 200
+    assert statements == []
+
+
+def test_demoted_admin_loses_admin_routes(client, admin_headers):
+    assert client.get("/api/admin/admission", headers=admin_headers).status_code == 200
+    with admin_rights(False):
+        assert client.get("/api/admin/admission", headers=admin_headers).status_code == 403
+
+
+def test_demotion_elsewhere_evicts_the_cached_principal(client, admin_headers):
+    # Another worker demoted the admin: the users row and a principal_changes row, but no local eviction
+    assert client.get("/api/admin/admission", headers=admin_headers).status_code == 200
+    db = SessionLocal()
+    try:
+        admin_id = db.query(User.id).filter(User.email == "admin@bookmyflight.com").scalar()
+        db.query(User).filter(User.id == admin_id).update({"is_admin": False})
+        db.add(PrincipalChange(user_id=admin_id))
+        db.commit()
+        try:
+            assert client.get("/api/admin/admission", headers=admin_headers).status_code == 403
+        finally:
+            db.query(User).filter(User.id == admin_id).update({"is_admin": True})
+            db.add(PrincipalChange(user_id=admin_id))
+            db.commit()
+    finally:
+        db.close()
+    assert client.get("/api/admin/admission", headers=admin_headers).status_code == 200
+
+
+def test_user_token_is_not_admin(client, user):
+    _, headers = user
+    assert client.get("/api/admin/admission", headers=headers).status_code == 403
+    assert client.get("/api/admin/admission").status_code == 401
@@ -0,0 +1,79 @@
+import csv
+import io
+import zipfile
+
+import pytest
+
+from backend.boarding_passes import MANIFEST_FIELDS, manifest_csv, render_boarding_pass
+
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+PASSENGER = {
+    "seat_number": "12A", "seat_class": "economy", "passenger_name": "Asha Rao",
+    "passenger_email": "asha@example.com", "passenger_phone": "9999999999", "pnr": "ABC123",
+    "unique_pin": "123456", "status": "confirmed", "booking_date": "2030-01-01T10:00:00",
+    "flight_number": "BMF101", "origin": "DEL", "destination": "BOM", "departure_time": "2030-01-08 06:00",
+}
+
+
+def test_manifest_streams_one_row_at_a_time():
+    chunks = list(manifest_csv([PASSENGER, dict(PASSENGER, seat_number="12B", passenger_name="Ravi, Jr.")]))
+    assert len(chunks) == 2
+    rows = list(csv.DictReader(io.StringIO("".join(chunks))))
+    assert list(rows[0]) == MANIFEST_FIELDS
+    assert [row["passenger_name"] for row in rows] == ["Asha Rao", "Ravi, Jr."]
+    assert "unique_pin" not in rows[0]
+    assert list(manifest_csv([])) == [",".join(MANIFEST_FIELDS) + "\r\n"]
+
+
+def test_boarding_pass_is_a_png():
+    assert render_boarding_pass(PASSENGER).startswith(PNG_MAGIC)
+
+
+@pytest.fixture
+def flight_with_passengers(client, admin_headers, user, book, pay):
+    """A flight with two confirmed bookings and one left pending: (flight, confirmed bookings)"""
+    airports = {a["id"]: a["code"] for a in client.get("/api/airports").json()}
+    flight = next(
+        f for f in sorted(client.get("/api/admin/flights", headers=admin_headers).json(), key=lambda f: f["id"])
+        if (airports[f["origin_id"]], airports[f["destination_id"]]) == ("BLR", "HYD")
+    )
+    bookings = [book(user[1], user[0], flight["id"], name) for name in ("Asha Rao", "Pending Pax", "Ravi Kumar")]
+    confirmed = [bookings[0], bookings[2]]
+    pay([b["id"] for b in confirmed], user[1])
+    return flight, confirmed
+
+
+def test_manifest_lists_confirmed_passengers_in_seat_order(client, admin_headers, flight_with_passengers):
+    flight, confirmed = flight_with_passengers
+    response = client.get(f"/api/admin/flights/{flight['id']}/manifest.csv", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert f'{flight["flight_number"]}-manifest.csv' in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    pnrs = [b["pnr"] for b in confirmed]
+    assert [row["pnr"] for row in rows if row["pnr"] in pnrs] == pnrs
+    assert all(row["status"] == "confirmed" for row in rows)
+    assert "Pending Pax" not in response.text
+
+
+def test_boarding_pass_zip_holds_the_manifest_and_a_pass_per_passenger(client, admin_headers, flight_with_passengers):
+    flight, confirmed = flight_with_passengers
+    response = client.get(f"/api/admin/flights/{flight['id']}/boarding-passes.zip", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert archive.testzip() is None
+    names = archive.namelist()
+    assert names[0] == "manifest.csv"
+    manifest = client.get(f"/api/admin/flights/{flight['id']}/manifest.csv", headers=admin_headers).text
+    assert archive.read("manifest.csv").decode() == manifest
+    passes = {f"{row['seat_number']}-{row['pnr']}.png" for row in csv.DictReader(io.StringIO(manifest))}
+    assert set(names[1:]) == passes and len(names) == len(passes) + 1
+    assert {f"{b['seat_number']}-{b['pnr']}.png" for b in confirmed} <= passes
+    assert all(archive.read(name).startswith(PNG_MAGIC) for name in names[1:])
+
+
+def test_exports_are_admin_only_and_need_a_flight(client, admin_headers, user):
+    assert client.get("/api/admin/flights/999999/manifest.csv", headers=admin_headers).status_code == 404
+    assert client.get("/api/admin/flights/999999/boarding-passes.zip", headers=admin_headers).status_code == 404
+    assert client.get("/api/admin/flights/1/manifest.csv", headers=user[1]).status_code == 403
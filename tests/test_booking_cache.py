@@ -0,0 +1,66 @@
+import pytest
+
+from backend.booking_cache import booking_cache, etag_matches, make_etag
+
+
+def test_etag_matching():
+    etag = make_etag(b'{"pnr":"ABC123"}')
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(None, etag)
+
+
+@pytest.fixture
+def booking(user, book, flights_by_shard):
+    user_id, headers = user
+    flight_id = flights_by_shard[max(flights_by_shard)][1]
+    return {"flight_id": flight_id, **book(headers, user_id, flight_id)}
+
+
+def test_unchanged_booking_is_a_304(client, booking, pay):
+    pay([booking["id"]])
+    first = client.get(f"/api/bookings/{booking['pnr']}")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    again = client.get(f"/api/bookings/{booking['pnr']}", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    assert again.content == b""
+
+
+def test_payment_replaces_the_pending_document(client, booking, pay):
+    pending = client.get(f"/api/bookings/{booking['pnr']}")
+    assert pending.json()["status"] == "pending"
+    # Pending documents are never cached: the payment may be taken by another worker
+    assert booking_cache.get(booking["pnr"]) is None
+
+    pay([booking["id"]])
+    confirmed = client.get(f"/api/bookings/{booking['pnr']}", headers={"If-None-Match": pending.headers["ETag"]})
+    assert confirmed.status_code == 200
+    assert confirmed.json()["status"] == "confirmed"
+    assert booking_cache.get(booking["pnr"]) is not None
+
+
+def test_flight_edit_drops_its_cached_bookings(client, booking, pay, admin_headers):
+    pay([booking["id"]])
+    before = client.get(f"/api/bookings/{booking['pnr']}")
+    flight_id = booking["flight_id"]
+    response = client.put(f"/api/admin/flights/{flight_id}", headers=admin_headers, json={"flight_number": "ZZ9001"})
+    assert response.status_code == 200
+    assert booking_cache.get(booking["pnr"]) is None
+    after = client.get(f"/api/bookings/{booking['pnr']}", headers={"If-None-Match": before.headers["ETag"]})
+    assert after.status_code == 200
+    assert after.json()["flight_number"] == "ZZ9001"
+
+
+def test_archived_bookings_are_not_cached_under_their_pnr(monkeypatch, client, app):
+    from backend import main
+    document = {"pnr": "ARC001", "status": "confirmed", "passenger_name": "Archived"}
+    monkeypatch.setattr(main, "find_archived_booking", lambda pnr: document if pnr == "ARC001" else None)
+    response = client.get("/api/bookings/ARC001")
+    assert response.status_code == 200
+    assert response.json() == document
+    assert client.get("/api/bookings/ARC001", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+    assert booking_cache.get("ARC001") is None
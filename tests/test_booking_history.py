@@ -0,0 +1,80 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from backend.models import Booking
+from backend.sharding import shard_map
+
+
+@pytest.fixture
+def cursors(app):
+    from backend.main import _bookings_cursor, _parse_bookings_cursor
+    return _bookings_cursor, _parse_bookings_cursor
+
+
+def test_cursor_round_trip(cursors):
+    encode, decode = cursors
+    booking_date = datetime(2030, 5, 17, 9, 30, 12, 345678)
+    assert decode(encode(booking_date, 4242)) == (booking_date, 4242)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-base64!", "bm8tc2VwYXJhdG9y", "MjAzMC0wMS0wMXxhYmM="])
+def test_malformed_cursor_is_a_400(cursors, cursor):
+    _, decode = cursors
+    with pytest.raises(HTTPException) as raised:
+        decode(cursor)
+    assert raised.value.status_code == 400
+
+
+def all_pages(client, headers, user_id, limit):
+    ids, cursor = [], None
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        page = client.get(f"/api/users/{user_id}/bookings", headers=headers, params=params).json()
+        assert len(page["bookings"]) <= limit
+        ids.extend(b["id"] for b in page["bookings"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+@pytest.fixture
+def history(user, book, flights_by_shard):
+    """A user with bookings on every shard: (user_id, headers, booking ids)"""
+    user_id, headers = user
+    booking_ids = [
+        book(headers, user_id, flight_id)["id"]
+        for flight_ids in flights_by_shard.values()
+        for flight_id in flight_ids[3:6]
+    ]
+    return user_id, headers, booking_ids
+
+
+def test_pages_merge_every_shard_newest_first(client, history):
+    user_id, headers, booking_ids = history
+    ids = all_pages(client, headers, user_id, limit=2)
+    assert sorted(ids) == sorted(booking_ids)
+    # Booked one after another, so newest first is the reverse of booking order
+    assert ids == booking_ids[::-1]
+    assert all_pages(client, headers, user_id, limit=100) == ids
+
+
+def test_equal_booking_dates_are_ordered_by_id_across_pages(client, history):
+    user_id, headers, booking_ids = history
+    same_moment = datetime(2030, 1, 1, 12, 0, 0)
+
+    def backdate(db):
+        db.query(Booking).filter(Booking.user_id == user_id).update({"booking_date": same_moment})
+        db.commit()
+
+    shard_map.gather(backdate)
+    assert all_pages(client, headers, user_id, limit=4) == sorted(booking_ids, reverse=True)
+
+
+def test_history_is_private(client, history):
+    owner_id, _, _ = history
+    other = client.post("/api/auth/register", json={"email": "nosy@example.com", "name": "Nosy", "password": "secret"})
+    other_headers = {"Authorization": f"Bearer {other.json()['token']}"}
+    assert client.get(f"/api/users/{owner_id}/bookings", headers=other_headers).status_code == 403
+    assert client.get(f"/api/users/{owner_id}/bookings").status_code == 401
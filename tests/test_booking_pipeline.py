@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from backend import booking_pipeline
+from backend.booking_pipeline import BookingPipeline, process_batch
+from backend.database import SessionLocal
+from backend.models import BookingCode, Flight, Seat
+from backend.sharding import shard_map
+
+
+def free_seats(flight_id, count):
+    with shard_map.flight_session(flight_id) as db:
+        return [seat_id for seat_id, in db.query(Seat.id).filter(
+            Seat.flight_id == flight_id, Seat.is_available == True
+        ).order_by(Seat.id.desc()).limit(count)]
+
+
+def available_seats(flight_id):
+    with shard_map.flight_session(flight_id) as db:
+        return db.query(Flight.available_seats).filter(Flight.id == flight_id).scalar()
+
+
+def reserved_codes():
+    db = SessionLocal()
+    try:
+        return db.query(BookingCode).count()
+    finally:
+        db.close()
+
+
+def request(flight_id, seat_id, name="Batch Passenger"):
+    return {
+        "flight_id": flight_id,
+        "seat_id": seat_id,
+        "user_id": None,
+        "passenger_name": name,
+        "passenger_email": "batch@example.com",
+        "passenger_phone": "9999999999",
+    }
+
+
+@pytest.fixture
+def two_flights(flights_by_shard):
+    """Flights on different shards when sharded, with two free seats each"""
+    shards = sorted(flights_by_shard)
+    first = flights_by_shard[shards[0]][-2]
+    second = flights_by_shard[shards[-1]][-3]
+    return [(flight_id, free_seats(flight_id, 2)) for flight_id in (first, second)]
+
+
+def test_batch_outcomes_follow_request_order(two_flights):
+    (first, first_seats), (second, second_seats) = two_flights
+    seats_before = {flight_id: available_seats(flight_id) for flight_id in (first, second)}
+    codes_before = reserved_codes()
+    requests = [
+        request(first, first_seats[0], "A"),
+        request(second, second_seats[0], "B"),
+        request(first, first_seats[0], "C"),     # same seat again, in the same batch
+        request(999999, first_seats[1], "D"),    # no such flight
+        request(second, second_seats[1], "E"),
+    ]
+    outcomes = process_batch(requests)
+
+    assert [status for status, _ in outcomes] == ["ok", "ok", "error", "error", "ok"]
+    assert [outcomes[i][1]["passenger_name"] for i in (0, 1, 4)] == ["A", "B", "E"]
+    assert outcomes[2][1].status_code == 400
+    assert outcomes[3][1].status_code == 404
+    assert available_seats(first) == seats_before[first] - 1
+    assert available_seats(second) == seats_before[second] - 2
+    if shard_map.enabled:
+        # Codes reserved for the two failures were given back
+        assert reserved_codes() == codes_before + 3
+
+
+def test_failed_batch_commit_retries_each_request_alone(monkeypatch, two_flights):
+    (first, first_seats), (second, second_seats) = two_flights
+    record = booking_pipeline.record_bookings
+    calls = []
+
+    def fail_batches(db, sales):
+        calls.append(len(sales))
+        if len(sales) > 1:
+            raise RuntimeError("commit failed")
+        return record(db, sales)
+
+    monkeypatch.setattr(booking_pipeline, "record_bookings", fail_batches)
+    codes_before = reserved_codes()
+    outcomes = process_batch([request(first, seat_id) for seat_id in first_seats])
+    assert [status for status, _ in outcomes] == ["ok", "ok"]
+    assert calls == [2, 1, 1]
+    if shard_map.enabled:
+        assert reserved_codes() == codes_before + 2
+
+
+def test_single_request_failure_is_a_500_not_an_exception(monkeypatch, two_flights):
+    (first, first_seats), _ = two_flights
+
+    def fail(db, sales):
+        raise RuntimeError("commit failed")
+
+    monkeypatch.setattr(booking_pipeline, "record_bookings", fail)
+    seats_before = available_seats(first)
+    (status, error), = process_batch([request(first, first_seats[0])])
+    assert status == "error" and error.status_code == 500
+    assert available_seats(first) == seats_before
+
+
+def test_pipeline_groups_concurrent_requests_and_answers_each(two_flights):
+    (first, first_seats), (second, second_seats) = two_flights
+    pipeline = BookingPipeline(batch_size=8, wait_ms=50)
+
+    async def submit_all():
+        requests = [request(first, seat_id) for seat_id in first_seats] + [request(second, second_seats[0])]
+        requests.append(request(second, second_seats[0]))   # loses the seat to the request before it
+        return await asyncio.gather(*(pipeline.submit(r) for r in requests), return_exceptions=True)
+
+    results = asyncio.run(submit_all())
+    assert [r["status"] for r in results[:3]] == ["pending"] * 3
+    assert isinstance(results[3], HTTPException) and results[3].status_code == 400
+    assert pipeline.batches == 1
+    assert pipeline.stats()["requests"] == 4
@@ -0,0 +1,84 @@
+import pytest
+
+from backend.seed_data import generate_seat_layout
+
+# A route no other test books on, so its flights can be re-equipped freely
+ROUTE = {"origin": "PNQ", "destination": "BOM"}
+
+
+@pytest.fixture
+def route_flights(client, admin_headers):
+    airports = {a["code"]: a["id"] for a in client.get("/api/airports").json()}
+    return sorted(
+        (f for f in client.get("/api/admin/flights", headers=admin_headers).json()
+         if f["origin_id"] == airports[ROUTE["origin"]] and f["destination_id"] == airports[ROUTE["destination"]]),
+        key=lambda f: f["id"],
+    )
+
+
+def bulk(client, headers, changes, dry_run=False, filters=ROUTE):
+    return client.post("/api/admin/flights/bulk", headers=headers, json={
+        "filters": filters, "changes": changes, "dry_run": dry_run,
+    })
+
+
+def test_bulk_update_requires_changes_and_valid_dates(client, admin_headers, user):
+    assert bulk(client, admin_headers, {}).status_code == 400
+    assert bulk(client, admin_headers, {"price_multiplier": 0}).status_code == 400
+    bad_date = bulk(client, admin_headers, {"price_multiplier": 1.1}, filters={"date_from": "01/02/2030"})
+    assert bad_date.status_code == 400
+    assert bulk(client, user[1], {"price_multiplier": 1.1}).status_code == 403
+
+
+def test_dry_run_counts_rows_without_writing(client, admin_headers, route_flights):
+    response = bulk(client, admin_headers, {"price_multiplier": 1.5, "shift_minutes": 30}, dry_run=True)
+    assert response.status_code == 200
+    assert response.json() == {
+        "dry_run": True,
+        "flights_matched": len(route_flights),
+        "flights_repriced": len(route_flights),
+        "flights_rescheduled": len(route_flights),
+    }
+    flights = {f["id"]: f for f in client.get("/api/admin/flights", headers=admin_headers).json()}
+    for flight in route_flights:
+        assert flights[flight["id"]]["base_price"] == flight["base_price"]
+        assert flights[flight["id"]]["departure_time"] == flight["departure_time"]
+
+
+def test_aircraft_swap_skips_flights_with_bookings(client, admin_headers, user, book, route_flights):
+    booked = route_flights[0]
+    book(user[1], user[0], booked["id"])
+    layout = generate_seat_layout("Airbus A380")
+    swappable = route_flights[1:]
+
+    preview = bulk(client, admin_headers, {"aircraft_type": "Airbus A380"}, dry_run=True).json()
+    assert preview == {
+        "dry_run": True,
+        "flights_matched": len(route_flights),
+        "flights_reequipped": len(swappable),
+        "flights_skipped_with_bookings": 1,
+        "seats_removed": sum(f["total_seats"] for f in swappable),
+        "seats_created": len(swappable) * len(layout),
+    }
+
+    started = bulk(client, admin_headers, {"aircraft_type": "Airbus A380"})
+    assert started.status_code == 202
+    # The test client runs the background job before returning
+    job = client.get(f"/api/admin/jobs/{started.json()['job_id']}", headers=admin_headers).json()
+    assert job["status"] == "completed" and job["progress"] == 1.0
+    del preview["dry_run"], preview["flights_matched"]
+    assert job["result"] == preview
+
+    flights = {f["id"]: f for f in client.get("/api/admin/flights", headers=admin_headers).json()}
+    assert flights[booked["id"]]["aircraft_type"] == booked["aircraft_type"]
+    assert flights[booked["id"]]["available_seats"] == booked["available_seats"] - 1
+    for flight in swappable:
+        assert flights[flight["id"]]["aircraft_type"] == "Airbus A380"
+        assert flights[flight["id"]]["total_seats"] == flights[flight["id"]]["available_seats"] == len(layout)
+        seats = client.get(f"/api/flights/{flight['id']}/seats").json()
+        assert sorted(s["seat_number"] for s in seats) == sorted(number for number, _ in layout)
+        assert all(s["is_available"] for s in seats)
+
+
+def test_unknown_job_is_a_404(client, admin_headers):
+    assert client.get("/api/admin/jobs/not-a-job", headers=admin_headers).status_code == 404
@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+
+from backend import coalescing
+from backend.coalescing import SingleFlight
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class Computation:
+    """compute() for SingleFlight.do that blocks until released and counts its runs"""
+
+    def __init__(self, result="flights"):
+        self.result = result
+        self.release = asyncio.Event()
+        self.runs = 0
+
+    async def __call__(self):
+        self.runs += 1
+        await self.release.wait()
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(coalescing.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_concurrent_identical_calls_share_one_computation(clock):
+    async def scenario():
+        single = SingleFlight(ttl=1.5)
+        compute = Computation()
+        callers = [asyncio.create_task(single.do("DEL-BOM", compute)) for _ in range(3)]
+        other_compute = Computation("other")
+        other = asyncio.create_task(single.do("DEL-BLR", other_compute))
+        await settle()
+        assert single.stats()["in_flight"] == 2
+        compute.release.set()
+        other_compute.release.set()
+        assert await asyncio.gather(*callers) == ["flights"] * 3
+        assert await other == "other"
+        assert compute.runs == 1
+        stats = single.stats()
+        assert (stats["computations"], stats["coalesced"]) == (2, 2)
+
+    asyncio.run(scenario())
+
+
+def test_results_are_reused_for_the_ttl_only(clock):
+    async def scenario():
+        single = SingleFlight(ttl=1.5)
+        compute = Computation()
+        compute.release.set()
+        await single.do("key", compute)
+        clock[0] += 1.0
+        await single.do("key", compute)
+        assert (compute.runs, single.cache_hits) == (1, 1)
+        clock[0] += 1.0
+        await single.do("key", compute)
+        assert compute.runs == 2
+
+    asyncio.run(scenario())
+
+
+def test_errors_reach_every_waiter_and_are_not_cached(clock):
+    async def scenario():
+        single = SingleFlight(ttl=1.5)
+        compute = Computation(RuntimeError("database down"))
+        callers = [asyncio.create_task(single.do("key", compute)) for _ in range(2)]
+        await settle()
+        compute.release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        compute.result = "flights"
+        assert await single.do("key", compute) == "flights"
+        assert compute.runs == 2
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_leader_hands_the_computation_to_a_waiter(clock):
+    async def scenario():
+        single = SingleFlight(ttl=1.5)
+        compute = Computation()
+        leader = asyncio.create_task(single.do("key", compute))
+        await settle()
+        followers = [asyncio.create_task(single.do("key", compute)) for _ in range(2)]
+        await settle()
+        leader.cancel()
+        await settle()
+        # The first waiter took over; the second now waits on it
+        assert compute.runs == 2 and single.stats()["in_flight"] == 1
+        compute.release.set()
+        assert await asyncio.gather(*followers) == ["flights", "flights"]
+        assert leader.cancelled()
+        stats = single.stats()
+        assert (stats["requests"], stats["computations"], stats["coalesced"]) == (3, 2, 1)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_computation_running(clock):
+    async def scenario():
+        single = SingleFlight(ttl=1.5)
+        compute = Computation()
+        leader = asyncio.create_task(single.do("key", compute))
+        await settle()
+        follower = asyncio.create_task(single.do("key", compute))
+        await settle()
+        follower.cancel()
+        await settle()
+        assert follower.cancelled() and not leader.done()
+        compute.release.set()
+        assert await leader == "flights"
+        assert compute.runs == 1
+
+    asyncio.run(scenario())
+
+
+def test_full_result_cache_drops_expired_entries_first(clock):
+    async def scenario():
+        single = SingleFlight(ttl=1.5, max_entries=2)
+        compute = Computation()
+        compute.release.set()
+        await single.do("old", compute)
+        clock[0] += 1.0
+        await single.do("recent", compute)
+        clock[0] += 1.0
+        await single.do("new", compute)
+        assert set(single._results) == {"recent", "new"}
+
+    asyncio.run(scenario())
@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+import random
+from types import SimpleNamespace
+
+from backend.explore import OriginIndex, ScheduleFlight, indexed_fare
+
+NOW = datetime(2030, 6, 1, 12, 0)
+ORIGIN = SimpleNamespace(code="DEL", name="Delhi", city="New Delhi")
+AIRLINE = SimpleNamespace(code="AI")
+DESTINATIONS = {
+    2: SimpleNamespace(code="BOM", name="Mumbai", city="Mumbai"),
+    3: SimpleNamespace(code="BLR", name="Bangalore", city="Bangalore"),
+}
+
+
+def flight(flight_id, destination_id, departs_in, base_price, available=100):
+    return ScheduleFlight(
+        id=flight_id, flight_number=f"AI{flight_id}", airline=AIRLINE, origin=ORIGIN,
+        destination=DESTINATIONS[destination_id], destination_id=destination_id,
+        departure_time=NOW + departs_in, base_price=base_price, total_seats=180, available_seats=available,
+    )
+
+
+def cheapest_by_scan(flights, date_from, date_to):
+    best = {}
+    for f in flights:
+        if f.available_seats <= 0 or f.departure_time <= NOW:
+            continue
+        if (date_from and f.departure_time < date_from) or (date_to and f.departure_time >= date_to):
+            continue
+        entry = (indexed_fare(f, NOW), f.departure_time, f.id)
+        best[f.destination_id] = min(best.get(f.destination_id, entry), entry)
+    return sorted((price, flight_id) for price, _, flight_id in best.values())
+
+
+def test_cheapest_fare_per_destination_within_the_range():
+    rng = random.Random(7)
+    flights = [
+        flight(i, rng.choice([2, 3]), timedelta(hours=rng.randint(-12, 24 * 20)), rng.randint(20, 80) * 100,
+               available=rng.choice([0, 5, 100, 180]))
+        for i in range(1, 120)
+    ]
+    index = OriginIndex(1)
+    for f in flights:
+        index.put(f, NOW)
+    day = NOW.replace(hour=0)
+    ranges = [(None, None), (day + timedelta(days=3), day + timedelta(days=4)), (None, day + timedelta(days=2)),
+              (day + timedelta(days=10, hours=14), None), (day + timedelta(days=30), None)]
+    for date_from, date_to in ranges:
+        results = index.cheapest(date_from, date_to, NOW)
+        assert sorted((r["price"], r["flight_id"]) for r in results) == cheapest_by_scan(flights, date_from, date_to)
+        assert [r["price"] for r in results] == sorted(r["price"] for r in results)
+
+
+def test_repriced_and_sold_out_flights_move_or_leave():
+    index = OriginIndex(1)
+    cheap = flight(1, 2, timedelta(days=5), 3000)
+    index.put(cheap, NOW)
+    index.put(flight(2, 2, timedelta(days=6), 4000), NOW)
+    assert [r["flight_id"] for r in index.cheapest(None, None, NOW)] == [1]
+
+    index.put(cheap._replace(base_price=9000), NOW)
+    assert [r["flight_id"] for r in index.cheapest(None, None, NOW)] == [2]
+    index.put(flight(2, 2, timedelta(days=6), 4000, available=0), NOW)
+    assert [r["flight_id"] for r in index.cheapest(None, None, NOW)] == [1]
+    index.remove(1)
+    assert index.cheapest(None, None, NOW) == [] and index.by_day[2] == {}
+    # Departed since the index was built
+    index.put(flight(3, 3, timedelta(hours=1), 3000), NOW)
+    assert index.cheapest(None, None, NOW + timedelta(hours=2)) == []
+
+
+def test_explore_endpoint(client):
+    body = client.get("/api/explore", params={"origin": "del"}).json()
+    assert body["origin"]["code"] == "DEL"
+    codes = [d["destination"]["code"] for d in body["destinations"]]
+    assert codes and len(codes) == len(set(codes)) and "DEL" not in codes
+    assert [d["price"] for d in body["destinations"]] == sorted(d["price"] for d in body["destinations"])
+
+    day = datetime.fromisoformat(body["destinations"][0]["departure_time"]).date().isoformat()
+    one_day = client.get("/api/explore", params={"origin": "DEL", "from": day, "to": day}).json()
+    assert one_day["destinations"] and all(d["departure_time"].startswith(day) for d in one_day["destinations"])
+    assert client.get("/api/explore", params={"origin": "DEL", "from": "2030-13-01"}).status_code == 400
+    assert client.get("/api/explore", params={"origin": "XXX"}).status_code == 404
+
+
+def test_bookings_and_edits_reprice_only_the_flights_they_touch(client, admin_headers, user, book):
+    from backend.explore import explore_index
+
+    first = client.get("/api/explore", params={"origin": "CCU"}).json()["destinations"][0]
+    flight_id = first["flight_id"]
+    book(user[1], user[0], flight_id)
+    assert flight_id in explore_index.dirty
+    again = next(d for d in client.get("/api/explore", params={"origin": "CCU"}).json()["destinations"]
+                 if d["destination"] == first["destination"])
+    assert again["flight_id"] == flight_id
+    assert again["available_seats"] == first["available_seats"] - 1
+    assert not explore_index.dirty
+
+    def destinations():
+        return {d["flight_id"] for d in client.get("/api/explore", params={"origin": "CCU"}).json()["destinations"]}
+
+    sold_out = client.put(f"/api/admin/flights/{flight_id}", headers=admin_headers, json={"available_seats": 0})
+    assert sold_out.status_code == 200
+    assert flight_id not in destinations()
+    client.put(f"/api/admin/flights/{flight_id}", headers=admin_headers, json={"available_seats": again["available_seats"]})
+    assert flight_id in destinations()
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from backend.idempotency import IdempotencyStore, request_fingerprint, scoped_key
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class Handler:
+    """Endpoint stand-in: counts its runs and returns `result` (or raises it) once released"""
+
+    def __init__(self, result=None, released=True):
+        self.result = result if result is not None else {"booking": 1}
+        self.release = asyncio.Event()
+        if released:
+            self.release.set()
+        self.runs = 0
+
+    async def __call__(self):
+        self.runs += 1
+        await self.release.wait()
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+def body(response):
+    return json.loads(response.body)
+
+
+def test_keys_are_scoped_per_endpoint_and_user():
+    assert scoped_key("bookings", " abc ", {"id": 7}) == "bookings:7:abc"
+    assert scoped_key("payments", "abc") == "payments:-:abc"
+    for bad in ("   ", "k" * 256):
+        with pytest.raises(HTTPException) as raised:
+            scoped_key("bookings", bad)
+        assert raised.value.status_code == 400
+    assert request_fingerprint({"b": 1, "a": [2]}) == request_fingerprint({"a": [2], "b": 1})
+
+
+def test_retry_replays_the_first_response():
+    async def scenario():
+        store = IdempotencyStore(persist=False)
+        handler = Handler()
+        first = await store.execute("k", "body", handler)
+        retry = await store.execute("k", "body", handler)
+        assert handler.runs == 1
+        assert body(retry) == body(first) == {"booking": 1}
+        assert "idempotent-replayed" not in first.headers
+        assert retry.headers["idempotent-replayed"] == "true"
+
+        # Client errors are outcomes too, and are replayed as such
+        refused = Handler(HTTPException(status_code=400, detail="Seat is not available"))
+        assert (await store.execute("taken", "body", refused)).status_code == 400
+        again = await store.execute("taken", "body", refused)
+        assert (again.status_code, body(again), refused.runs) == (400, {"detail": "Seat is not available"}, 1)
+
+    asyncio.run(scenario())
+
+
+def test_same_key_with_a_different_body_is_a_422():
+    async def scenario():
+        store = IdempotencyStore(persist=False)
+        handler = Handler(released=False)
+        running = asyncio.create_task(store.execute("k", "body", handler))
+        await settle()
+        with pytest.raises(HTTPException) as while_running:
+            await store.execute("k", "other body", handler)
+        handler.release.set()
+        await running
+        with pytest.raises(HTTPException) as once_done:
+            await store.execute("k", "other body", handler)
+        assert while_running.value.status_code == once_done.value.status_code == 422
+        assert handler.runs == 1
+
+    asyncio.run(scenario())
+
+
+def test_duplicate_of_a_running_request_waits_for_its_response():
+    async def scenario():
+        store = IdempotencyStore(persist=False)
+        handler = Handler(released=False)
+        original = asyncio.create_task(store.execute("k", "body", handler))
+        await settle()
+        duplicate = asyncio.create_task(store.execute("k", "body", handler))
+        await settle()
+        assert not duplicate.done()
+        handler.release.set()
+        first, second = await asyncio.gather(original, duplicate)
+        assert body(first) == body(second) and second.headers["idempotent-replayed"] == "true"
+        assert handler.runs == 1 and store.stats()["joined"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_server_errors_are_not_kept():
+    async def scenario():
+        store = IdempotencyStore(persist=False)
+        handler = Handler(HTTPException(status_code=503, detail="Busy"))
+        assert (await store.execute("k", "body", handler)).status_code == 503
+        handler.result = {"booking": 2}
+        assert body(await store.execute("k", "body", handler)) == {"booking": 2}
+        assert handler.runs == 2
+
+    asyncio.run(scenario())
+
+
+def test_request_running_on_another_worker_is_a_409_then_replays(app):
+    async def scenario():
+        key = f"bookings:-:{uuid.uuid4()}"
+        worker, other_worker = IdempotencyStore(persist=True), IdempotencyStore(persist=True)
+        handler = Handler(released=False)
+        running = asyncio.create_task(worker.execute(key, "body", handler))
+        await settle()
+
+        with pytest.raises(HTTPException) as conflict:
+            await other_worker.execute(key, "body", Handler())
+        assert conflict.value.status_code == 409 and conflict.value.headers["Retry-After"]
+        with pytest.raises(HTTPException) as mismatch:
+            await other_worker.execute(key, "other body", Handler())
+        assert mismatch.value.status_code == 422
+
+        handler.release.set()
+        await running
+        replayed = await other_worker.execute(key, "body", Handler({"booking": "again"}))
+        assert body(replayed) == {"booking": 1} and replayed.headers["idempotent-replayed"] == "true"
+        assert handler.runs == 1
+
+    asyncio.run(scenario())
+
+
+def test_booking_retry_does_not_book_twice(client, user, flights_by_shard):
+    user_id, headers = user
+    flight_id = flights_by_shard[min(flights_by_shard)][6]
+    seats = [s for s in client.get(f"/api/flights/{flight_id}/seats").json() if s["is_available"]][:2]
+    request = {
+        "flight_id": flight_id, "seat_id": seats[0]["id"], "user_id": user_id, "passenger_name": "Retry",
+        "passenger_email": "retry@example.com", "passenger_phone": "9999999999",
+    }
+    key = {"Idempotency-Key": str(uuid.uuid4())}
+
+    first = client.post("/api/bookings", headers={**headers, **key}, json=request)
+    retry = client.post("/api/bookings", headers={**headers, **key}, json=request)
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json() and retry.headers["idempotent-replayed"] == "true"
+    history = client.get(f"/api/users/{user_id}/bookings", headers=headers).json()["bookings"]
+    assert [b["id"] for b in history] == [first.json()["id"]]
+
+    changed = client.post("/api/bookings", headers={**headers, **key}, json={**request, "seat_id": seats[1]["id"]})
+    assert changed.status_code == 422
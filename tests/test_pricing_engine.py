@@ -0,0 +1,91 @@
+import pytest
+
+from backend.pricing_engine import DEFAULT_STRATEGY, PricingStrategy, TierTable
+
+
+def test_tier_applies_below_its_breakpoint():
+    table = TierTable([{"below": 0.3, "value": "a"}, {"below": 0.7, "value": "b"}, {"value": "c"}])
+    assert table.lookup(0.0) == "a"
+    assert table.lookup(0.29) == "a"
+    assert table.lookup(0.5) == "b"
+    assert table.lookup(0.99) == "c"
+
+
+def test_breakpoint_belongs_to_the_next_tier():
+    table = TierTable([{"below": 24, "value": 1.5}, {"below": 48, "value": 1.3}, {"value": 1.0}])
+    assert table.lookup(24) == 1.3
+    assert table.lookup(48) == 1.0
+
+
+def test_last_tier_is_open_ended():
+    table = TierTable([{"below": 10, "value": 1}, {"value": 2}])
+    assert table.lookup(-1e9) == 1
+    assert table.lookup(1e9) == 2
+
+
+def test_single_open_tier():
+    assert TierTable([{"value": 7}]).lookup(123) == 7
+
+
+@pytest.mark.parametrize("tiers", [
+    [],
+    [{"below": 1, "value": 1}],
+    [{"below": 2, "value": 1}, {"below": 1, "value": 2}, {"value": 3}],
+])
+def test_invalid_ladders_are_rejected(tiers):
+    with pytest.raises(ValueError):
+        TierTable(tiers)
+
+
+def test_config_round_trip():
+    tiers = DEFAULT_STRATEGY["occupancy"]
+    assert TierTable(TierTable(tiers).to_config()).to_config() == TierTable(tiers).to_config()
+
+
+def test_default_strategy_matches_the_documented_tiers():
+    strategy = PricingStrategy("standard", {})
+    assert strategy.occupancy.lookup(0.1) == 0.85
+    assert strategy.occupancy.lookup(0.3) == 1.0
+    assert strategy.occupancy.lookup(0.95) == 1.65
+    assert strategy.time_to_departure.lookup(12) == 1.5
+    assert strategy.time_to_departure.lookup(1000) == 0.9
+    assert strategy.trend.lookup(0.8) == "high"
+
+
+def test_trend_changes_with_the_demand_multiplier():
+    strategy = PricingStrategy("standard", {})
+    for occupancy in (0.0, 0.29, 0.3, 0.49, 0.5, 0.69, 0.7, 0.89, 0.9, 1.0):
+        multiplier = strategy.occupancy.lookup(occupancy)
+        expected = "low" if multiplier <= 1.0 else "moderate" if multiplier < 1.35 else "high"
+        assert strategy.trend.lookup(occupancy) == expected
+    assert strategy.trend.breakpoints == strategy.occupancy.breakpoints
+
+
+def test_unlabelled_occupancy_tiers_read_as_low():
+    strategy = PricingStrategy("peak", {"occupancy": [{"below": 0.5, "value": 1.1}, {"value": 1.8, "trend": "high"}]})
+    assert strategy.trend.lookup(0.2) == "low"
+    assert strategy.trend.lookup(0.6) == "high"
+    assert PricingStrategy("copy", strategy.to_config()).to_config() == strategy.to_config()
+
+
+def test_separate_trend_table_is_rejected():
+    with pytest.raises(ValueError):
+        PricingStrategy("old", {"trend": [{"below": 0.5, "value": "low"}, {"value": "high"}]})
+
+
+def test_batch_prices_match_single_prices():
+    import random
+    from datetime import datetime, timedelta
+
+    from backend.pricing_engine import DynamicPricingEngine
+
+    now = datetime(2030, 1, 1, 8, 0)
+    flights = [
+        (5000.0, 180, 180, now + timedelta(days=40)),
+        (5000.0, 180, 20, now + timedelta(hours=10)),
+        (3200.0, 0, 0, now + timedelta(days=3)),
+    ]
+    strategy = PricingStrategy("standard", {})
+    batch = DynamicPricingEngine.calculate_prices(flights, now, random.Random(3), strategy)
+    rng = random.Random(3)
+    assert batch == [DynamicPricingEngine.calculate_price(*f, now=now, rng=rng, strategy=strategy) for f in flights]
@@ -0,0 +1,98 @@
+import sqlite3
+import time
+
+import pytest
+from fastapi import Response
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+
+from backend import database
+from backend.database import STICKY_COOKIE, get_read_db, mark_recent_write
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch):
+    """
+    A replica for the duration of the test (the suite otherwise runs without
+    one): a copy of the primary taken now, which later writes do not reach
+    """
+    path = str(tmp_path / "replica.db")
+    source, target = sqlite3.connect(database.engine.url.database), sqlite3.connect(path)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+    replica_engine = create_engine(f"sqlite:///{path}")
+    monkeypatch.setattr(database, "replica_engine", replica_engine)
+    monkeypatch.setattr(database, "ReplicaSessionLocal", sessionmaker(bind=replica_engine))
+    monkeypatch.setattr(database, "_replica_down_until", 0.0)
+    return replica_engine
+
+
+def read_engine(cookie=None):
+    """The engine get_read_db hands a request carrying the given sticky cookie value"""
+    headers = [(b"cookie", f"{STICKY_COOKIE}={cookie}".encode())] if cookie is not None else []
+    sessions = get_read_db(Request({"type": "http", "headers": headers}))
+    db = next(sessions)
+    try:
+        return db.get_bind()
+    finally:
+        sessions.close()
+
+
+def test_reads_go_to_the_replica_unless_the_client_wrote_recently(replica):
+    assert read_engine() is replica
+    assert read_engine(time.time() + 60) is database.engine
+    assert read_engine(time.time() - 1) is replica
+    assert read_engine("not-a-time") is replica
+
+
+def test_unreachable_replica_falls_back_to_the_primary_for_a_while(tmp_path, monkeypatch):
+    unreachable = create_engine(f"sqlite:///{tmp_path}/missing/replica.db")
+    monkeypatch.setattr(database, "replica_engine", unreachable)
+    monkeypatch.setattr(database, "ReplicaSessionLocal", sessionmaker(bind=unreachable))
+    monkeypatch.setattr(database, "_replica_down_until", 0.0)
+    assert read_engine() is database.engine
+    assert database._replica_down_until > time.time() + database.REPLICA_RETRY_SECONDS - 5
+
+
+def test_writes_set_the_sticky_cookie_only_with_a_replica(replica, monkeypatch):
+    response = Response()
+    mark_recent_write(response)
+    cookie = response.headers["set-cookie"]
+    assert cookie.startswith(f"{STICKY_COOKIE}=") and "HttpOnly" in cookie
+    pinned_until = float(cookie.split(";")[0].split("=", 1)[1])
+    assert time.time() < pinned_until <= time.time() + database.READ_YOUR_WRITES_SECONDS
+
+    monkeypatch.setattr(database, "replica_engine", None)
+    response = Response()
+    mark_recent_write(response)
+    assert "set-cookie" not in response.headers
+
+
+def test_booking_pins_the_client_to_the_primary(app, replica, flights_by_shard, user):
+    flight_id = flights_by_shard[0][2]
+    # Its own client, so the cookie does not follow the rest of the suite
+    client = TestClient(app)
+    seat = next(s for s in client.get(f"/api/flights/{flight_id}/seats").json() if s["is_available"])
+    response = client.post("/api/bookings", headers=user[1], json={
+        "flight_id": flight_id,
+        "seat_id": seat["id"],
+        "user_id": user[0],
+        "passenger_name": "Sticky",
+        "passenger_email": "sticky@example.com",
+        "passenger_phone": "9999999999",
+    })
+    assert response.status_code == 200
+    assert float(client.cookies[STICKY_COOKIE]) > time.time()
+
+    def seat_available(client):
+        seats = client.get(f"/api/flights/{flight_id}/seats").json()
+        return next(s["is_available"] for s in seats if s["id"] == seat["id"])
+
+    # The writer reads the primary and sees its seat taken; others still read the stale replica
+    assert not seat_available(client)
+    assert seat_available(TestClient(app))
@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend import schedule_snapshot
+from backend.schedule_snapshot import ScheduleSnapshot, ScheduleSnapshots, from_epoch, write_snapshot
+
+DEPARTURE = datetime(2030, 3, 1, 6, 45)
+ROWS = [
+    # id, airline, origin, destination, departure, arrival, base price, total, available, flight number
+    (12, 1, 3, 4, DEPARTURE, DEPARTURE + timedelta(hours=2), 4500.0, 180, 17, "AI101"),
+    (5, 2, 3, 5, DEPARTURE + timedelta(hours=1), DEPARTURE + timedelta(hours=4), 6200.5, 150, 150, "6E2024"),
+    (9, 1, 4, 3, DEPARTURE + timedelta(days=1), DEPARTURE + timedelta(days=1, hours=2), 3999.0, 180, 0, "AI102"),
+]
+
+
+@pytest.fixture
+def path(tmp_path, monkeypatch):
+    # Every check looks at the file, as a worker would after SCHEDULE_SNAPSHOT_CHECK_SECONDS
+    monkeypatch.setattr(schedule_snapshot, "SCHEDULE_SNAPSHOT_CHECK_SECONDS", 0)
+    return str(tmp_path / "schedule.bin")
+
+
+def test_columns_round_trip(path):
+    write_snapshot(path, ROWS)
+    snapshot = ScheduleSnapshot(path)
+    assert len(snapshot) == 3
+    assert list(snapshot.ids) == [12, 5, 9]
+    assert list(snapshot.origin_ids) == [3, 3, 4]
+    assert list(snapshot.available_seats) == [17, 150, 0]
+    assert snapshot.base_prices[1] == 6200.5
+    assert snapshot.departure(0) == DEPARTURE
+    assert from_epoch(snapshot.arrivals[2]) == DEPARTURE + timedelta(days=1, hours=2)
+    assert [snapshot.flight_number(i) for i in range(3)] == ["AI101", "6E2024", "AI102"]
+
+
+def test_position_finds_rows_by_flight_id(path):
+    write_snapshot(path, ROWS)
+    snapshot = ScheduleSnapshot(path)
+    assert {flight_id: snapshot.position(flight_id) for flight_id in (5, 9, 12)} == {5: 1, 9: 2, 12: 0}
+    assert snapshot.position(7) is None
+    assert snapshot.position(100) is None
+
+
+def test_not_a_snapshot_is_rejected(path):
+    with open(path, "wb") as fh:
+        fh.write(b"\0" * 128)
+    with pytest.raises(ValueError):
+        ScheduleSnapshot(path)
+
+
+def test_readers_attach_to_a_republished_version(path):
+    reader = ScheduleSnapshots(path)
+    assert reader.current() is None
+    write_snapshot(path, ROWS[:1])
+    first = reader.current()
+    assert len(first) == 1
+    assert reader.current() is first
+
+    write_snapshot(path, ROWS)
+    second = reader.current()
+    assert second is not first and len(second) == 3
+    assert reader.attaches == 2
+    # The replaced version stays mapped for whoever still holds it
+    assert list(first.ids) == [12]
+
+
+def test_ensure_republishes_only_a_stale_snapshot(path, app):
+    snapshots = ScheduleSnapshots(path, max_age=3600)
+    fresh = snapshots.ensure()
+    assert snapshots.publishes == 1 and len(fresh) > 0
+    assert snapshots.ensure() is fresh
+    assert snapshots.publishes == 1
+
+    snapshots.max_age = 0
+    republished = snapshots.ensure()
+    assert snapshots.publishes == 2
+    assert republished.generation > fresh.generation
+
+
+def unavailable(db=None):
+    raise OSError("no snapshot")
+
+
+def test_explore_reads_the_schedule_from_the_snapshot(monkeypatch, app):
+    from backend.database import SessionLocal
+    from backend.explore import ExploreIndex
+    from backend.models import Airport
+
+    # Earlier tests edit flights; the republish they schedule may not have run yet
+    schedule_snapshot.schedule_snapshots.publish()
+    db = SessionLocal()
+    try:
+        origin = db.query(Airport).filter(Airport.code == "DEL").one()
+        now = datetime.now()
+        from_snapshot = ExploreIndex()._build(db, origin.id, now)
+        monkeypatch.setattr(schedule_snapshot.schedule_snapshots, "ensure", unavailable)
+        from_database = ExploreIndex()._build(db, origin.id, now)
+    finally:
+        db.close()
+    assert from_snapshot.by_destination and from_snapshot.by_destination == from_database.by_destination
+    assert from_snapshot.flights == from_database.flights
+    assert from_snapshot.destinations == from_database.destinations
+
+
+def test_flights_published_since_are_read_from_the_database(monkeypatch, tmp_path, app):
+    from backend.database import SessionLocal
+    from backend.explore import ExploreIndex
+    from backend.models import Airport
+
+    # A snapshot from before any of the flights existed
+    empty = str(tmp_path / "empty.bin")
+    write_snapshot(empty, [])
+    monkeypatch.setattr(schedule_snapshot.schedule_snapshots, "ensure", lambda db=None: ScheduleSnapshot(empty))
+    db = SessionLocal()
+    try:
+        origin = db.query(Airport).filter(Airport.code == "BOM").one()
+        now = datetime.now()
+        from_snapshot = ExploreIndex()._build(db, origin.id, now)
+        monkeypatch.setattr(schedule_snapshot.schedule_snapshots, "ensure", unavailable)
+        from_database = ExploreIndex()._build(db, origin.id, now)
+    finally:
+        db.close()
+    assert from_snapshot.flights and from_snapshot.flights == from_database.flights
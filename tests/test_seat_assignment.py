@@ -0,0 +1,77 @@
+from backend.seat_assignment import assign_seats, parse_seat_number
+
+AIRCRAFT = "Airbus A320"
+
+
+def free(*seat_numbers):
+    return [(i, number) for i, number in enumerate(seat_numbers, start=1)]
+
+
+def row(number, columns="ABCDEF"):
+    return [f"{number}{column}" for column in columns]
+
+
+def numbers(assignment):
+    seats, together = assignment
+    return [seat[1] for seat in seats], together
+
+
+def test_seat_numbers_parse_into_row_column_and_position():
+    assert parse_seat_number("12A") == (12, 0, "window")
+    assert parse_seat_number("12C") == (12, 2, "aisle")
+    assert parse_seat_number("12D") == (12, 3, "aisle")
+    assert parse_seat_number("12E") == (12, 4, "middle")
+    assert parse_seat_number("XYZ") is None
+
+
+def test_pair_stays_on_one_side_of_the_aisle_before_taking_a_front_row():
+    # Row 1 only has the two seats either side of the aisle free
+    seats = free("1C", "1D", *row(5, "AB"))
+    assert numbers(assign_seats(AIRCRAFT, seats, 2)) == (["5A", "5B"], True)
+
+
+def test_pair_across_the_aisle_is_still_together_when_nothing_else_fits():
+    seats = free("1C", "1D", "2A", "2C", "3F")
+    assert numbers(assign_seats(AIRCRAFT, seats, 2)) == (["1C", "1D"], True)
+
+
+def test_groups_too_big_for_one_side_span_the_aisle_in_the_front_row():
+    seats = free(*row(3), *row(1))
+    assert numbers(assign_seats(AIRCRAFT, seats, 4)) == (["1A", "1B", "1C", "1D"], True)
+
+
+def test_window_and_aisle_preferences_choose_the_block_within_a_row():
+    seats = free(*row(1))
+    assert numbers(assign_seats(AIRCRAFT, seats, 2, "window")) == (["1A", "1B"], True)
+    assert numbers(assign_seats(AIRCRAFT, seats, 2, "aisle")) == (["1B", "1C"], True)
+    # A block on one side of the aisle still outranks the preference
+    assert numbers(assign_seats(AIRCRAFT, free("1C", "1D", "2B", "2C"), 2, "window")) == (["2B", "2C"], True)
+
+
+def test_group_no_row_can_seat_spans_the_fewest_rows():
+    seats = free("1A", "1B", "4A", "4B", "5A", "5F", "9C")
+    assert numbers(assign_seats(AIRCRAFT, seats, 3)) == (["4A", "4B", "5A"], False)
+
+
+def test_separate_seats_follow_the_preference_then_the_front_of_the_cabin():
+    seats = free("1B", "2C", "3A", "4F")
+    assert numbers(assign_seats(AIRCRAFT, seats, 2, "window", together=False)) == (["3A", "4F"], False)
+    assert numbers(assign_seats(AIRCRAFT, seats, 1, "aisle")) == (["2C"], True)
+
+
+def test_not_enough_seats():
+    assert assign_seats(AIRCRAFT, free("1A", "BAD"), 2) == ([], False)
+
+
+def test_auto_assign_endpoint(client, flights_by_shard):
+    flight_id = flights_by_shard[max(flights_by_shard)][4]
+    response = client.post(f"/api/flights/{flight_id}/seats/auto-assign", json={"count": 3, "preference": "window"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["together"] and len(body["seats"]) == 3
+    assert len({seat["row"] for seat in body["seats"]}) == 1
+    assert "window" in {seat["position"] for seat in body["seats"]}
+
+    assert client.post(f"/api/flights/{flight_id}/seats/auto-assign", json={"count": 0}).status_code == 400
+    assert client.post(f"/api/flights/{flight_id}/seats/auto-assign", json={"count": 2, "preference": "middle"}).status_code == 400
+    assert client.post("/api/flights/999999/seats/auto-assign", json={"count": 1}).status_code == 404
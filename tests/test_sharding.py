@@ -0,0 +1,88 @@
+import itertools
+
+import pytest
+
+from backend import sharding
+from backend.database import SessionLocal
+from backend.models import BookingCode
+from backend.sharding import shard_map
+
+
+def booking_code_count():
+    db = SessionLocal()
+    try:
+        return db.query(BookingCode).count()
+    finally:
+        db.close()
+
+
+def test_flights_are_spread_across_shards(sharded, flights_by_shard):
+    if sharded:
+        assert len(flights_by_shard) == shard_map.count == 3
+    else:
+        assert list(flights_by_shard) == [0] and shard_map.count == 1
+
+
+def test_codes_taken_on_one_shard_are_not_issued_on_another(monkeypatch, sharded, flights_by_shard):
+    if not sharded:
+        pytest.skip("codes are only reserved ahead of the booking when sharded")
+    # Every shard's generator comes up with the same first code, as two shards checking only themselves would
+    sequences = {
+        sharding.PNR_ALPHABET: itertools.chain(["AAAAAA", "AAAAAA"], (f"B{i:05d}" for i in itertools.count())),
+        sharding.PIN_ALPHABET: itertools.chain(["111111", "111111"], (f"2{i:05d}" for i in itertools.count())),
+    }
+    monkeypatch.setattr(sharding, "_generate_code", lambda alphabet: next(sequences[alphabet]))
+    first, second = (flight_ids[0] for flight_ids in list(flights_by_shard.values())[1:3])
+    db = SessionLocal()
+    try:
+        (pnr_a, pin_a), = shard_map.booking_codes(db, [first])
+        (pnr_b, pin_b), = shard_map.booking_codes(db, [second])
+    finally:
+        db.close()
+    try:
+        assert (pnr_a, pin_a) == ("AAAAAA", "111111")
+        assert pnr_b != pnr_a and pin_b != pin_a
+        assert shard_map.shard_for_pnr(pnr_a) == shard_map.shard_for_flight(first)
+        assert shard_map.shard_for_pnr(pnr_b) == shard_map.shard_for_flight(second)
+    finally:
+        shard_map.release_codes([pnr_a, pnr_b])
+    assert shard_map.shard_for_pnr(pnr_a) is None
+
+
+def test_bookings_on_every_shard_get_distinct_codes_and_are_found_by_pnr(client, user, book, flights_by_shard):
+    user_id, headers = user
+    bookings = []
+    for shard, flight_ids in sorted(flights_by_shard.items()):
+        for flight_id in flight_ids[:3]:
+            bookings.append((shard, book(headers, user_id, flight_id, name=f"Passenger {shard}-{flight_id}")))
+
+    assert len({b["pnr"] for _, b in bookings}) == len(bookings)
+    assert len({b["unique_pin"] for _, b in bookings}) == len(bookings)
+    for shard, booking in bookings:
+        assert shard_map.shard_for_pnr(booking["pnr"]) == shard
+        found = client.get(f"/api/bookings/{booking['pnr']}")
+        assert found.status_code == 200
+        assert found.json()["passenger_name"] == booking["passenger_name"]
+
+
+def test_failed_booking_gives_its_code_back(client, user, book, flights_by_shard):
+    user_id, headers = user
+    flight_id = flights_by_shard[max(flights_by_shard)][-1]
+    booking = book(headers, user_id, flight_id)
+    seat_id = next(s["id"] for s in client.get(f"/api/flights/{flight_id}/seats").json()
+                   if s["seat_number"] == booking["seat_number"])
+    reserved = booking_code_count()
+    response = client.post("/api/bookings", headers=headers, json={
+        "flight_id": flight_id,
+        "seat_id": seat_id,
+        "user_id": user_id,
+        "passenger_name": "Second Passenger",
+        "passenger_email": "second@example.com",
+        "passenger_phone": "9999999999",
+    })
+    assert response.status_code == 400
+    assert booking_code_count() == reserved
+
+
+def test_unknown_pnr_is_not_found(client):
+    assert client.get("/api/bookings/ZZZZZZ").status_code == 404
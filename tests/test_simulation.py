@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+
+from backend.pricing_engine import DynamicPricingEngine
+from backend.simulation import Scenario, simulate_shard
+
+DEPARTURE = datetime(2030, 6, 1, 9, 0)
+# key, flight number, base price, seats, departure, (airline, origin, destination)
+SCHEDULE = [
+    (1, "AI101", 5000.0, 120, DEPARTURE, ("AI", "DEL", "BOM")),
+    (2, "6E202", 4200.0, 180, DEPARTURE + timedelta(hours=5), ("6E", "BOM", "BLR")),
+    (3, "AI103", 6100.0, 150, DEPARTURE + timedelta(days=1), ("AI", "DEL", "BLR")),
+]
+SCENARIO = Scenario(horizon_days=10, step_hours=6)
+
+
+def test_same_seed_replays_the_same_season():
+    first = simulate_shard((SCHEDULE, SCENARIO, 0))
+    assert first == simulate_shard((SCHEDULE, SCENARIO, 0))
+    assert [r["flight_id"] for r in first] == [1, 2, 3]
+    for result in first:
+        assert 0 <= result["seats_sold"] <= result["total_seats"]
+        assert result["price_trajectory"]
+
+
+def test_each_step_prices_its_flights_in_one_batch(monkeypatch):
+    calls = []
+    batch = DynamicPricingEngine.calculate_prices
+
+    def counted(flights, now=None, rng=None, strategy=None):
+        calls.append((now, len(flights)))
+        return batch(flights, now, rng, strategy)
+
+    monkeypatch.setattr(DynamicPricingEngine, "calculate_prices", staticmethod(counted))
+    monkeypatch.setattr(DynamicPricingEngine, "calculate_price", None)
+    simulate_shard((SCHEDULE, SCENARIO, 0))
+    # Every flight uses the default strategy, so each simulated moment is one call
+    moments = [now for now, _ in calls]
+    assert len(moments) == len(set(moments))
+    assert max(size for _, size in calls) == len(SCHEDULE)
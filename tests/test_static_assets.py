@@ -0,0 +1,121 @@
+import gzip
+import os
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from backend import static_assets
+from backend.static_assets import (
+    IMMUTABLE, REVALIDATE, StaticAssets, build_assets, load_dist, minify_css, minify_js, write_dist,
+)
+
+STYLES = "/* theme */\nbody {\n    color: #123456;\n    margin: 0;\n}\n" + ".card { padding: 4px; }\n" * 20
+SCRIPT = "// boot\nfunction render() {\n    const html = `\n    <p>keep</p>\n    `;\n    return html;\n}\n" * 10
+PAGE = '<link rel="stylesheet" href="styles.css"><script src="/static/script.js"></script>' + "<p>x</p>" * 40
+
+
+@pytest.fixture
+def frontend(tmp_path, monkeypatch):
+    # Brotli is optional; a stand-in makes the br variant testable either way
+    monkeypatch.setattr(static_assets, "brotli", SimpleNamespace(compress=lambda body, quality: b"br:" + body))
+    for name, source in [("styles.css", STYLES), ("script.js", SCRIPT), ("index.html", PAGE), ("admin.html", PAGE)]:
+        (tmp_path / name).write_text(source)
+    return tmp_path
+
+
+@pytest.fixture
+def assets(frontend):
+    return StaticAssets(str(frontend), str(frontend / "dist")).load()
+
+
+def test_minifiers():
+    assert minify_css("a {\n  color: red;\n}\n/* gone */ b { margin: 0 }") == "a{color:red}b{margin:0}"
+    assert minify_js("  // gone\n  const a = 1;\n\n  const t = `\n    kept as is\n  `;\n") == (
+        "const a = 1;\nconst t = `\n    kept as is\n  `;\n"
+    )
+
+
+def test_pages_reference_content_hashed_assets(frontend):
+    manifest, files = build_assets(str(frontend))
+    assert manifest["styles.css"].startswith("styles.") and manifest["styles.css"].endswith(".css")
+    page = files["index.html"]["identity"].decode()
+    assert f'href="/static/{manifest["styles.css"]}"' in page
+    assert f'src="/static/{manifest["script.js"]}"' in page
+
+    (frontend / "styles.css").write_text(STYLES + "p { color: blue; }")
+    changed, _ = build_assets(str(frontend))
+    assert changed["styles.css"] != manifest["styles.css"]
+    assert changed["script.js"] == manifest["script.js"]
+
+
+def test_small_files_are_not_compressed(frontend):
+    (frontend / "styles.css").write_text("a { color: red; }")
+    manifest, files = build_assets(str(frontend))
+    assert set(files[manifest["styles.css"]]) == {"identity"}
+    assert set(files[manifest["script.js"]]) == {"identity", "gzip", "br"}
+
+
+def test_best_accepted_encoding_is_served_with_its_own_etag(assets):
+    name = assets.manifest["script.js"]
+    identity = assets.response(name)
+    gzipped = assets.response(name, "gzip, deflate")
+    brotli = assets.response(name, "gzip, br")
+    refused = assets.response(name, "br;q=0, gzip")
+
+    assert "content-encoding" not in identity.headers
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(gzipped.body) == identity.body
+    assert brotli.headers["content-encoding"] == "br"
+    assert refused.headers["content-encoding"] == "gzip"
+    etags = {r.headers["etag"] for r in (identity, gzipped, brotli)}
+    assert len(etags) == 3
+    assert all(r.headers["vary"] == "Accept-Encoding" for r in (identity, gzipped, brotli))
+
+
+def test_if_none_match_is_a_304_only_for_the_same_representation(assets):
+    name = assets.manifest["styles.css"]
+    gzip_etag = assets.response(name, "gzip").headers["etag"]
+    not_modified = assets.response(name, "gzip", f'"stale", {gzip_etag}')
+    assert not_modified.status_code == 304 and not not_modified.body
+    assert not_modified.headers["etag"] == gzip_etag
+    assert assets.response(name, None, gzip_etag).status_code == 200
+
+
+def test_fingerprinted_paths_are_immutable_and_source_names_revalidate(assets):
+    hashed = assets.manifest["styles.css"]
+    assert assets.asset(hashed).headers["cache-control"] == IMMUTABLE
+    by_source_name = assets.asset("styles.css")
+    assert by_source_name.headers["cache-control"] == REVALIDATE
+    assert by_source_name.body == assets.asset(hashed).body
+    assert assets.page("index.html").headers["cache-control"] == REVALIDATE
+    for path in ("index.html", "styles.0123456789ab.css", "../replit.md"):
+        with pytest.raises(HTTPException) as missing:
+            assets.asset(path)
+        assert missing.value.status_code == 404
+
+
+def test_built_dist_is_used_until_a_source_is_newer(frontend):
+    manifest, files = build_assets(str(frontend))
+    dist = frontend / "dist"
+    write_dist(manifest, files, str(dist))
+    assert load_dist(str(dist)) == (manifest, files)
+
+    assets = StaticAssets(str(frontend), str(dist))
+    assert assets._dist_is_current()
+    built_at = os.path.getmtime(dist / "manifest.json")
+    os.utime(frontend / "script.js", (built_at + 10, built_at + 10))
+    assert not assets._dist_is_current()
+
+
+def test_pages_and_assets_are_served(client):
+    page = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert page.status_code == 200
+    assert page.headers["content-encoding"] == "gzip"
+    assert page.headers["cache-control"] == REVALIDATE
+    assert client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": page.headers["etag"]}).status_code == 304
+
+    script = next(part.split('"')[1] for part in page.text.split("src=")[1:] if "/static/script." in part)
+    asset = client.get(script)
+    assert asset.status_code == 200 and asset.headers["cache-control"] == IMMUTABLE
+    assert client.get("/static/missing.js").status_code == 404